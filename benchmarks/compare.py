@@ -0,0 +1,75 @@
+"""
+Compare two load-test results (e.g. before/after a commit):
+
+    python -m benchmarks.compare benchmarks/results/A.json benchmarks/results/B.json
+
+Prints throughput and latency percentiles side by side with the relative
+change; --json emits the same comparison as JSON.
+"""
+import argparse
+import json
+
+FIELDS = [
+    ('throughput_rps', ('throughput_rps',)),
+    ('p50_ms', ('latency_ms', 'p50')),
+    ('p95_ms', ('latency_ms', 'p95')),
+    ('p99_ms', ('latency_ms', 'p99')),
+    ('errors', ('errors',)),
+]
+
+
+def _get(data, path):
+    for key in path:
+        if not isinstance(data, dict):
+            return None
+        data = data.get(key)
+    return data
+
+
+def _change(before, after):
+    if before in (None, 0) or after is None:
+        return None
+    return round((after - before) / before * 100, 1)
+
+
+def compare(baseline, candidate):
+    rows = []
+    for scenario, sections in candidate.get('scenarios', {}).items():
+        for section, after in sections.items():
+            before = _get(baseline, ('scenarios', scenario, section))
+            for name, path in FIELDS:
+                old, new = _get(before, path), _get(after, path)
+                rows.append({
+                    'metric': f'{scenario}.{section}.{name}',
+                    'baseline': old,
+                    'candidate': new,
+                    'change_pct': _change(old, new),
+                })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare two load-test result files')
+    parser.add_argument('baseline')
+    parser.add_argument('candidate')
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.candidate, encoding='utf-8') as f:
+        candidate = json.load(f)
+    rows = compare(baseline, candidate)
+
+    if args.json:
+        print(json.dumps({'baseline': baseline.get('commit'), 'candidate': candidate.get('commit'), 'rows': rows}, indent=2))
+        return
+
+    print(f"{'metric':<36}{baseline.get('commit', '?'):>14}{candidate.get('commit', '?'):>14}{'change':>10}")
+    for row in rows:
+        change = f"{row['change_pct']:+.1f}%" if row['change_pct'] is not None else '-'
+        print(f"{row['metric']:<36}{str(row['baseline']):>14}{str(row['candidate']):>14}{change:>10}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,153 @@
+"""
+Benchmark: streaming DOCX extraction (zip + iterparse) vs the python-docx path.
+
+    python -m benchmarks.docx_extraction [--paragraphs 20000] [--rows 20000] [--repeat 3]
+
+Builds a synthetic document with python-docx (paragraphs plus a price-list
+table), then reports for each extractor the best wall time, the growth of
+peak RSS while extracting (measured in a fresh process, so lxml's C memory
+is included) and how many table rows made it into the text.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import resource
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import copy
+
+import docx
+import docx.table
+import docx.text.paragraph
+from docx.oxml.ns import qn
+
+from utils.file_parser import clean_text, extract_docx_document
+
+
+def build_document(path, paragraphs, rows):
+    document = docx.Document()
+    for number in range(paragraphs):
+        document.add_paragraph(
+            f"Bo'lim {number}. Kurslarimiz haqida batafsil ma'lumot: darslar haftasiga uch marta, "
+            f"guruhda 8-12 nafar o'quvchi, tajribali o'qituvchilar."
+        )
+    table = document.add_table(rows=1, cols=3)
+    for cell, title in zip(table.rows[0].cells, ('Kurs', 'Davomiyligi', 'Narxi')):
+        cell.text = title
+    # add_row().cells is quadratic in python-docx, so clone the row XML instead
+    template = table.add_row()._tr
+    for cell, value in zip(table.rows[1].cells, ('x', 'x', 'x')):
+        cell.text = value
+    tbl = table._tbl
+    tbl.remove(template)
+    for number in range(rows):
+        row = copy.deepcopy(template)
+        values = (f'Kurs-{number}', f'{number % 12 + 1} oy', f'{(number % 40 + 10) * 10000} som')
+        for text_element, value in zip(row.iter(qn('w:t')), values):
+            text_element.text = value
+        tbl.append(row)
+    document.save(path)
+
+
+def python_docx_path(path):
+    """The previous extractor: python-docx object model, paragraphs only"""
+    document = docx.Document(path)
+    text = ""
+    for paragraph in document.paragraphs:
+        text += paragraph.text + "\n"
+    return clean_text(text)
+
+
+def python_docx_with_tables(path):
+    """python-docx walking the body in order so tables are kept too"""
+    document = docx.Document(path)
+    parts = []
+    for child in document.element.body.iterchildren():
+        if child.tag == qn('w:p'):
+            parts.append(docx.text.paragraph.Paragraph(child, document).text)
+        elif child.tag == qn('w:tbl'):
+            # Table.rows/row.cells rebuild the cell grid per row (quadratic), walk the XML
+            table = docx.table.Table(child, document)
+            for tr in child.tr_lst:
+                cells = (docx.table._Cell(tc, table).text for tc in tr.tc_lst)
+                parts.append('; '.join(cells) + ';')
+    return clean_text('\n'.join(parts))
+
+
+def streaming_path(path):
+    return extract_docx_document(path).text
+
+
+EXTRACTORS = {
+    'python_docx': python_docx_path,
+    'python_docx_with_tables': python_docx_with_tables,
+    'streaming': streaming_path,
+}
+
+
+def _rss_mb():
+    # VmHWM is the peak RSS of this address space (ru_maxrss survives fork+exec)
+    with open('/proc/self/status') as status:
+        for line in status:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1]) / 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _measure_rss(name, path, queue):
+    baseline = _rss_mb()
+    EXTRACTORS[name](path)
+    queue.put(_rss_mb() - baseline)
+
+
+def measure(name, path, repeat):
+    fn = EXTRACTORS[name]
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        text = fn(path)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=_measure_rss, args=(name, path, queue))
+    process.start()
+    rss_growth = queue.get()
+    process.join()
+    return {
+        'seconds': round(best, 3),
+        'peak_rss_growth_mb': round(rss_growth, 1),
+        'chars': len(text),
+        'table_rows_found': text.count('Kurs-'),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='DOCX extraction benchmark')
+    parser.add_argument('--paragraphs', type=int, default=20000)
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, 'bench.docx')
+        build_document(path, args.paragraphs, args.rows)
+        report = {
+            'paragraphs': args.paragraphs,
+            'table_rows': args.rows,
+            'file_mb': round(os.path.getsize(path) / 1e6, 2),
+            'results': {name: measure(name, path, args.repeat) for name in EXTRACTORS},
+        }
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
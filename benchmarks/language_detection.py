@@ -0,0 +1,116 @@
+"""
+Micro-benchmark: script-based language detection vs langdetect.
+
+    python -m benchmarks.language_detection [--repeat 200]
+
+Reports accuracy on a labelled sample of typical bot questions and the
+average cost per call (µs) for langdetect, the fast classifier, and the
+memoised detect_language.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from utils.language import classify, detect_language, _langdetect
+
+SAMPLES = [
+    ('uz', "Narxi qancha?"),
+    ('uz', "Yetkazib berish qancha vaqt oladi?"),
+    ('uz', "Qanday to'lov usullari bor?"),
+    ('uz', "Kafolat muddati qancha?"),
+    ('uz', "Ish vaqtingiz qanday?"),
+    ('uz', "Mahsulotni qaytarish mumkinmi?"),
+    ('uz', "Filial manzili qayerda joylashgan?"),
+    ('uz', "Assalomu alaykum, buyurtma bermoqchi edim"),
+    ('uz', "Toshkent shahriga yetkazib berasizlarmi?"),
+    ('uz', "Bu mahsulotning rangi qanday bo'ladi?"),
+    ('uz', "Oʻzbekiston boʻylab yetkazib berish bormi?"),
+    ('uz', "Chegirmalar haqida ma'lumot bering"),
+    ('uz', "Men kecha buyurtma qildim, qachon keladi?"),
+    ('uz', "Rahmat, tushundim"),
+    ('uz', "Karta orqali to'lasam bo'ladimi"),
+    ('uz', "Нархи қанча?"),
+    ('uz', "Етказиб бериш қанча вақт олади?"),
+    ('uz', "Қандай тўлов усуллари бор?"),
+    ('uz', "Кафолат муддати қанча?"),
+    ('uz', "Ассалому алайкум, буюртма бермоқчи эдим"),
+    ('uz', "Раҳмат, тушундим"),
+    ('ru', "Сколько стоит доставка?"),
+    ('ru', "Какие способы оплаты у вас есть?"),
+    ('ru', "Где находится ваш магазин?"),
+    ('ru', "Здравствуйте, хочу сделать заказ"),
+    ('ru', "Какой срок гарантии на товар?"),
+    ('ru', "Можно ли вернуть товар?"),
+    ('ru', "Спасибо, всё понятно"),
+    ('ru', "Вы работаете в выходные?"),
+    ('ru', "Есть ли скидки для постоянных клиентов?"),
+    ('ru', "Когда будет доставка в Ташкент?"),
+    ('en', "How much does it cost?"),
+    ('en', "What payment methods do you accept?"),
+    ('en', "Where is your store located?"),
+    ('en', "Hello, I would like to place an order"),
+    ('en', "How long is the warranty?"),
+    ('en', "Can I return the product?"),
+    ('en', "Thanks, that's clear"),
+    ('en', "Do you work on weekends?"),
+    ('en', "Is there any discount for regular customers?"),
+    ('en', "When will my order arrive?"),
+]
+
+
+def measure(fn, texts, repeat):
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for text in texts:
+            fn(text)
+    return (time.perf_counter() - started) / (repeat * len(texts)) * 1e6
+
+
+def accuracy(fn):
+    correct = sum(1 for expected, text in SAMPLES if fn(text) == expected)
+    return round(correct / len(SAMPLES), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Language detection micro-benchmark')
+    parser.add_argument('--repeat', type=int, default=200)
+    args = parser.parse_args()
+
+    texts = [text for _, text in SAMPLES]
+    _langdetect(texts[0])  # load langdetect profiles before timing
+
+    uncached = detect_language.__wrapped__
+    detectors = {
+        'langdetect': lambda text: _langdetect(text) or 'uz',
+        'script_classifier': lambda text: classify(text)[0] or 'uz',
+        'detect_language_uncached': uncached,
+    }
+    report = {'samples': len(SAMPLES), 'results': {}}
+    for name, fn in detectors.items():
+        repeat = max(1, args.repeat // 20) if name != 'script_classifier' else args.repeat
+        report['results'][name] = {
+            'accuracy': accuracy(fn),
+            'us_per_call': round(measure(fn, texts, repeat), 2),
+        }
+
+    detect_language.cache_clear()
+    report['results']['detect_language_memoised'] = {
+        'accuracy': accuracy(detect_language),
+        'us_per_call': round(measure(detect_language, texts, args.repeat), 2),
+    }
+    report['fallback_share'] = round(sum(1 for text in texts if not classify(text)[1]) / len(texts), 3)
+    report['misclassified'] = [
+        {'text': text, 'expected': expected, 'got': uncached(text)}
+        for expected, text in SAMPLES if uncached(text) != expected
+    ]
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+"""
+End-to-end load test for the Telegram webhook and web chat paths.
+
+Boots the Flask app from main.py against SQLite (default) or the database in
+--database-url, with the fake AI backend and a local Telegram Bot API stub,
+then replays synthetic traffic at the given concurrency:
+
+    python -m benchmarks.load_test --scenario webhook --requests 500 --concurrency 16
+    python -m benchmarks.load_test --scenario chat --set FAKE_AI_LATENCY=0.3
+
+Any app setting can be overridden with --set KEY=VALUE (environment variables
+read by main.py). The report is printed as JSON and saved under
+benchmarks/results/<timestamp>-<commit>.json; compare two runs with
+benchmarks/compare.py.
+"""
+import argparse
+import itertools
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from benchmarks.telegram_stub import TelegramStub
+
+RESULTS_DIR = os.path.join(ROOT, 'benchmarks', 'results')
+PASSWORD = 'bench-password'
+
+VOCABULARY = (
+    "narx yetkazib berish buyurtma to'lov kafolat mahsulot xizmat manzil ish vaqti "
+    "chegirma qaytarish aloqa telefon do'kon filial omborxona kuryer karta naqd "
+    "muddat sifat sertifikat o'lcham rang model yangi aksiya bonus mijoz"
+).split()
+
+QUESTIONS = [
+    "Narxi qancha?",
+    "Yetkazib berish qancha vaqt oladi?",
+    "Qanday to'lov usullari bor?",
+    "Kafolat muddati qancha?",
+    "Ish vaqtingiz qanday?",
+    "Mahsulotni qaytarish mumkinmi?",
+    "Filial manzili qayerda?",
+    "Chegirma va aksiyalar bormi?",
+    "Kuryer orqali yetkazasizmi?",
+    "Karta bilan to'lasa bo'ladimi?",
+]
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a sorted list"""
+    if not values:
+        return None
+    index = max(0, min(len(values) - 1, int(round(pct / 100.0 * len(values) + 0.5)) - 1))
+    return values[index]
+
+
+def summarize(latencies, errors, duration):
+    """Throughput and latency percentiles (milliseconds)"""
+    values = sorted(latencies)
+    completed = len(values)
+    return {
+        'requests': completed + errors,
+        'errors': errors,
+        'duration_seconds': round(duration, 3),
+        'throughput_rps': round(completed / duration, 2) if duration > 0 else None,
+        'latency_ms': {
+            'p50': _ms(percentile(values, 50)),
+            'p95': _ms(percentile(values, 95)),
+            'p99': _ms(percentile(values, 99)),
+            'max': _ms(values[-1] if values else None),
+            'mean': _ms(sum(values) / completed if completed else None),
+        },
+    }
+
+
+def _ms(seconds):
+    return round(seconds * 1000, 2) if seconds is not None else None
+
+
+def git_revision():
+    try:
+        commit = subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, text=True).strip()
+        dirty = bool(subprocess.check_output(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=ROOT, text=True).strip())
+        return commit, dirty
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown', False
+
+
+def synthetic_document(rng, chars):
+    """Knowledge base text built from a fixed vocabulary"""
+    sentences = []
+    size = 0
+    while size < chars:
+        sentence = ' '.join(rng.choice(VOCABULARY) for _ in range(rng.randint(8, 20))).capitalize() + '.'
+        sentences.append(sentence)
+        size += len(sentence) + 1
+    return ' '.join(sentences)
+
+
+def configure_environment(args, stub_url, workdir):
+    """Environment read by main.py at import time"""
+    os.environ.setdefault('SECRET_KEY', 'benchmark-secret')
+    os.environ['DATABASE_URL'] = args.database_url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['AI_BACKEND'] = 'fake'
+    os.environ['TELEGRAM_API_BASE'] = stub_url
+    os.environ['VECTOR_INDEX_FOLDER'] = os.path.join(workdir, 'vectors')
+    os.environ['ENABLE_SCHEDULER'] = 'false'
+    os.environ['WEBHOOK_WORKERS'] = str(args.workers)
+    os.environ.pop('GEMINI_API_KEY', None)
+    for item in args.set:
+        key, _, value = item.partition('=')
+        os.environ[key] = value
+
+
+def seed_tenants(app, count, kb_chars, run_id, rng):
+    """Create tenants with a Telegram bot and an indexed knowledge base"""
+    from models import db
+    from models.user import User
+    from models.telegram_bot import TelegramBot
+    from models.knowledge_base import KnowledgeBase
+    from utils.retrieval import store_knowledge_chunks, index_knowledge_base
+
+    tenants = []
+    with app.app_context():
+        for n in range(count):
+            email = f'bench-{run_id}-{n}@example.com'
+            user = User(
+                full_name=f'Bench {n}',
+                phone=f'+99890{run_id[-4:]}{n:03d}',
+                email=email,
+                password=PASSWORD
+            )
+            db.session.add(user)
+            db.session.flush()
+
+            secret = f'bench-secret-{n}'
+            bot = TelegramBot(user_id=user.id, token=f'{run_id}-{n}:BENCH', username=f'bench_{n}_bot',
+                              webhook_secret=secret)
+            bot.save()
+
+            kb = KnowledgeBase(user_id=user.id, file_name='bench.txt', file_path='bench.txt',
+                               content=synthetic_document(rng, kb_chars))
+            db.session.add(kb)
+            db.session.flush()
+            store_knowledge_chunks(kb.id, kb.content)
+            db.session.commit()
+            index_knowledge_base(kb.id, user_id=user.id)
+
+            tenants.append({'user_id': user.id, 'email': email, 'secret': secret})
+    return tenants
+
+
+def run_requests(total, concurrency, send):
+    """Call send(i) `total` times from `concurrency` threads; returns (latencies, errors, duration)"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def task(i):
+        started = time.perf_counter()
+        try:
+            ok = send(i)
+        except Exception:
+            ok = False
+        elapsed = time.perf_counter() - started
+        with lock:
+            if ok:
+                latencies.append(elapsed)
+            else:
+                errors[0] += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(task, range(total)))
+    return latencies, errors[0], time.perf_counter() - started
+
+
+def webhook_scenario(app, base_url, tenants, args, rng):
+    import requests
+    from models import db
+    from models.webhook_job import WebhookJob
+
+    with app.app_context():
+        first_job_id = (db.session.query(db.func.max(WebhookJob.id)).scalar() or 0) + 1
+
+    questions = [(rng.choice(tenants), rng.randrange(args.chats), rng.choice(QUESTIONS)) for _ in range(args.requests)]
+    sessions = threading.local()
+    update_base = int(time.time())
+
+    def send(i):
+        tenant, chat, question = questions[i]
+        if not hasattr(sessions, 'http'):
+            sessions.http = requests.Session()
+        update = {
+            'update_id': update_base + i,
+            'message': {
+                'message_id': i + 1,
+                'date': int(time.time()),
+                'chat': {'id': 100000 + chat, 'type': 'private'},
+                'from': {'id': 100000 + chat, 'is_bot': False, 'first_name': 'Bench'},
+                'text': question,
+            },
+        }
+        response = sessions.http.post(
+            f"{base_url}/telegram/webhook/{tenant['user_id']}",
+            json=update,
+            headers={'X-Telegram-Bot-Api-Secret-Token': tenant['secret']},
+            timeout=60
+        )
+        return response.status_code == 200
+
+    latencies, errors, duration = run_requests(args.requests, args.concurrency, send)
+    report = {'http': summarize(latencies, errors, duration)}
+
+    # End-to-end: from enqueue to the reply being sent by a worker
+    deadline = time.monotonic() + args.drain_timeout
+    with app.app_context():
+        while time.monotonic() < deadline:
+            pending = WebhookJob.query.filter(
+                WebhookJob.id >= first_job_id,
+                WebhookJob.status.in_(['pending', 'processing'])
+            ).count()
+            db.session.rollback()
+            if pending == 0:
+                break
+            time.sleep(0.2)
+
+        jobs = WebhookJob.query.filter(WebhookJob.id >= first_job_id).all()
+        done = [job for job in jobs if job.status == 'done' and job.finished_at]
+        job_latencies = [(job.finished_at - job.created_at).total_seconds() for job in done]
+        if done:
+            span = (max(job.finished_at for job in done) - min(job.created_at for job in done)).total_seconds()
+        else:
+            span = 0.0
+        report['end_to_end'] = summarize(job_latencies, len(jobs) - len(done), span)
+        report['end_to_end']['pending'] = sum(1 for job in jobs if job.status in ('pending', 'processing'))
+    return report
+
+
+def chat_scenario(app, base_url, tenants, args, rng):
+    import requests
+
+    questions = [(rng.choice(tenants), rng.choice(QUESTIONS)) for _ in range(args.requests)]
+
+    # One logged-in session per (worker thread, tenant), created before timing starts
+    logins = {}
+    for tenant in tenants:
+        for slot in range(args.concurrency):
+            http = requests.Session()
+            http.post(f'{base_url}/auth/login', data={'email': tenant['email'], 'password': PASSWORD}, timeout=30)
+            logins[(slot, tenant['user_id'])] = http
+    slots = itertools.count()
+    local = threading.local()
+
+    def session_for(tenant):
+        if not hasattr(local, 'slot'):
+            local.slot = next(slots)
+        return logins[(local.slot, tenant['user_id'])]
+
+    def send(i):
+        tenant, question = questions[i]
+        response = session_for(tenant).post(f'{base_url}/chat/send', json={'message': question}, timeout=60)
+        return response.status_code == 200 and response.json().get('success')
+
+    latencies, errors, duration = run_requests(args.requests, args.concurrency, send)
+    return {'http': summarize(latencies, errors, duration)}
+
+
+SCENARIOS = {
+    'webhook': webhook_scenario,
+    'chat': chat_scenario,
+}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Load test for the webhook and chat paths')
+    parser.add_argument('--scenario', choices=sorted(SCENARIOS) + ['all'], default='all')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--tenants', type=int, default=3)
+    parser.add_argument('--chats', type=int, default=50, help='distinct Telegram chats')
+    parser.add_argument('--kb-chars', type=int, default=50000, help='knowledge base size per tenant')
+    parser.add_argument('--workers', type=int, default=4, help='WEBHOOK_WORKERS')
+    parser.add_argument('--telegram-latency', type=float, default=0.02, help='stub Bot API latency, seconds')
+    parser.add_argument('--drain-timeout', type=float, default=120.0)
+    parser.add_argument('--database-url', help='default: SQLite in a temporary directory')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--set', action='append', default=[], metavar='KEY=VALUE', help='extra app settings')
+    parser.add_argument('--output', help='result file (default: benchmarks/results/<timestamp>-<commit>.json)')
+    parser.add_argument('--no-save', action='store_true')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    rng = random.Random(args.seed)
+    commit, dirty = git_revision()
+    run_id = datetime.utcnow().strftime('%Y%m%d%H%M%S')
+
+    stub = TelegramStub(latency=args.telegram_latency).start()
+    workdir = tempfile.mkdtemp(prefix='bench-')
+    configure_environment(args, stub.url, workdir)
+
+    from werkzeug.serving import make_server
+    from main import app
+    from utils import metrics
+    from utils.webhook_queue import stop_workers
+
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    app.config['WTF_CSRF_ENABLED'] = False
+    app.config['SESSION_COOKIE_SECURE'] = False
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-app', daemon=True).start()
+    base_url = f'http://127.0.0.1:{server.server_port}'
+
+    tenants = seed_tenants(app, args.tenants, args.kb_chars, run_id, rng)
+    names = sorted(SCENARIOS) if args.scenario == 'all' else [args.scenario]
+
+    report = {
+        'run_id': run_id,
+        'commit': commit,
+        'dirty': dirty,
+        'started_at': datetime.utcnow().isoformat() + 'Z',
+        'database': app.config['SQLALCHEMY_DATABASE_URI'].split(':', 1)[0],
+        'parameters': {key: value for key, value in vars(args).items() if key not in ('output', 'no_save')},
+        'scenarios': {},
+    }
+    try:
+        for name in names:
+            report['scenarios'][name] = SCENARIOS[name](app, base_url, tenants, args, rng)
+        with app.app_context():
+            report['metrics'] = metrics.snapshot()
+        report['telegram_stub'] = stub.stats()
+    finally:
+        stop_workers()
+        server.shutdown()
+        stub.stop()
+
+    output = json.dumps(report, indent=2, ensure_ascii=False, default=str)
+    print(output)
+    if not args.no_save:
+        path = args.output or os.path.join(RESULTS_DIR, f"{run_id}-{commit}{'-dirty' if dirty else ''}.json")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(output)
+        print(f'Saved {path}', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
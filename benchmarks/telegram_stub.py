@@ -0,0 +1,112 @@
+"""
+Local stand-in for the Telegram Bot API used by the load-test harness.
+
+Point TELEGRAM_API_BASE at it and every sendMessage / editMessageText call
+is answered locally (with optional latency) and counted per method.
+
+    python -m benchmarks.telegram_stub --port 8081 --latency 0.05
+"""
+import argparse
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class TelegramStub:
+    """Threaded HTTP server answering /bot<token>/<method> like the Bot API"""
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self.chats = set()
+        self._message_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def _respond(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                payload = json.loads(self.rfile.read(length) or b'{}') if length else {}
+                method = self.path.rsplit('/', 1)[-1]
+                body = json.dumps({'ok': True, 'result': stub.handle(method, payload)}).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = _respond
+            do_POST = _respond
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def handle(self, method, payload):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.calls[method] += 1
+            if 'chat_id' in payload:
+                self.chats.add(str(payload['chat_id']))
+
+        if method == 'getMe':
+            return {'id': 1, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        if method in ('sendMessage', 'editMessageText'):
+            message_id = payload.get('message_id') or next(self._message_ids)
+            return {
+                'message_id': message_id,
+                'chat': {'id': payload.get('chat_id')},
+                'date': int(time.time()),
+                'text': payload.get('text', ''),
+            }
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='telegram-stub', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def stats(self):
+        with self._lock:
+            return {'calls': dict(self.calls), 'chats': len(self.chats)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Telegram Bot API stand-in')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every call')
+    args = parser.parse_args()
+
+    stub = TelegramStub(args.host, args.port, args.latency)
+    print(f'Telegram stub listening on {stub.url}')
+    try:
+        stub._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    print(json.dumps(stub.stats()))
+
+
+if __name__ == '__main__':
+    main()
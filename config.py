@@ -19,6 +19,32 @@ class Config:
     MAX_FILE_SIZE_MB = 10
     ALLOWED_EXTENSIONS = {'pdf', 'docx', 'csv', 'txt'}
     
+    # Knowledge base retrieval settings
+    KB_CHUNK_SIZE = int(os.environ.get('KB_CHUNK_SIZE', 800))  # characters per chunk
+    KB_CHUNK_OVERLAP = int(os.environ.get('KB_CHUNK_OVERLAP', 100))
+    KB_TOP_K = int(os.environ.get('KB_TOP_K', 4))  # chunks sent to the model
+    EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'hashing')  # 'hashing', 'gemini' or 'none'
+    GEMINI_EMBEDDING_MODEL = os.environ.get('GEMINI_EMBEDDING_MODEL', 'models/text-embedding-004')
+    HASHING_EMBEDDING_DIM = int(os.environ.get('HASHING_EMBEDDING_DIM', 512))
+    EMBEDDING_TIMEOUT = float(os.environ.get('EMBEDDING_TIMEOUT', 3))  # deadline for a remote query embedding, seconds (then BM25 only)
+    VECTOR_INDEX_FOLDER = os.environ.get('VECTOR_INDEX_FOLDER', 'uploads/vectors')
+    KB_BLOB_FOLDER = os.environ.get('KB_BLOB_FOLDER', 'uploads/knowledge/blobs')  # uploads stored by SHA-256
+    
+    # Answer cache for repeated questions
+    ANSWER_CACHE_TTL = int(os.environ.get('ANSWER_CACHE_TTL', 3600))  # seconds
+    ANSWER_CACHE_MAX_ENTRIES = int(os.environ.get('ANSWER_CACHE_MAX_ENTRIES', 5000))
+    ANSWER_CACHE_SHARED = os.environ.get('ANSWER_CACHE_SHARED', 'none')  # 'none' or 'sql'
+    
+    # Rate limits for public endpoints ('' disables a limit)
+    RATE_LIMIT_BACKEND = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # 'memory' or 'sql' (shared across workers)
+    RATE_LIMIT_CONTACT_WEBCHAT = os.environ.get('RATE_LIMIT_CONTACT_WEBCHAT', '10/60')  # requests/seconds per IP
+    RATE_LIMIT_CONTACT_TELEGRAM = os.environ.get('RATE_LIMIT_CONTACT_TELEGRAM', '30/60')
+    RATE_LIMIT_CONTACT_PHONE = os.environ.get('RATE_LIMIT_CONTACT_PHONE', '3/300')
+    RATE_LIMIT_WEBHOOK_AUTH_FAILURES = os.environ.get('RATE_LIMIT_WEBHOOK_AUTH_FAILURES', '10/60')  # failed secret checks per IP
+    
+    # Web chat history (stored server-side, ring buffer per conversation)
+    CHAT_HISTORY_LIMIT = int(os.environ.get('CHAT_HISTORY_LIMIT', 20))  # exchanges kept per conversation
+    
     # Mail configuration
     MAIL_SERVER = 'smtp.gmail.com'
     MAIL_PORT = 587
@@ -35,9 +61,70 @@ class Config:
     
     # Google Gemini AI
     GEMINI_API_KEY = os.environ.get('GEMINI_API_KEY')
+    AI_BACKEND = os.environ.get('AI_BACKEND', 'gemini')  # 'gemini' or 'fake' (offline load testing)
+    GEMINI_MODEL_NAME = os.environ.get('GEMINI_MODEL_NAME', 'gemini-1.5-flash')
+    FAKE_AI_LATENCY = float(os.environ.get('FAKE_AI_LATENCY', 0.8))  # median first-token latency, seconds
+    FAKE_AI_LATENCY_DISTRIBUTION = os.environ.get('FAKE_AI_LATENCY_DISTRIBUTION', 'lognormal')  # 'fixed', 'uniform' or 'lognormal'
+    FAKE_AI_LATENCY_SIGMA = float(os.environ.get('FAKE_AI_LATENCY_SIGMA', 0.5))
+    FAKE_AI_TOKENS_PER_SECOND = float(os.environ.get('FAKE_AI_TOKENS_PER_SECOND', 80))
+    FAKE_AI_RESPONSE_TOKENS = int(os.environ.get('FAKE_AI_RESPONSE_TOKENS', 120))
+    FAKE_AI_ERROR_RATE = float(os.environ.get('FAKE_AI_ERROR_RATE', 0.0))  # share of failed requests
+    FAKE_AI_SEED = int(os.environ.get('FAKE_AI_SEED', 0))
+    AI_TIMEOUT = float(os.environ.get('AI_TIMEOUT', 20))  # deadline per AI call, seconds
+    AI_MAX_CONCURRENT_CALLS = int(os.environ.get('AI_MAX_CONCURRENT_CALLS', 32))  # per process
+    AI_BREAKER_FAILURES = int(os.environ.get('AI_BREAKER_FAILURES', 5))  # consecutive failures before opening
+    AI_BREAKER_SLOW_CALL = float(os.environ.get('AI_BREAKER_SLOW_CALL', 10))  # seconds, 0 = disabled
+    AI_BREAKER_RESET = float(os.environ.get('AI_BREAKER_RESET', 30))  # seconds before a trial call
+    AI_SCHEDULER_CAPACITY = int(os.environ.get('AI_SCHEDULER_CAPACITY', 16))  # concurrent AI calls shared fairly by tenants
+    AI_QUEUE_MAX_WAIT = float(os.environ.get('AI_QUEUE_MAX_WAIT', 10))  # seconds before a queued request is shed
     
     # Webhook settings
     WEBHOOK_BASE_URL = os.environ.get('WEBHOOK_BASE_URL', 'https://your-domain.replit.dev')
+    
+    # Webhook queue settings
+    WEBHOOK_WORKERS = int(os.environ.get('WEBHOOK_WORKERS', 4))  # 0 = process updates inline
+    WEBHOOK_QUEUE_POLL_INTERVAL = float(os.environ.get('WEBHOOK_QUEUE_POLL_INTERVAL', 0.5))
+    WEBHOOK_JOB_LEASE_SECONDS = int(os.environ.get('WEBHOOK_JOB_LEASE_SECONDS', 300))
+    WEBHOOK_JOB_MAX_ATTEMPTS = int(os.environ.get('WEBHOOK_JOB_MAX_ATTEMPTS', 3))
+    WEBHOOK_JOB_RETRY_BASE_SECONDS = float(os.environ.get('WEBHOOK_JOB_RETRY_BASE_SECONDS', 2))  # doubled after each failed attempt
+    WEBHOOK_JOB_RETRY_MAX_SECONDS = float(os.environ.get('WEBHOOK_JOB_RETRY_MAX_SECONDS', 60))
+    WEBHOOK_DEBOUNCE_MS = int(os.environ.get('WEBHOOK_DEBOUNCE_MS', 800))  # merge a chat's messages sent within this window; 0 = off
+    WEBHOOK_DEBOUNCE_MAX_WAIT_MS = int(os.environ.get('WEBHOOK_DEBOUNCE_MAX_WAIT_MS', 3000))  # answer at the latest this long after the first message
+    WEBHOOK_DEBOUNCE_MAX_MESSAGES = int(os.environ.get('WEBHOOK_DEBOUNCE_MAX_MESSAGES', 10))
+    WEBHOOK_DEDUP_TTL = int(os.environ.get('WEBHOOK_DEDUP_TTL', 86400))  # seconds
+    WEBHOOK_DEDUP_MAX_ENTRIES = int(os.environ.get('WEBHOOK_DEDUP_MAX_ENTRIES', 100000))
+    WEBHOOK_DEDUP_SQL = os.environ.get('WEBHOOK_DEDUP_SQL', 'false').lower() == 'true'  # shared tier across workers
+    
+    # Knowledge base ingestion worker pool (per process)
+    INGESTION_WORKERS = int(os.environ.get('INGESTION_WORKERS', 2))  # 0 = process uploads inside the request
+    INGESTION_POLL_INTERVAL = float(os.environ.get('INGESTION_POLL_INTERVAL', 1.0))
+    INGESTION_JOB_LEASE_SECONDS = int(os.environ.get('INGESTION_JOB_LEASE_SECONDS', 600))
+    INGESTION_JOB_MAX_ATTEMPTS = int(os.environ.get('INGESTION_JOB_MAX_ATTEMPTS', 2))
+    PDF_WORKERS = int(os.environ.get('PDF_WORKERS', 2))  # processes for large PDFs; 1 = read in the ingestion thread
+    PDF_PAGES_PER_TASK = int(os.environ.get('PDF_PAGES_PER_TASK', 100))  # pages read per PdfReader / pool task
+    PDF_PARALLEL_MIN_PAGES = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 100))  # smaller PDFs are read in one pass
+    
+    BOT_ROUTE_TTL = int(os.environ.get('BOT_ROUTE_TTL', 300))  # seconds
+    BOT_ROUTE_VERSION_CHECK_INTERVAL = float(os.environ.get('BOT_ROUTE_VERSION_CHECK_INTERVAL', 2))  # seconds
+    
+    # Telegram Bot API client settings
+    TELEGRAM_API_BASE = os.environ.get('TELEGRAM_API_BASE', 'https://api.telegram.org')
+    TELEGRAM_BOT_RATE = float(os.environ.get('TELEGRAM_BOT_RATE', 30))  # messages per second per bot
+    TELEGRAM_CHAT_RATE = float(os.environ.get('TELEGRAM_CHAT_RATE', 1))  # messages per second per chat
+    TELEGRAM_MAX_RETRIES = int(os.environ.get('TELEGRAM_MAX_RETRIES', 3))
+    TELEGRAM_STREAMING = os.environ.get('TELEGRAM_STREAMING', 'true').lower() == 'true'  # placeholder + progressive edits
+    TELEGRAM_STREAM_EDIT_INTERVAL = float(os.environ.get('TELEGRAM_STREAM_EDIT_INTERVAL', 1.5))  # min seconds between edits
+    
+    # Per-chat conversation memory and prompt token budget
+    TELEGRAM_CHAT_MEMORY = os.environ.get('TELEGRAM_CHAT_MEMORY', 'true').lower() == 'true'  # send recent turns with follow-up questions (those skip the answer cache)
+    CHAT_MEMORY_BACKEND = os.environ.get('CHAT_MEMORY_BACKEND', 'sql')  # 'sql' (chat_messages, shared by all workers) or 'memory' (per process, single worker only)
+    CHAT_MEMORY_TURNS = int(os.environ.get('CHAT_MEMORY_TURNS', 6))  # question/answer pairs kept per chat
+    CHAT_MEMORY_MAX_BYTES = int(os.environ.get('CHAT_MEMORY_MAX_BYTES', 4096))  # text bytes kept per chat
+    CHAT_MEMORY_MAX_CHATS = int(os.environ.get('CHAT_MEMORY_MAX_CHATS', 20000))  # least recently used chats are evicted ('memory' backend)
+    CHAT_MEMORY_IDLE_TTL = int(os.environ.get('CHAT_MEMORY_IDLE_TTL', 3600))  # seconds; older turns are not sent
+    CHAT_MEMORY_CLEANUP_INTERVAL = int(os.environ.get('CHAT_MEMORY_CLEANUP_INTERVAL', 300))  # seconds between deletes of idle turns ('sql' backend)
+    AI_PROMPT_TOKEN_BUDGET = int(os.environ.get('AI_PROMPT_TOKEN_BUDGET', 1500))  # estimated tokens per prompt
+    AI_HISTORY_TOKEN_BUDGET = int(os.environ.get('AI_HISTORY_TOKEN_BUDGET', 400))  # part of the budget for chat history
 
 class DevelopmentConfig(Config):
     """Development configuration"""
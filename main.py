@@ -40,14 +40,60 @@ app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
     'pool_timeout': 20,
     'pool_recycle': 300,
     'pool_pre_ping': True,  # This validates connections before use
-    'connect_args': {
+}
+# PostgreSQL driver options (SQLite is used for local benchmarks)
+if database_url.startswith(('postgresql://', 'postgres://')):
+    app.config['SQLALCHEMY_ENGINE_OPTIONS']['connect_args'] = {
         'connect_timeout': 10,
         'sslmode': 'prefer',  # Prefer SSL but allow non-SSL connections
         'options': '-c default_transaction_isolation=read_committed'
     }
-}
 app.config['MAX_CONTENT_LENGTH'] = 10 * 1024 * 1024  # 10MB max file size
 
+# Knowledge base retrieval settings
+app.config['KB_CHUNK_SIZE'] = int(os.environ.get('KB_CHUNK_SIZE', 800))  # characters per chunk
+app.config['KB_CHUNK_OVERLAP'] = int(os.environ.get('KB_CHUNK_OVERLAP', 100))
+app.config['KB_TOP_K'] = int(os.environ.get('KB_TOP_K', 4))  # chunks sent to the model
+app.config['EMBEDDING_BACKEND'] = os.environ.get('EMBEDDING_BACKEND', 'hashing')  # 'hashing', 'gemini' or 'none'
+app.config['GEMINI_EMBEDDING_MODEL'] = os.environ.get('GEMINI_EMBEDDING_MODEL', 'models/text-embedding-004')
+app.config['HASHING_EMBEDDING_DIM'] = int(os.environ.get('HASHING_EMBEDDING_DIM', 512))
+app.config['EMBEDDING_TIMEOUT'] = float(os.environ.get('EMBEDDING_TIMEOUT', 3))  # deadline for a remote query embedding, seconds (then BM25 only)
+app.config['VECTOR_INDEX_FOLDER'] = os.environ.get('VECTOR_INDEX_FOLDER', 'uploads/vectors')
+app.config['KB_BLOB_FOLDER'] = os.environ.get('KB_BLOB_FOLDER', 'uploads/knowledge/blobs')  # uploads stored by SHA-256
+
+# AI backend ('fake' runs offline for load testing)
+app.config['AI_BACKEND'] = os.environ.get('AI_BACKEND', 'gemini')  # 'gemini' or 'fake' (offline load testing)
+app.config['GEMINI_MODEL_NAME'] = os.environ.get('GEMINI_MODEL_NAME', 'gemini-1.5-flash')
+app.config['FAKE_AI_LATENCY'] = float(os.environ.get('FAKE_AI_LATENCY', 0.8))  # median first-token latency, seconds
+app.config['FAKE_AI_LATENCY_DISTRIBUTION'] = os.environ.get('FAKE_AI_LATENCY_DISTRIBUTION', 'lognormal')  # 'fixed', 'uniform' or 'lognormal'
+app.config['FAKE_AI_LATENCY_SIGMA'] = float(os.environ.get('FAKE_AI_LATENCY_SIGMA', 0.5))
+app.config['FAKE_AI_TOKENS_PER_SECOND'] = float(os.environ.get('FAKE_AI_TOKENS_PER_SECOND', 80))
+app.config['FAKE_AI_RESPONSE_TOKENS'] = int(os.environ.get('FAKE_AI_RESPONSE_TOKENS', 120))
+app.config['FAKE_AI_ERROR_RATE'] = float(os.environ.get('FAKE_AI_ERROR_RATE', 0.0))  # share of failed requests
+app.config['FAKE_AI_SEED'] = int(os.environ.get('FAKE_AI_SEED', 0))
+app.config['AI_TIMEOUT'] = float(os.environ.get('AI_TIMEOUT', 20))  # deadline per AI call, seconds
+app.config['AI_MAX_CONCURRENT_CALLS'] = int(os.environ.get('AI_MAX_CONCURRENT_CALLS', 32))  # per process
+app.config['AI_BREAKER_FAILURES'] = int(os.environ.get('AI_BREAKER_FAILURES', 5))  # consecutive failures before opening
+app.config['AI_BREAKER_SLOW_CALL'] = float(os.environ.get('AI_BREAKER_SLOW_CALL', 10))  # seconds, 0 = disabled
+app.config['AI_BREAKER_RESET'] = float(os.environ.get('AI_BREAKER_RESET', 30))  # seconds before a trial call
+app.config['AI_SCHEDULER_CAPACITY'] = int(os.environ.get('AI_SCHEDULER_CAPACITY', 16))  # concurrent AI calls shared fairly by tenants
+app.config['AI_QUEUE_MAX_WAIT'] = float(os.environ.get('AI_QUEUE_MAX_WAIT', 10))  # seconds before a queued request is shed
+
+# Answer cache for repeated questions
+app.config['ANSWER_CACHE_TTL'] = int(os.environ.get('ANSWER_CACHE_TTL', 3600))  # seconds
+app.config['ANSWER_CACHE_MAX_ENTRIES'] = int(os.environ.get('ANSWER_CACHE_MAX_ENTRIES', 5000))
+app.config['ANSWER_CACHE_SHARED'] = os.environ.get('ANSWER_CACHE_SHARED', 'none')  # 'none' or 'sql'
+
+# Rate limits for public endpoints ('' disables a limit)
+app.config['RATE_LIMIT_BACKEND'] = os.environ.get('RATE_LIMIT_BACKEND', 'memory')  # 'memory' or 'sql' (shared across workers)
+app.config['RATE_LIMIT_CONTACT_WEBCHAT'] = os.environ.get('RATE_LIMIT_CONTACT_WEBCHAT', '10/60')  # requests/seconds per IP
+app.config['RATE_LIMIT_CONTACT_TELEGRAM'] = os.environ.get('RATE_LIMIT_CONTACT_TELEGRAM', '30/60')
+app.config['RATE_LIMIT_CONTACT_PHONE'] = os.environ.get('RATE_LIMIT_CONTACT_PHONE', '3/300')
+app.config['RATE_LIMIT_WEBHOOK_AUTH_FAILURES'] = os.environ.get('RATE_LIMIT_WEBHOOK_AUTH_FAILURES', '10/60')  # failed secret checks per IP
+
+# Web chat history (stored server-side, ring buffer per conversation)
+app.config['CHAT_HISTORY_LIMIT'] = int(os.environ.get('CHAT_HISTORY_LIMIT', 20))  # exchanges kept per conversation
+
 # Security settings for production and development
 app.config['SESSION_COOKIE_SECURE'] = True  # Always secure for HTTPS
 app.config['SESSION_COOKIE_HTTPONLY'] = True
@@ -65,6 +111,51 @@ app.config['MAIL_USE_TLS'] = True
 app.config['MAIL_USERNAME'] = os.environ.get('MAIL_USERNAME')
 app.config['MAIL_PASSWORD'] = os.environ.get('MAIL_PASSWORD')
 
+# Telegram webhook queue configuration
+app.config['WEBHOOK_WORKERS'] = int(os.environ.get('WEBHOOK_WORKERS', 4))  # 0 = process updates inline
+app.config['WEBHOOK_QUEUE_POLL_INTERVAL'] = float(os.environ.get('WEBHOOK_QUEUE_POLL_INTERVAL', 0.5))
+app.config['WEBHOOK_JOB_LEASE_SECONDS'] = int(os.environ.get('WEBHOOK_JOB_LEASE_SECONDS', 300))
+app.config['WEBHOOK_JOB_MAX_ATTEMPTS'] = int(os.environ.get('WEBHOOK_JOB_MAX_ATTEMPTS', 3))
+app.config['WEBHOOK_JOB_RETRY_BASE_SECONDS'] = float(os.environ.get('WEBHOOK_JOB_RETRY_BASE_SECONDS', 2))  # doubled after each failed attempt
+app.config['WEBHOOK_JOB_RETRY_MAX_SECONDS'] = float(os.environ.get('WEBHOOK_JOB_RETRY_MAX_SECONDS', 60))
+app.config['WEBHOOK_DEBOUNCE_MS'] = int(os.environ.get('WEBHOOK_DEBOUNCE_MS', 800))  # merge a chat's messages sent within this window; 0 = off
+app.config['WEBHOOK_DEBOUNCE_MAX_WAIT_MS'] = int(os.environ.get('WEBHOOK_DEBOUNCE_MAX_WAIT_MS', 3000))  # answer at the latest this long after the first message
+app.config['WEBHOOK_DEBOUNCE_MAX_MESSAGES'] = int(os.environ.get('WEBHOOK_DEBOUNCE_MAX_MESSAGES', 10))
+app.config['WEBHOOK_DEDUP_TTL'] = int(os.environ.get('WEBHOOK_DEDUP_TTL', 86400))  # seconds
+app.config['WEBHOOK_DEDUP_MAX_ENTRIES'] = int(os.environ.get('WEBHOOK_DEDUP_MAX_ENTRIES', 100000))
+app.config['WEBHOOK_DEDUP_SQL'] = os.environ.get('WEBHOOK_DEDUP_SQL', 'false').lower() == 'true'  # shared tier across workers
+
+# Knowledge base ingestion worker pool (per process)
+app.config['INGESTION_WORKERS'] = int(os.environ.get('INGESTION_WORKERS', 2))  # 0 = process uploads inside the request
+app.config['INGESTION_POLL_INTERVAL'] = float(os.environ.get('INGESTION_POLL_INTERVAL', 1.0))
+app.config['INGESTION_JOB_LEASE_SECONDS'] = int(os.environ.get('INGESTION_JOB_LEASE_SECONDS', 600))
+app.config['INGESTION_JOB_MAX_ATTEMPTS'] = int(os.environ.get('INGESTION_JOB_MAX_ATTEMPTS', 2))
+app.config['PDF_WORKERS'] = int(os.environ.get('PDF_WORKERS', 2))  # processes for large PDFs; 1 = read in the ingestion thread
+app.config['PDF_PAGES_PER_TASK'] = int(os.environ.get('PDF_PAGES_PER_TASK', 100))  # pages read per PdfReader / pool task
+app.config['PDF_PARALLEL_MIN_PAGES'] = int(os.environ.get('PDF_PARALLEL_MIN_PAGES', 100))  # smaller PDFs are read in one pass
+
+app.config['BOT_ROUTE_TTL'] = int(os.environ.get('BOT_ROUTE_TTL', 300))  # seconds
+app.config['BOT_ROUTE_VERSION_CHECK_INTERVAL'] = float(os.environ.get('BOT_ROUTE_VERSION_CHECK_INTERVAL', 2))  # seconds
+
+# Telegram Bot API client configuration
+app.config['TELEGRAM_API_BASE'] = os.environ.get('TELEGRAM_API_BASE', 'https://api.telegram.org')
+app.config['TELEGRAM_BOT_RATE'] = float(os.environ.get('TELEGRAM_BOT_RATE', 30))  # messages per second per bot
+app.config['TELEGRAM_CHAT_RATE'] = float(os.environ.get('TELEGRAM_CHAT_RATE', 1))  # messages per second per chat
+app.config['TELEGRAM_MAX_RETRIES'] = int(os.environ.get('TELEGRAM_MAX_RETRIES', 3))
+app.config['TELEGRAM_STREAMING'] = os.environ.get('TELEGRAM_STREAMING', 'true').lower() == 'true'  # placeholder + progressive edits
+app.config['TELEGRAM_STREAM_EDIT_INTERVAL'] = float(os.environ.get('TELEGRAM_STREAM_EDIT_INTERVAL', 1.5))  # min seconds between edits
+
+# Per-chat conversation memory and prompt token budget
+app.config['TELEGRAM_CHAT_MEMORY'] = os.environ.get('TELEGRAM_CHAT_MEMORY', 'true').lower() == 'true'  # send recent turns with follow-up questions (those skip the answer cache)
+app.config['CHAT_MEMORY_BACKEND'] = os.environ.get('CHAT_MEMORY_BACKEND', 'sql')  # 'sql' (chat_messages, shared by all workers) or 'memory' (per process, single worker only)
+app.config['CHAT_MEMORY_TURNS'] = int(os.environ.get('CHAT_MEMORY_TURNS', 6))  # question/answer pairs kept per chat
+app.config['CHAT_MEMORY_MAX_BYTES'] = int(os.environ.get('CHAT_MEMORY_MAX_BYTES', 4096))  # text bytes kept per chat
+app.config['CHAT_MEMORY_MAX_CHATS'] = int(os.environ.get('CHAT_MEMORY_MAX_CHATS', 20000))  # least recently used chats are evicted ('memory' backend)
+app.config['CHAT_MEMORY_IDLE_TTL'] = int(os.environ.get('CHAT_MEMORY_IDLE_TTL', 3600))  # seconds; older turns are not sent
+app.config['CHAT_MEMORY_CLEANUP_INTERVAL'] = int(os.environ.get('CHAT_MEMORY_CLEANUP_INTERVAL', 300))  # seconds between deletes of idle turns ('sql' backend)
+app.config['AI_PROMPT_TOKEN_BUDGET'] = int(os.environ.get('AI_PROMPT_TOKEN_BUDGET', 1500))  # estimated tokens per prompt
+app.config['AI_HISTORY_TOKEN_BUDGET'] = int(os.environ.get('AI_HISTORY_TOKEN_BUDGET', 400))  # part of the budget for chat history
+
 # Initialize extensions
 from models import db
 db.init_app(app)
@@ -96,8 +187,17 @@ if gemini_api_key:
 # Import models after db initialization
 from models.user import User
 from models.knowledge_base import KnowledgeBase
+from models.knowledge_document import KnowledgeDocument
+from models.knowledge_chunk import KnowledgeChunk
+from models.cached_answer import CachedAnswer
 from models.telegram_bot import TelegramBot
 from models.contact_log import ContactLog
+from models.webhook_job import WebhookJob
+from models.processed_update import ProcessedUpdate
+from models.cache_version import CacheVersion
+from models.rate_limit_bucket import RateLimitBucket
+from models.chat_message import ChatMessage
+from models.ingestion_job import IngestionJob
 
 # User loader for Flask-Login with error handling
 @login_manager.user_loader
@@ -170,6 +270,9 @@ def inject_conf_vars():
 # Create tables and default admin user
 with app.app_context():
     db.create_all()
+    # create_all() skips existing tables; add the columns and indexes introduced since
+    from utils.schema import upgrade_schema
+    upgrade_schema(db.engine)
     
     # Create admin user only if explicitly configured
     admin_email = os.environ.get('ADMIN_EMAIL')
@@ -221,6 +324,37 @@ def setup_email_scheduler():
 with app.app_context():
     setup_email_scheduler()
 
+# Telegram webhook worker pool (per process)
+def setup_webhook_workers():
+    """Start background workers that process queued Telegram updates"""
+    try:
+        from utils.webhook_queue import start_workers
+        from utils.messaging.update_handler import handle_telegram_update
+        started = start_workers(app, handle_telegram_update)
+        if started:
+            app.logger.info(f"Webhook worker pool started with {started} workers")
+        else:
+            app.logger.info("Webhook worker pool disabled, updates are processed inline")
+    except Exception as e:
+        app.logger.error(f"Failed to start webhook workers: {str(e)}")
+
+setup_webhook_workers()
+
+# Knowledge base ingestion worker pool (per process)
+def setup_ingestion_workers():
+    """Start background workers that parse, chunk and index uploaded files"""
+    try:
+        from utils.ingestion import start_workers
+        started = start_workers(app)
+        if started:
+            app.logger.info(f"Ingestion worker pool started with {started} workers")
+        else:
+            app.logger.info("Ingestion worker pool disabled, uploads are processed inline")
+    except Exception as e:
+        app.logger.error(f"Failed to start ingestion workers: {str(e)}")
+
+setup_ingestion_workers()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 5000))
     debug_mode = os.environ.get('DEBUG', 'False').lower() == 'true'
@@ -0,0 +1,51 @@
+from datetime import datetime
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+
+class CacheVersion(db.Model):
+    """Workerlar orasida keshni bekor qilish uchun versiya hisoblagichi"""
+    __tablename__ = 'cache_versions'
+
+    name = db.Column(db.String(64), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+    def __init__(self, name, version=0, **kwargs):
+        self.name = name
+        self.version = version
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def __repr__(self):
+        return f'<CacheVersion {self.name}={self.version}>'
+
+    @classmethod
+    def get_version(cls, name):
+        """Joriy versiyani olish (yozuv bo'lmasa 0)"""
+        version = db.session.query(cls.version).filter_by(name=name).scalar()
+        return version or 0
+
+    @classmethod
+    def bump(cls, name):
+        """
+        Versiyani oshirish. Commit qilinmaydi - chaqiruvchi o'z tranzaksiyasi
+        bilan birga saqlaydi.
+        """
+        updated = cls.query.filter_by(name=name).update(
+            {'version': cls.version + 1, 'updated_at': datetime.utcnow()},
+            synchronize_session=False
+        )
+        if updated:
+            return
+
+        try:
+            with db.session.begin_nested():
+                db.session.add(cls(name=name, version=1))
+        except IntegrityError:
+            # Boshqa worker yozuvni hozirgina yaratdi
+            cls.query.filter_by(name=name).update(
+                {'version': cls.version + 1, 'updated_at': datetime.utcnow()},
+                synchronize_session=False
+            )
@@ -0,0 +1,25 @@
+from datetime import datetime
+
+from models import db
+
+class CachedAnswer(db.Model):
+    __tablename__ = 'cached_answers'
+
+    key_hash = db.Column(db.String(64), primary_key=True)  # sha256 (tenant, kb versiyasi, til, savol)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    answer = db.Column(db.Text, nullable=False)
+    latency = db.Column(db.Float, default=0.0)  # javobni yaratishga ketgan vaqt (sekund)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+    def __init__(self, key_hash, user_id, answer, expires_at, latency=0.0, **kwargs):
+        self.key_hash = key_hash
+        self.user_id = user_id
+        self.answer = answer
+        self.expires_at = expires_at
+        self.latency = latency
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def __repr__(self):
+        return f'<CachedAnswer {self.key_hash[:12]}>'
@@ -0,0 +1,38 @@
+from datetime import datetime
+
+from models import db
+
+class ChatMessage(db.Model):
+    __tablename__ = 'chat_messages'
+
+    id = db.Column(db.Integer, primary_key=True)
+    conversation_id = db.Column(db.String(32), nullable=False)  # sessiyada faqat shu saqlanadi
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    seq = db.Column(db.Integer, nullable=False)  # suhbat ichidagi tartib raqami
+    user_text = db.Column(db.Text, nullable=False)
+    ai_text = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('conversation_id', 'seq', name='uq_chat_messages_conversation_seq'),
+    )
+
+    def __init__(self, conversation_id, user_id, seq, user_text, ai_text, **kwargs):
+        self.conversation_id = conversation_id
+        self.user_id = user_id
+        self.seq = seq
+        self.user_text = user_text
+        self.ai_text = ai_text
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def to_dict(self):
+        return {
+            'seq': self.seq,
+            'user': self.user_text,
+            'ai': self.ai_text,
+            'timestamp': str(self.created_at)
+        }
+
+    def __repr__(self):
+        return f'<ChatMessage {self.conversation_id}#{self.seq}>'
@@ -0,0 +1,55 @@
+from datetime import datetime
+
+from models import db
+
+class IngestionJob(db.Model):
+    __tablename__ = 'ingestion_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id', ondelete='CASCADE'), nullable=False, index=True)
+    kb_id = db.Column(db.Integer, db.ForeignKey('knowledge_base.id', ondelete='SET NULL'))  # yaratilgan bilim bazasi
+    file_name = db.Column(db.String(255), nullable=False)
+    file_path = db.Column(db.String(500), nullable=False)
+    additional_text = db.Column(db.Text)
+    file_sha256 = db.Column(db.String(64))  # yuklash vaqtida hisoblangan, umumiy hujjatni topish uchun
+    status = db.Column(db.String(20), default='pending', index=True)  # 'pending', 'running', 'done', 'failed'
+    stage = db.Column(db.String(20), default='queued')  # 'queued', 'parse', 'clean', 'chunk', 'index', 'activate', 'done'
+    progress = db.Column(db.Float, default=0.0)  # umumiy jarayon, 0..1
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+
+    def __init__(self, user_id, file_name, file_path, additional_text=None, file_sha256=None, **kwargs):
+        self.user_id = user_id
+        self.file_name = file_name
+        self.file_path = file_path
+        self.additional_text = additional_text
+        self.file_sha256 = file_sha256
+        self.status = 'pending'
+        self.stage = 'queued'
+        self.progress = 0.0
+        self.attempts = 0
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    @property
+    def is_finished(self):
+        return self.status in ('done', 'failed')
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'file_name': self.file_name,
+            'status': self.status,
+            'stage': self.stage,
+            'progress': round(self.progress or 0.0, 3),
+            'error': self.error,
+            'kb_id': self.kb_id,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None
+        }
+
+    def __repr__(self):
+        return f'<IngestionJob {self.id} {self.file_name} {self.status}/{self.stage}>'
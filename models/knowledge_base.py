@@ -9,10 +9,15 @@ class KnowledgeBase(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     file_name = db.Column(db.String(255), nullable=False)
     file_path = db.Column(db.String(500), nullable=False)
-    content = db.Column(db.Text)
+    content = db.deferred(db.Column(db.Text))  # to'liq matn faqat kerak bo'lganda yuklanadi
+    # Umumiy hujjat: bo'lsa matn, bo'laklar va indekslar hujjatda saqlanadi (content bo'sh)
+    document_id = db.Column(db.Integer, db.ForeignKey('knowledge_documents.id'), index=True)
     uploaded_at = db.Column(db.DateTime, default=datetime.utcnow)
     is_active = db.Column(db.Boolean, default=True)
     
+    # Relationships
+    chunks = db.relationship('KnowledgeChunk', backref='knowledge_base', lazy=True, cascade='all, delete-orphan', order_by='KnowledgeChunk.ordinal')
+    
     def __init__(self, user_id, file_name, file_path, content=None, **kwargs):
         self.user_id = user_id
         self.file_name = file_name
@@ -0,0 +1,71 @@
+from models import db
+
+class KnowledgeChunk(db.Model):
+    __tablename__ = 'knowledge_chunks'
+
+    id = db.Column(db.Integer, primary_key=True)
+    kb_id = db.Column(db.Integer, db.ForeignKey('knowledge_base.id', ondelete='CASCADE'))
+    # Umumiy hujjat bo'laklari kb_id siz, document_id bilan saqlanadi
+    document_id = db.Column(db.Integer, db.ForeignKey('knowledge_documents.id', ondelete='CASCADE'))
+    ordinal = db.Column(db.Integer, nullable=False)
+    text = db.Column(db.Text, nullable=False)
+    token_estimate = db.Column(db.Integer, default=0)
+    start_offset = db.Column(db.Integer)
+    end_offset = db.Column(db.Integer)
+    page_start = db.Column(db.Integer)  # PDF sahifalari (boshqa formatlarda bo'sh)
+    page_end = db.Column(db.Integer)
+
+    __table_args__ = (
+        db.UniqueConstraint('kb_id', 'ordinal', name='uq_knowledge_chunks_kb_ordinal'),
+        db.UniqueConstraint('document_id', 'ordinal', name='uq_knowledge_chunks_document_ordinal'),
+    )
+
+    def __init__(self, kb_id, ordinal, text, token_estimate=0, start_offset=None, end_offset=None,
+                 page_start=None, page_end=None, document_id=None, **kwargs):
+        self.kb_id = kb_id
+        self.document_id = document_id
+        self.ordinal = ordinal
+        self.text = text
+        self.token_estimate = token_estimate
+        self.start_offset = start_offset
+        self.end_offset = end_offset
+        self.page_start = page_start
+        self.page_end = page_end
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def __repr__(self):
+        return f'<KnowledgeChunk {self.kb_id}:{self.ordinal}>'
+
+    @property
+    def page_label(self):
+        """Manbani ko'rsatish uchun '[p. 3]' yoki '[p. 3-4]' (sahifa ma'lumoti bo'lmasa bo'sh)"""
+        if self.page_start is None:
+            return ''
+        if self.page_end is None or self.page_end == self.page_start:
+            return f'[p. {self.page_start}]'
+        return f'[p. {self.page_start}-{self.page_end}]'
+
+    @classmethod
+    def find_by_ids(cls, chunk_ids):
+        """Faqat kerakli bo'laklarni hujjatdagi tartibda olish"""
+        if not chunk_ids:
+            return []
+        return cls.query.filter(cls.id.in_(chunk_ids)).order_by(cls.ordinal).all()
+
+    @classmethod
+    def bulk_create(cls, kb_id, chunks, document_id=None):
+        """
+        Bo'laklarni bitta INSERT bilan qo'shish (commit qilinmaydi)
+
+        Args:
+            kb_id (int): Bilim bazasi ID si (umumiy hujjat bo'laklari uchun None)
+            chunks (list[dict]): ordinal, text, token_estimate, start_offset, end_offset, page_start, page_end
+            document_id (int, optional): Umumiy hujjat ID si
+        """
+        if not chunks:
+            return
+        db.session.execute(
+            db.insert(cls),
+            [dict(chunk, kb_id=kb_id, document_id=document_id) for chunk in chunks]
+        )
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from models import db
+
+class KnowledgeDocument(db.Model):
+    """
+    Kontent-manzilli (content-addressed) hujjat: bir xil fayl (va qo'shimcha matn)
+    qayta yuklanganda tahlil, bo'laklar va indekslar shu yozuvdan qayta
+    ishlatiladi - turli foydalanuvchilar uchun ham. ref_count - unga bog'langan
+    bilim bazalari soni, 0 ga tushganda hujjat va uning fayllari o'chiriladi.
+    """
+    __tablename__ = 'knowledge_documents'
+
+    id = db.Column(db.Integer, primary_key=True)
+    content_hash = db.Column(db.String(64), unique=True, nullable=False)  # fayl SHA-256 (+ qo'shimcha matn)
+    file_sha256 = db.Column(db.String(64), nullable=False, index=True)
+    file_path = db.Column(db.String(500), nullable=False)  # uploads/knowledge/blobs/ab/<sha256>.<ext>
+    content = db.deferred(db.Column(db.Text))
+    chunk_count = db.Column(db.Integer, default=0)
+    ref_count = db.Column(db.Integer, default=0)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    last_used_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __init__(self, content_hash, file_sha256, file_path, content=None, **kwargs):
+        self.content_hash = content_hash
+        self.file_sha256 = file_sha256
+        self.file_path = file_path
+        self.content = content
+        self.chunk_count = 0
+        self.ref_count = 0
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def __repr__(self):
+        return f'<KnowledgeDocument {self.content_hash[:12]} refs={self.ref_count}>'
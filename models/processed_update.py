@@ -0,0 +1,24 @@
+from datetime import datetime
+
+from models import db
+
+class ProcessedUpdate(db.Model):
+    __tablename__ = 'processed_updates'
+
+    id = db.Column(db.Integer, primary_key=True)
+    bot_key = db.Column(db.String(64), nullable=False)  # bot egasining ID si
+    update_id = db.Column(db.BigInteger, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True)
+
+    __table_args__ = (
+        db.UniqueConstraint('bot_key', 'update_id', name='uq_processed_updates_bot_update'),
+    )
+
+    def __init__(self, bot_key, update_id, **kwargs):
+        self.bot_key = bot_key
+        self.update_id = update_id
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def __repr__(self):
+        return f'<ProcessedUpdate {self.bot_key}:{self.update_id}>'
@@ -0,0 +1,18 @@
+from models import db
+
+class RateLimitBucket(db.Model):
+    __tablename__ = 'rate_limit_buckets'
+
+    key = db.Column(db.String(255), primary_key=True)  # 'endpoint:tenant:ip'
+    tokens = db.Column(db.Float, nullable=False)
+    updated_at = db.Column(db.Float, nullable=False, index=True)  # unix vaqt (sekund)
+
+    def __init__(self, key, tokens, updated_at, **kwargs):
+        self.key = key
+        self.tokens = tokens
+        self.updated_at = updated_at
+        for name, value in kwargs.items():
+            setattr(self, name, value)
+
+    def __repr__(self):
+        return f'<RateLimitBucket {self.key}: {self.tokens:.2f}>'
@@ -1,15 +1,20 @@
 from datetime import datetime
 
 from models import db
+from models.cache_version import CacheVersion
 
 class TelegramBot(db.Model):
     __tablename__ = 'telegram_bots'
     
+    # Webhook marshrut keshlarini boshqa workerlarda bekor qilish uchun
+    ROUTES_VERSION = 'telegram_bots'
+    
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     token = db.Column(db.String(255), unique=True, nullable=False)
     username = db.Column(db.String(255))
     webhook_url = db.Column(db.String(500))
+    webhook_secret = db.Column(db.String(255))
     language = db.Column(db.String(10), default='uz')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     
@@ -39,6 +44,7 @@ class TelegramBot(db.Model):
         """Ma'lumotlar bazasiga saqlash"""
         try:
             db.session.add(self)
+            CacheVersion.bump(self.ROUTES_VERSION)
             db.session.commit()
             return True
         except Exception as e:
@@ -49,6 +55,7 @@ class TelegramBot(db.Model):
         """Ma'lumotlar bazasidan o'chirish"""
         try:
             db.session.delete(self)
+            CacheVersion.bump(self.ROUTES_VERSION)
             db.session.commit()
             return True
         except Exception as e:
@@ -61,6 +68,7 @@ class TelegramBot(db.Model):
             for key, value in kwargs.items():
                 if hasattr(self, key):
                     setattr(self, key, value)
+            CacheVersion.bump(self.ROUTES_VERSION)
             db.session.commit()
             return True
         except Exception as e:
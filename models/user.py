@@ -79,9 +79,14 @@ class User(UserMixin, db.Model):
         """Check if user's trial period is still active"""
         return self.trial_ends_at and datetime.utcnow() < self.trial_ends_at
     
+    @staticmethod
+    def plan_active_at(plan_expires_at, now=None):
+        """Paid plan is active until plan_expires_at; a plan without an expiry date is not active"""
+        return plan_expires_at is not None and (now or datetime.utcnow()) < plan_expires_at
+    
     def is_plan_active(self):
         """Check if user's paid plan is still active"""
-        return self.plan_expires_at and datetime.utcnow() < self.plan_expires_at
+        return User.plan_active_at(self.plan_expires_at)
     
     def has_active_subscription(self):
         """Check if user has any active subscription (trial or paid)"""
@@ -0,0 +1,35 @@
+from datetime import datetime
+
+from models import db
+
+class WebhookJob(db.Model):
+    __tablename__ = 'webhook_jobs'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    chat_id = db.Column(db.BigInteger, nullable=False, index=True)
+    shard = db.Column(db.Integer, nullable=False, default=0)  # yozilgan paytdagi shard (egallash chat_id bo'yicha hisoblanadi)
+    payload = db.Column(db.Text, nullable=False)  # Telegram update (JSON)
+    status = db.Column(db.String(20), default='pending', index=True)  # 'pending', 'processing', 'done', 'failed'
+    attempts = db.Column(db.Integer, default=0)
+    error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime)
+    next_attempt_at = db.Column(db.DateTime)  # xatodan keyin qayta urinish vaqti
+    finished_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_webhook_jobs_status_id', 'status', 'id'),
+    )
+
+    def __init__(self, user_id, chat_id, payload, shard=0, status='pending', **kwargs):
+        self.user_id = user_id
+        self.chat_id = chat_id
+        self.payload = payload
+        self.shard = shard
+        self.status = status
+        for key, value in kwargs.items():
+            setattr(self, key, value)
+
+    def __repr__(self):
+        return f'<WebhookJob {self.id} chat={self.chat_id} {self.status}>'
@@ -1,10 +1,12 @@
 from functools import wraps
-from flask import Blueprint, render_template, redirect, url_for, flash, request
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 from flask_babel import _
 from models import db
 from models.user import User
 from models.contact_log import ContactLog
+from utils import metrics
+from utils.document_store import delete_knowledge_bases
 
 admin_bp = Blueprint('admin', __name__)
 
@@ -48,6 +50,8 @@ def delete_user(user_id):
         flash(_('Admin foydalanuvchisini o\'chirish mumkin emas'), 'error')
     else:
         full_name = user.full_name
+        # FK cascade does not release shared document references
+        delete_knowledge_bases(list(user.knowledge_bases))
         db.session.delete(user)
         db.session.commit()
         flash(_('Foydalanuvchi o\'chirildi'), 'success')
@@ -59,4 +63,11 @@ def delete_user(user_id):
 def contacts():
     """Admin contacts page - all messages"""
     contact_logs = ContactLog.query.order_by(ContactLog.created_at.desc()).all()
-    return render_template('admin/contacts.html', contact_logs=contact_logs)
\ No newline at end of file
+    return render_template('admin/contacts.html', contact_logs=contact_logs)
+
+@admin_bp.route('/metrics')
+@login_required
+@admin_required
+def metrics_snapshot():
+    """Ichki metrikalar (JSON)"""
+    return jsonify(metrics.snapshot())
@@ -1,16 +1,20 @@
-from flask import Blueprint, render_template, request, jsonify, session
+import json
+from flask import Blueprint, render_template, request, jsonify, session, Response, stream_with_context
 from flask_login import login_required, current_user
 from flask_babel import _
-from datetime import datetime
-from models.knowledge_base import KnowledgeBase
-from utils.ai_handler import get_ai_response
+from utils.ai_handler import get_tenant_ai_response, stream_tenant_ai_response
+from utils import chat_history
 
 chat_bp = Blueprint('chat', __name__)
 
+def _sse(data):
+    """Format one Server-Sent Events message"""
+    return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
 @chat_bp.route('/')
 @login_required
 def chat():
-    return render_template('chat.html')
+    return render_template('chat/index.html')
 
 @chat_bp.route('/send', methods=['POST'])
 @login_required
@@ -22,53 +26,68 @@ def send_message():
         if not message:
             return jsonify({'error': _('Xabar bo\'sh bo\'lishi mumkin emas')}), 400
         
-        # Get user's latest knowledge base content
-        kb = KnowledgeBase.query.filter_by(
-            user_id=current_user.id, 
-            is_active=True
-        ).order_by(KnowledgeBase.uploaded_at.desc()).first()
-        
-        context = kb.content if kb else None
-        
         # Get language from session
         language = session.get('language', 'uz')
         
-        # Get AI response
-        response = get_ai_response(message, context, language)
-        
-        # Store chat history in session
-        if 'chat_history' not in session:
-            session['chat_history'] = []
-        
-        session['chat_history'].append({
-            'user': message,
-            'ai': response,
-            'timestamp': str(datetime.utcnow())
-        })
+        # Get AI response (cached answer or knowledge base retrieval + Gemini)
+        response = get_tenant_ai_response(current_user.id, message, language)
         
-        # Keep only last 20 messages
-        if len(session['chat_history']) > 20:
-            session['chat_history'] = session['chat_history'][-20:]
-        
-        session.modified = True
+        # Store the exchange server-side; the session only keeps the conversation id
+        chat_history.append_exchange(chat_history.get_conversation_id(), current_user.id, message, response)
         
         return jsonify({
             'response': response,
             'success': True
         })
-        
+    
     except Exception as e:
         return jsonify({'error': _('Xatolik yuz berdi')}), 500
 
+@chat_bp.route('/stream', methods=['POST'])
+@login_required
+def stream_message():
+    """Stream the AI answer as Server-Sent Events ({"delta": ...} then {"done": true, ...})"""
+    data = request.get_json(silent=True) or {}
+    message = data.get('message', '').strip()
+    
+    if not message:
+        return jsonify({'error': _('Xabar bo\'sh bo\'lishi mumkin emas')}), 400
+    
+    language = session.get('language', 'uz')
+    user_id = current_user.id
+    # Resolved before streaming starts so a new id still reaches the session cookie
+    conversation_id = chat_history.get_conversation_id()
+    
+    def generate():
+        parts = []
+        for piece in stream_tenant_ai_response(user_id, message, language):
+            parts.append(piece)
+            yield _sse({'delta': piece})
+        
+        response = ''.join(parts)
+        chat_history.append_exchange(conversation_id, user_id, message, response)
+        yield _sse({'done': True, 'response': response})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @chat_bp.route('/history')
 @login_required
 def get_history():
-    history = session.get('chat_history', [])
-    return jsonify({'history': history})
+    """Paginated history: ?limit=20&before=<seq>, newest page first, entries oldest to newest"""
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+    before = request.args.get('before', type=int)
+    
+    history, next_before = chat_history.get_history_page(
+        chat_history.get_conversation_id(create=False), current_user.id, before=before, limit=limit
+    )
+    return jsonify({'history': history, 'next_before': next_before})
 
 @chat_bp.route('/clear')
 @login_required
 def clear_history():
-    session['chat_history'] = []
-    session.modified = True
-    return jsonify({'success': True})
\ No newline at end of file
+    chat_history.clear_history(chat_history.get_conversation_id(create=False), current_user.id)
+    return jsonify({'success': True})
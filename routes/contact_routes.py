@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify, session, flash, redirect, url_for
 from models.contact_log import ContactLog
 from utils.contact_logger import log_contact_message, log_phone_request, log_telegram_message
+from utils.endpoint_limits import rate_limited
 from functools import wraps
 import re
 
@@ -11,6 +12,7 @@ def get_current_user_id():
     return session.get('user_id')
 
 @contact_bp.route('/webchat', methods=['POST'])
+@rate_limited('contact_webchat', '10/60')
 def webchat():
     """Webchat orqali xabar yuborish"""
     try:
@@ -35,6 +37,7 @@ def webchat():
         return jsonify({'success': False, 'error': 'Xatolik yuz berdi'}), 500
 
 @contact_bp.route('/telegram', methods=['POST'])
+@rate_limited('contact_telegram', '30/60')
 def telegram():
     """Telegram bot orqali xabar qabul qilish"""
     try:
@@ -63,6 +66,7 @@ def telegram():
         return jsonify({'success': False, 'error': 'Xatolik yuz berdi'}), 500
 
 @contact_bp.route('/phone', methods=['POST'])
+@rate_limited('contact_phone', '3/300')
 def phone():
     """Telefon qo'ng'iroq so'rovi (mock)"""
     try:
@@ -1,12 +1,15 @@
 import os
 import shutil
-from flask import Blueprint, render_template, request, redirect, url_for, flash
+from flask import Blueprint, render_template, request, redirect, url_for, flash, jsonify
 from flask_login import login_required, current_user
 from flask_babel import _
 from werkzeug.utils import secure_filename
 from models import db
 from models.knowledge_base import KnowledgeBase
-from utils.file_parser import parse_file
+from models.ingestion_job import IngestionJob
+from utils.ingestion import enqueue_ingestion
+from utils.answer_cache import get_answer_cache
+from utils.document_store import delete_knowledge_bases, save_upload
 
 kb_bp = Blueprint('kb', __name__)
 
@@ -17,6 +20,16 @@ ALLOWED_EXTENSIONS = {'pdf', 'docx', 'csv', 'txt'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def _wants_json():
+    return request.accept_mimetypes.best == 'application/json'
+
+def _upload_error(message):
+    """Upload error as JSON for the upload page script, flash + redirect otherwise"""
+    if _wants_json():
+        return jsonify({'success': False, 'error': message}), 400
+    flash(message, 'error')
+    return redirect(request.url)
+
 @kb_bp.route('/upload')
 @login_required
 def upload():
@@ -26,81 +39,75 @@ def upload():
         is_active=True
     ).order_by(KnowledgeBase.uploaded_at.desc()).first()
     
-    return render_template('upload_kb.html', current_file=current_kb)
+    # A file still being processed keeps reporting progress after a reload
+    pending_job = IngestionJob.query.filter(
+        IngestionJob.user_id == current_user.id,
+        IngestionJob.status.in_(['pending', 'running'])
+    ).order_by(IngestionJob.id.desc()).first()
+    
+    return render_template('kb/upload_kb.html', current_file=current_kb, pending_job=pending_job)
 
 @kb_bp.route('/upload', methods=['POST'])
 @login_required
 def upload_file():
+    """Save the file and queue it for parsing, chunking and indexing (see /upload/status)"""
     if 'file' not in request.files:
-        flash(_('Fayl tanlanmadi'), 'error')
-        return redirect(request.url)
+        return _upload_error(_('Fayl tanlanmadi'))
     
     file = request.files['file']
     additional_text = request.form.get('additional_text', '').strip()
     
     if file.filename == '':
-        flash(_('Fayl tanlanmadi'), 'error')
-        return redirect(request.url)
+        return _upload_error(_('Fayl tanlanmadi'))
     
     if not allowed_file(file.filename):
-        flash(_('Faqat PDF, DOCX, CSV, TXT fayllar qabul qilinadi'), 'error')
-        return redirect(request.url)
+        return _upload_error(_('Faqat PDF, DOCX, CSV, TXT fayllar qabul qilinadi'))
     
+    upload = None
     try:
-        # Create user folder
-        user_folder = os.path.join(UPLOAD_FOLDER, f'user_{current_user.id}')
-        os.makedirs(user_folder, exist_ok=True)
-        
-        # Save file
         filename = secure_filename(file.filename)
-        file_path = os.path.join(user_folder, filename)
-        file.save(file_path)
         
-        # Check file size
-        file_size = os.path.getsize(file_path) / (1024 * 1024)  # Size in MB
-        if file_size > MAX_FILE_SIZE_MB:
-            os.remove(file_path)
-            flash(_(f'Fayl hajmi {MAX_FILE_SIZE_MB}MB dan oshmasin'), 'error')
-            return redirect(request.url)
+        # Stream to disk and hash in one pass; writing stops as soon as the size limit is exceeded
+        upload = save_upload(file.stream, max_bytes=MAX_FILE_SIZE_MB * 1024 * 1024)
+        if upload.size > MAX_FILE_SIZE_MB * 1024 * 1024:
+            os.remove(upload.path)
+            return _upload_error(_(f'Fayl hajmi {MAX_FILE_SIZE_MB}MB dan oshmasin'))
         
-        # Parse file content
-        try:
-            file_content = parse_file(file.read(), filename)
-            file.seek(0)  # Reset file pointer after reading
-        except Exception as e:
-            os.remove(file_path)
-            flash(_(f'Faylni tahlil qilishda xatolik: {str(e)}'), 'error')
-            return redirect(request.url)
-        
-        # Add additional text if provided
-        if additional_text:
-            file_content = f"{file_content}\n\nQo'shimcha ma'lumot:\n{additional_text}"
-        
-        # Deactivate old knowledge base entries
-        KnowledgeBase.query.filter_by(
-            user_id=current_user.id, 
-            is_active=True
-        ).update({'is_active': False})
-        
-        # Create new knowledge base entry
-        kb = KnowledgeBase(
-            user_id=current_user.id,
-            file_name=filename,
-            file_path=file_path,
-            content=file_content
-        )
-        db.session.add(kb)
-        db.session.commit()
-        
-        flash(_('Fayl muvaffaqiyatli yuklandi!'), 'success')
+        # Stored by content hash: identical files share one copy and, once processed, one parse/index.
+        # The job row references the blob before the file is moved there, so a concurrent
+        # delete of the same file cannot remove it.
+        # The current knowledge base keeps answering until the new one is indexed
+        job = enqueue_ingestion(current_user.id, filename, additional_text=additional_text, upload=upload)
         
     except Exception as e:
-        if os.path.exists(file_path):
-            os.remove(file_path)
-        flash(_(f'Fayl yuklashda xatolik: {str(e)}'), 'error')
+        if upload and os.path.exists(upload.path):
+            os.remove(upload.path)
+        return _upload_error(_(f'Fayl yuklashda xatolik: {str(e)}'))
+    
+    if _wants_json():
+        return jsonify({
+            'success': True,
+            'job': job.to_dict(),
+            'status_url': url_for('kb.upload_status', job_id=job.id)
+        }), 202
     
+    if job.status == 'failed':
+        flash(_(f'Faylni tahlil qilishda xatolik: {job.error}'), 'error')
+    elif job.status == 'done':
+        flash(_('Fayl muvaffaqiyatli yuklandi!'), 'success')
+    else:
+        flash(_('Fayl qabul qilindi va qayta ishlanmoqda'), 'info')
     return redirect(url_for('kb.upload'))
 
+@kb_bp.route('/upload/status/<int:job_id>')
+@login_required
+def upload_status(job_id):
+    """Progress of a queued upload: status, current stage and overall progress (0..1)"""
+    job = IngestionJob.query.filter_by(id=job_id, user_id=current_user.id).first()
+    if job is None:
+        return jsonify({'success': False, 'error': _('Fayl topilmadi')}), 404
+    return jsonify({'success': True, 'job': job.to_dict()})
+
 @kb_bp.route('/delete')
 @login_required
 def delete_file():
@@ -111,13 +118,9 @@ def delete_file():
     ).first()
     
     if kb:
-        # Remove file from disk
-        if os.path.exists(kb.file_path):
-            os.remove(kb.file_path)
-        
-        # Remove from database
-        db.session.delete(kb)
-        db.session.commit()
+        # Shared document references are released, a legacy file is removed from disk
+        delete_knowledge_bases([kb])
+        get_answer_cache().invalidate_user(current_user.id)
         
         flash(_('Fayl o\'chirildi'), 'info')
     else:
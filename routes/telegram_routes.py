@@ -2,9 +2,11 @@ from flask import Blueprint, render_template, request, redirect, url_for, sessio
 from flask_login import login_required, current_user
 from models.telegram_bot import TelegramBot
 from models.user import User
-from utils.messaging.telegram import send_message_to_telegram, get_bot_info, set_webhook, delete_webhook, generate_webhook_secret, verify_webhook_signature
-from utils.ai_handler import get_ai_response
-from models.knowledge_base import KnowledgeBase
+from utils.messaging.telegram import get_bot_info, set_webhook, delete_webhook, generate_webhook_secret, verify_webhook_signature
+from utils.webhook_queue import dispatch_update
+from utils.dedup import get_update_deduplicator
+from utils.bot_routing import get_bot_routing_table
+from utils.endpoint_limits import hit_limit, too_many_requests
 import json
 import logging
 
@@ -78,6 +80,7 @@ def manage_bots():
                 user_bot.webhook_secret = webhook_secret
                 user_bot.language = language
                 user_bot.save()
+                get_bot_routing_table().invalidate(user_id)
                 
                 # Yangi webhook o'rnatish
                 webhook_result = set_webhook(bot_token, webhook_url, webhook_secret)
@@ -96,6 +99,7 @@ def manage_bots():
                     language=language
                 )
                 new_bot.save()
+                get_bot_routing_table().invalidate(user_id)
                 
                 # Webhook o'rnatish
                 webhook_result = set_webhook(bot_token, webhook_url, webhook_secret)
@@ -114,6 +118,7 @@ def manage_bots():
                 
                 # Botni o'chirish
                 user_bot.delete()
+                get_bot_routing_table().invalidate(user_id)
                 flash('Bot va webhook muvaffaqiyatli o\'chirildi', 'info')
             else:
                 flash('Bot topilmadi', 'error')
@@ -127,56 +132,66 @@ def manage_bots():
 @telegram_bp.route('/webhook/<int:user_id>', methods=['POST'])
 def telegram_webhook(user_id):
     """
-    Telegram webhook endpoint with security verification
+    Telegram webhook endpoint with security verification.
+    Update navbatga qo'yiladi va darhol javob qaytariladi; AI javobi
+    va yuborish worker pool da bajariladi.
     """
     try:
-        # Botni topish
-        telegram_bot = TelegramBot.find_by_user_id(user_id)
-        if not telegram_bot:
+        # Webhook ma'lumotlarini olish
+        webhook_data = request.get_json(silent=True)
+        update_id = webhook_data.get('update_id') if isinstance(webhook_data, dict) else None
+        
+        # Takroriy yetkazilgan update - DB va AI ishidan oldin tashlab yuborish
+        deduplicator = get_update_deduplicator()
+        if update_id is not None and deduplicator.seen(user_id, update_id):
+            return jsonify({'ok': True})
+        
+        # Botni topish (jarayon ichidagi marshrut jadvalidan)
+        bot_route = get_bot_routing_table().get(user_id)
+        if not bot_route:
             logger.error(f"User {user_id} uchun bot topilmadi")
             return jsonify({'error': 'Bot topilmadi'}), 404
         
         # Webhook xavfsizligini tekshirish
-        if telegram_bot.webhook_secret:
+        if bot_route.webhook_secret:
             telegram_signature = request.headers.get('X-Telegram-Bot-Api-Secret-Token')
-            request_data = request.get_data()
             
-            if not verify_webhook_signature(telegram_bot.webhook_secret, telegram_signature):
+            if not verify_webhook_signature(bot_route.webhook_secret, telegram_signature):
+                # Faqat tekshiruvdan o'tmagan so'rovlar IP bo'yicha cheklanadi:
+                # Telegramning haqiqiy update lari bu limitga tushmaydi
+                allowed, wait = hit_limit('webhook_auth_failures', '10/60')
+                if not allowed:
+                    return too_many_requests(wait, {'error': 'Too Many Requests'})
                 logger.warning(f"Webhook xavfsizlik tekshiruvi muvaffaqiyatsiz: {user_id}")
                 return jsonify({'error': 'Forbidden'}), 403
         
-        # Webhook ma'lumotlarini olish
-        webhook_data = request.get_json()
-        
         if not webhook_data or 'message' not in webhook_data:
             return jsonify({'ok': True})
         
         message = webhook_data['message']
         chat_id = message['chat']['id']
-        user_message = message.get('text', '')
+        # Matn yoki media izohi (caption)
+        user_message = message.get('text') or message.get('caption', '')
         
         if not user_message:
             return jsonify({'ok': True})
         
-        # Foydalanuvchining knowledge base dan kontekst olish
-        kb = KnowledgeBase.find_by_user_id(user_id)
-        context = ""
-        if kb and kb.content:
-            context = kb.content
-        
-        # AI javobini olish
-        ai_response = get_ai_response(user_message, context)
-        
-        # Javobni Telegram orqali yuborish
-        result = send_message_to_telegram(telegram_bot.token, chat_id, ai_response)
+        # Faqat autentifikatsiyadan o'tgan update belgilanadi
+        if update_id is not None and not deduplicator.claim(user_id, update_id):
+            logger.info(f"Takroriy update tashlab yuborildi: {user_id}/{update_id}")
+            return jsonify({'ok': True})
         
-        if result['success']:
-            logger.info(f"Xabar muvaffaqiyatli yuborildi: {user_id}")
-        else:
-            logger.error(f"Xabar yuborishda xato: {result['error']}")
+        # Navbatga qo'yish (chat_id bo'yicha shard qilingan workerlar qayta ishlaydi)
+        try:
+            dispatch_update(user_id, chat_id, webhook_data)
+        except Exception:
+            # Telegram qayta yuborganda update yo'qolmasligi uchun
+            if update_id is not None:
+                deduplicator.release(user_id, update_id)
+            raise
         
         return jsonify({'ok': True})
         
     except Exception as e:
         logger.error(f"Webhook xatosi: {str(e)}")
-        return jsonify({'error': 'Server xatosi'}), 500
\ No newline at end of file
+        return jsonify({'error': 'Server xatosi'}), 500
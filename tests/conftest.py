@@ -0,0 +1,72 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+_workdir = tempfile.mkdtemp(prefix='kb-tests-')
+os.environ.setdefault('SESSION_SECRET', 'test-secret')
+os.environ['DATABASE_URL'] = f'sqlite:///{os.path.join(_workdir, "test.db")}'
+os.environ['AI_BACKEND'] = 'fake'
+os.environ['FAKE_AI_LATENCY'] = '0'
+os.environ['FAKE_AI_TOKENS_PER_SECOND'] = '100000'
+os.environ['WEBHOOK_WORKERS'] = '0'
+os.environ['INGESTION_WORKERS'] = '0'
+os.environ['VECTOR_INDEX_FOLDER'] = os.path.join(_workdir, 'vectors')
+os.environ['KB_BLOB_FOLDER'] = os.path.join(_workdir, 'blobs')
+
+
+@pytest.fixture(scope='session')
+def app():
+    import main
+    main.app.config.update(TESTING=True, WTF_CSRF_ENABLED=False, SESSION_COOKIE_SECURE=False)
+    return main.app
+
+
+@pytest.fixture
+def db_session(app):
+    """Ilova konteksti va har bir testdan keyin tozalangan baza"""
+    from models import db
+    with app.app_context():
+        yield db.session
+        db.session.rollback()
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.commit()
+        db.session.remove()
+
+
+@pytest.fixture
+def user(db_session):
+    from models.user import User
+    user = User('Test', '+998901234567', 'test@example.com', password='secret123')
+    db_session.add(user)
+    db_session.commit()
+    return user
+
+
+class FakeClock:
+    """time.monotonic() o'rniga qo'lda suriladigan soat"""
+
+    def __init__(self, start=1000.0):
+        self.now = start
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
@@ -0,0 +1,89 @@
+import threading
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db
+from utils import admission
+from utils.admission import PLAN_LIMITS, FairScheduler, PlanLimits, TenantBusyError
+
+
+def _wait_for(condition, timeout=2.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        time.sleep(0.005)
+
+
+def test_per_tenant_concurrency_and_queue_limits():
+    scheduler = FairScheduler(capacity=4, max_wait=0.05)
+    limits = PlanLimits(weight=1, max_concurrent=1, max_queue=1)
+
+    scheduler.acquire('a', limits)
+    # Slot bor, lekin tenant o'z chegarasida - navbatda kutib, vaqti tugaydi
+    with pytest.raises(TenantBusyError):
+        scheduler.acquire('a', limits)
+    assert scheduler.get_metrics()['shed_timeout'] == 1
+
+    # Boshqa tenant to'xtamaydi
+    scheduler.acquire('b', limits)
+    assert scheduler.get_metrics()['active'] == 2
+
+    scheduler.release('a')
+    scheduler.acquire('a', limits)
+    assert scheduler.get_metrics()['admitted'] == 3
+
+
+def test_full_queue_is_shed_immediately():
+    scheduler = FairScheduler(capacity=1, max_wait=5.0)
+    limits = PlanLimits(weight=1, max_concurrent=1, max_queue=0)
+    scheduler.acquire('other', PLAN_LIMITS['free'])
+
+    started = time.monotonic()
+    with pytest.raises(TenantBusyError):
+        scheduler.acquire('a', limits)
+    assert time.monotonic() - started < 1
+    assert scheduler.get_metrics()['shed_queue_full'] == 1
+
+
+def test_free_slot_goes_to_smallest_weighted_tag():
+    scheduler = FairScheduler(capacity=1, max_wait=5.0)
+    basic = PlanLimits(weight=1, max_concurrent=4, max_queue=10)
+    pro = PlanLimits(weight=4, max_concurrent=4, max_queue=10)
+    scheduler.acquire('holder', basic)
+
+    order = []
+
+    def request(name, tenant, limits):
+        scheduler.acquire(tenant, limits)
+        order.append(name)
+        scheduler.release(tenant)
+
+    threads = []
+    for name, tenant, limits in [('a1', 'a', basic), ('a2', 'a', basic), ('b1', 'b', pro)]:
+        thread = threading.Thread(target=request, args=(name, tenant, limits))
+        thread.start()
+        threads.append(thread)
+        _wait_for(lambda: scheduler.get_metrics()['waiting'] == len(threads))
+
+    scheduler.release('holder')
+    for thread in threads:
+        thread.join(2)
+    # Og'irligi katta tenant keyin kelgan bo'lsa ham oldinroq xizmat oladi
+    assert order == ['b1', 'a1', 'a2']
+
+
+@pytest.mark.parametrize('expires_in, expected', [
+    (None, PLAN_LIMITS['free']),
+    (timedelta(days=-1), PLAN_LIMITS['free']),
+    (timedelta(days=30), PLAN_LIMITS['pro']),
+])
+def test_tenant_limits_follow_plan_expiry(user, monkeypatch, expires_in, expected):
+    monkeypatch.setattr(admission, '_plans', {})
+    user.plan = 'pro'
+    user.plan_expires_at = datetime.utcnow() + expires_in if expires_in else None
+    db.session.commit()
+
+    assert admission.get_tenant_limits(user.id) == expected
+    assert bool(user.is_plan_active()) == (expected == PLAN_LIMITS['pro'])
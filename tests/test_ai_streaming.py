@@ -0,0 +1,41 @@
+import threading
+
+from utils import ai_handler
+from utils.answer_cache import get_answer_cache
+
+
+def test_identical_streams_share_one_upstream_call(app, user):
+    leader_text, pieces = ai_handler.open_tenant_ai_stream(user.id, 'Narxi qancha?', 'uz')
+    assert leader_text is None
+
+    follower = {}
+
+    def ask():
+        with app.app_context():
+            follower['result'] = ai_handler.open_tenant_ai_stream(user.id, 'Narxi qancha?', 'uz')
+
+    thread = threading.Thread(target=ask)
+    thread.start()
+    thread.join(0.2)
+    assert thread.is_alive()  # leader javobini kutyapti
+
+    answer = ''.join(pieces)
+    thread.join(5)
+    assert follower['result'] == (answer, None)
+    assert ai_handler._inflight.get_metrics()['in_flight'] == 0
+
+
+def test_cached_answer_is_returned_without_stream(app, user):
+    answer = ''.join(ai_handler.stream_tenant_ai_response(user.id, 'Manzil qayerda?', 'uz'))
+    text, pieces = ai_handler.open_tenant_ai_stream(user.id, 'Manzil qayerda?', 'uz')
+    assert (text, pieces) == (answer, None)
+
+
+def test_closed_leader_releases_followers(app, user):
+    _, pieces = ai_handler.open_tenant_ai_stream(user.id, 'Ish vaqti?', 'uz')
+    next(pieces)
+    pieces.close()
+    assert ai_handler._inflight.get_metrics()['in_flight'] == 0
+    assert get_answer_cache().get(
+        get_answer_cache().make_key(user.id, ai_handler.get_active_kb_id(user.id), 'uz', 'Ish vaqti?')
+    ) is None
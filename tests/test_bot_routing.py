@@ -0,0 +1,67 @@
+import pytest
+
+from models import db
+from models.cache_version import CacheVersion
+from models.telegram_bot import TelegramBot
+from utils import bot_routing
+from utils.bot_routing import BOT_ROUTES_VERSION, BotRoutingTable
+
+
+@pytest.fixture
+def table(db_session, clock, monkeypatch):
+    monkeypatch.setattr(bot_routing, 'time', clock)
+    return BotRoutingTable(ttl=300, negative_ttl=30, version_check_interval=2.0, max_entries=2)
+
+
+def _bot(user, token='123:abc'):
+    bot = TelegramBot(user.id, token, webhook_secret='s3cret')
+    bot.save()
+    return bot
+
+
+def test_route_is_cached(table, user):
+    bot = _bot(user)
+    route = table.get(user.id)
+    assert route.bot_id == bot.id and route.webhook_secret == 's3cret'
+
+    # Kesh ishlatiladi - bazadagi o'zgarish versiyasiz ko'rinmaydi
+    db.session.query(TelegramBot).update({'webhook_secret': 'changed'})
+    db.session.commit()
+    assert table.get(user.id).webhook_secret == 's3cret'
+    assert table.get_metrics()['hits'] == 1
+
+
+def test_missing_bot_is_negatively_cached(table, user, clock):
+    assert table.get(user.id) is None
+    _bot(user)
+    table.version_check_interval = 10 ** 6
+    assert table.get(user.id) is None
+    assert table.get_metrics()['negative_hits'] == 1
+
+    clock.advance(31)
+    assert table.get(user.id) is not None
+
+
+def test_version_bump_clears_routes(table, user, clock):
+    bot = _bot(user)
+    table.get(user.id)
+
+    # Boshqa worker botni yangiladi
+    bot.update(webhook_secret='rotated')
+    clock.advance(1)
+    assert table.get(user.id).webhook_secret == 's3cret'  # hali tekshirilmagan
+    clock.advance(2)
+    assert table.get(user.id).webhook_secret == 'rotated'
+    assert table.get_metrics()['version_changes'] == 1
+    assert table.get_metrics()['version'] == CacheVersion.get_version(BOT_ROUTES_VERSION)
+
+
+def test_invalidate_and_eviction(table, user):
+    _bot(user)
+    table.get(user.id)
+    table.invalidate(user.id)
+    assert table.get_metrics()['entries'] == 0
+
+    for user_id in (user.id, 1001, 1002):
+        table.get(user_id)
+    assert table.get_metrics()['entries'] == 2
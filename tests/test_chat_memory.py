@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db
+from models.chat_message import ChatMessage
+from utils import chat_memory
+from utils.chat_memory import ChatMemory, looks_like_follow_up
+
+
+@pytest.mark.parametrize('question, expected', [
+    ('Narxi qancha?', False),
+    ('Ish vaqtingiz qanday?', False),
+    ('Какая у вас доставка?', False),
+    ('Do you deliver to Tashkent?', False),
+    ('Uni qanday buyurtma qilsam bo\'ladi?', True),
+    ('Yana arzonrog\'i bormi?', True),
+    ('А сколько это стоит?', True),
+    ('What about weekends?', True),
+    ('How much is it?', True),
+])
+def test_follow_up_detection(question, expected):
+    assert looks_like_follow_up(question) is expected
+
+
+def test_sql_memory_is_shared_between_processes(user):
+    writer = ChatMemory(max_turns=2, max_bytes=1000, shared='sql')
+    reader = ChatMemory(max_turns=2, max_bytes=1000, shared='sql')
+    chat_key = (user.id, -100123)
+
+    writer.append(chat_key, 'q1', 'a1')
+    writer.append(chat_key, 'q2', 'a2')
+    writer.append(chat_key, 'q3', 'a3')
+    # Boshqa jarayon ham oxirgi max_turns juftlikni ko'radi
+    assert reader.get(chat_key) == [('q2', 'a2'), ('q3', 'a3')]
+    assert reader.get((user.id, 1)) == []
+
+    reader.clear(chat_key)
+    assert writer.get(chat_key) == []
+
+
+def test_sql_memory_keeps_byte_budget(user):
+    memory = ChatMemory(max_turns=6, max_bytes=20, shared='sql')
+    chat_key = (user.id, 5)
+    memory.append(chat_key, 'a' * 8, 'b' * 8)
+    memory.append(chat_key, 'c' * 4, 'd' * 4)
+    assert memory.get(chat_key) == [('c' * 4, 'd' * 4)]
+
+
+def test_sql_memory_caps_rows_per_chat(user):
+    memory = ChatMemory(max_turns=3, shared='sql')
+    chat_key = (user.id, 7)
+    for number in range(10):
+        memory.append(chat_key, f'q{number}', f'a{number}')
+    rows = ChatMessage.query.filter_by(conversation_id='tg:%d:7' % user.id).all()
+    assert sorted(row.user_text for row in rows) == ['q7', 'q8', 'q9']
+
+
+def test_sql_memory_deletes_idle_turns_periodically(user, clock, monkeypatch):
+    monkeypatch.setattr(chat_memory, 'time', clock)
+    memory = ChatMemory(idle_ttl=3600, shared='sql', cleanup_interval=300)
+    old_key, fresh_key = (user.id, 1), (user.id, 2)
+    memory.append(old_key, 'eski', 'javob')
+    ChatMessage.query.update({'created_at': datetime.utcnow() - timedelta(hours=2)})
+    db.session.commit()
+
+    memory.append(fresh_key, 'yangi', 'javob')
+    assert ChatMessage.query.count() == 2  # interval hali o'tmagan
+
+    clock.advance(300)
+    memory.append(fresh_key, 'yana', 'javob')
+    assert [row.user_text for row in ChatMessage.query.order_by(ChatMessage.id)] == ['yangi', 'yana']
+    assert memory.get_metrics()['rows_deleted'] == 1
@@ -0,0 +1,89 @@
+import pytest
+
+from utils import circuit_breaker
+from utils.circuit_breaker import CLOSED, HALF_OPEN, OPEN, CircuitBreaker
+
+
+@pytest.fixture
+def breaker(clock, monkeypatch):
+    monkeypatch.setattr(circuit_breaker, 'time', clock)
+    return CircuitBreaker(failure_threshold=3, slow_call_threshold=2.0, reset_timeout=30.0)
+
+
+def test_opens_after_consecutive_failures(breaker):
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success(0.1)  # muvaffaqiyat hisoblagichni nolga qaytaradi
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == CLOSED
+
+    breaker.record_failure(reason='timeouts')
+    assert breaker.state == OPEN
+    assert breaker.allow() is False
+    assert breaker.get_metrics()['rejected'] == 1
+
+
+def test_slow_calls_count_as_failures(breaker):
+    for _ in range(3):
+        breaker.record_success(elapsed=5.0)
+    assert breaker.state == OPEN
+    assert breaker.get_metrics()['slow_calls'] == 3
+
+
+def test_half_open_allows_single_trial(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.advance(30)
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() is True
+    assert breaker.allow() is False
+
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
+    assert breaker.allow() is True
+
+
+def test_failed_trial_reopens(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.advance(30)
+    assert breaker.allow() is True
+    breaker.record_failure()
+    assert breaker.state == OPEN
+    assert breaker.get_metrics()['opened'] == 2
+
+    clock.advance(29)
+    assert breaker.state == OPEN
+    clock.advance(1)
+    assert breaker.state == HALF_OPEN
+
+
+def test_late_success_does_not_close_open_breaker(breaker):
+    for _ in range(3):
+        breaker.record_failure()
+    # Breaker ochilishidan oldin boshlangan chaqiruv endi muvaffaqiyatli tugadi
+    breaker.record_success(0.1)
+    assert breaker.state == OPEN
+    assert breaker.allow() is False
+
+
+def test_failures_while_open_keep_cool_down(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.advance(20)
+    breaker.record_failure(reason='timeouts')
+    assert breaker.get_metrics()['opened'] == 1
+    clock.advance(10)
+    assert breaker.state == HALF_OPEN
+
+
+def test_only_trial_result_decides_half_open(breaker, clock):
+    for _ in range(3):
+        breaker.record_failure()
+    clock.advance(30)
+    breaker.record_failure()  # sinovdan oldingi kechikkan chaqiruv
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow() is True
+    breaker.record_success(0.1)
+    assert breaker.state == CLOSED
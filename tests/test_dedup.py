@@ -0,0 +1,58 @@
+import pytest
+
+from models.processed_update import ProcessedUpdate
+from utils import dedup
+from utils.dedup import UpdateDeduplicator
+
+
+@pytest.fixture
+def memory_dedup(clock, monkeypatch):
+    monkeypatch.setattr(dedup, 'time', clock)
+    return UpdateDeduplicator(ttl=60, max_entries=3)
+
+
+def test_claim_once_then_duplicate(memory_dedup):
+    assert memory_dedup.seen(1, 100) is False
+    assert memory_dedup.claim(1, 100) is True
+    assert memory_dedup.seen(1, 100) is True
+    assert memory_dedup.claim(1, 100) is False
+    # Boshqa bot uchun xuddi shu update_id - alohida update
+    assert memory_dedup.claim(2, 100) is True
+    assert memory_dedup.get_metrics()['duplicates'] == 2
+
+
+def test_release_allows_reclaim(memory_dedup):
+    assert memory_dedup.claim(1, 100) is True
+    memory_dedup.release(1, 100)
+    assert memory_dedup.seen(1, 100) is False
+    assert memory_dedup.claim(1, 100) is True
+
+
+def test_entries_expire_after_ttl(memory_dedup, clock):
+    memory_dedup.claim(1, 100)
+    clock.advance(61)
+    assert memory_dedup.seen(1, 100) is False
+    assert memory_dedup.claim(1, 100) is True
+
+
+def test_oldest_entries_are_evicted(memory_dedup):
+    for update_id in range(5):
+        memory_dedup.claim(1, update_id)
+    assert memory_dedup.get_metrics()['memory_entries'] == 3
+    assert memory_dedup.seen(1, 0) is False
+    assert memory_dedup.seen(1, 4) is True
+
+
+def test_sql_tier_catches_duplicates_across_processes(db_session):
+    first = UpdateDeduplicator(ttl=60, use_sql=True)
+    second = UpdateDeduplicator(ttl=60, use_sql=True)
+
+    assert first.claim(1, 100) is True
+    # Boshqa jarayon: xotira darajasi bo'sh, lekin SQL yozuv bor
+    assert second.claim(1, 100) is False
+    assert second.get_metrics()['sql_duplicates'] == 1
+
+    first.release(1, 100)
+    assert ProcessedUpdate.query.count() == 0
+    assert second.claim(1, 100) is False  # o'zining xotira darajasida qolgan
+    assert UpdateDeduplicator(ttl=60, use_sql=True).claim(1, 100) is True
@@ -0,0 +1,126 @@
+import os
+from io import BytesIO
+
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.ingestion_job import IngestionJob
+from models.knowledge_base import KnowledgeBase
+from models.knowledge_document import KnowledgeDocument
+from models.user import User
+from utils import document_store, ingestion
+from utils.document_store import blob_path, delete_knowledge_bases, discard_blob, save_upload, store_blob
+
+CONTENT = "Yetkazib berish Toshkent bo'ylab bepul. Ish vaqti 9:00 dan 18:00 gacha.".encode('utf-8')
+
+
+def _upload(user_id, content=CONTENT, filename='faq.txt'):
+    upload = save_upload(BytesIO(content))
+    path = store_blob(upload, filename)
+    return ingestion.enqueue_ingestion(user_id, filename, path, file_sha256=upload.sha256)
+
+
+def _other_user():
+    user = User('Other', '+998907654321', 'other@example.com', password='secret123')
+    db.session.add(user)
+    db.session.commit()
+    return user
+
+
+def test_reupload_replaces_kb_without_leaking_references(user):
+    first = _upload(user.id)
+    second = _upload(user.id)
+    assert (first.status, second.status) == ('done', 'done')
+
+    kbs = KnowledgeBase.query.filter_by(user_id=user.id).all()
+    assert [kb.id for kb in kbs] == [second.kb_id]
+    assert kbs[0].is_active
+    document = db.session.get(KnowledgeDocument, kbs[0].document_id)
+    assert document.ref_count == 1
+
+
+def test_last_reference_removes_document_and_blob(user):
+    other = _other_user()
+    _upload(user.id)
+    _upload(other.id)
+    document = KnowledgeDocument.query.one()
+    assert document.ref_count == 2
+    blob = document.file_path
+
+    delete_knowledge_bases(KnowledgeBase.query.filter_by(user_id=user.id).all())
+    db.session.refresh(document)
+    assert document.ref_count == 1 and os.path.exists(blob)
+
+    delete_knowledge_bases(list(other.knowledge_bases))
+    assert KnowledgeDocument.query.count() == 0
+    assert not os.path.exists(blob)
+
+
+def test_admin_user_delete_releases_references(app, user):
+    admin = User('Admin', '+998900000000', 'admin@example.com', password='secret123', is_admin=True)
+    db.session.add(admin)
+    db.session.commit()
+    _upload(user.id)
+
+    client = app.test_client()
+    client.post('/auth/login', data={'email': 'admin@example.com', 'password': 'secret123'})
+    client.get(f'/admin/delete/{user.id}')
+
+    assert db.session.get(User, user.id) is None
+    assert KnowledgeDocument.query.count() == 0
+
+
+def test_concurrent_document_conflict_retries_once(user, monkeypatch):
+    def conflict(*args, **kwargs):
+        raise IntegrityError('INSERT', {}, Exception('duplicate content_hash'))
+
+    calls = []
+    monkeypatch.setattr(ingestion, 'create_document', conflict)
+    monkeypatch.setattr(ingestion, '_reuse_document', lambda job: calls.append(job.id))
+
+    job = _upload(user.id)
+    assert job.status == 'failed'
+    assert len(calls) == 2  # oldin va IntegrityError dan keyin - rekursiyasiz
+    assert db.session.get(IngestionJob, job.id).kb_id is None
+
+
+def test_upload_job_references_blob_before_it_is_stored(user, monkeypatch):
+    stored = []
+
+    def store(upload, filename):
+        # Fayl joylanayotganda navbat yozuvi allaqachon saqlangan - workerlar uni olmaydi
+        job = IngestionJob.query.one()
+        stored.append((job.file_path, job.status))
+        return store_blob(upload, filename)
+
+    monkeypatch.setattr(ingestion, 'store_blob', store)
+    monkeypatch.setattr(ingestion, 'is_running', lambda: True)
+    upload = save_upload(BytesIO(CONTENT))
+    job = ingestion.enqueue_ingestion(user.id, 'faq.txt', upload=upload)
+
+    path = blob_path(upload.sha256, 'faq.txt')
+    assert stored == [(path, 'running')]
+    assert (job.file_path, job.status, job.locked_at) == (path, 'pending', None)
+    assert os.path.exists(path)
+
+
+def test_discard_keeps_blob_referenced_meanwhile(user, monkeypatch):
+    upload = save_upload(BytesIO(CONTENT))
+    path = store_blob(upload, 'faq.txt')
+    in_use = document_store._blob_in_use
+    checks = []
+
+    def racing_upload(file_path):
+        # Birinchi tekshiruvdan keyin xuddi shu faylni boshqa so'rov navbatga qo'ydi
+        if not checks:
+            db.session.add(IngestionJob(user_id=user.id, file_name='faq.txt', file_path=file_path,
+                                        file_sha256=upload.sha256))
+            db.session.commit()
+            checks.append(False)
+            return False
+        return in_use(file_path)
+
+    monkeypatch.setattr(document_store, '_blob_in_use', racing_upload)
+    discard_blob(path)
+    assert os.path.exists(path)
+    assert not [name for name in os.listdir(os.path.dirname(path)) if name.endswith('.deleting')]
@@ -0,0 +1,124 @@
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import docx
+
+from models.knowledge_chunk import KnowledgeChunk
+from utils import file_parser, ingestion
+from utils.document_store import save_upload, store_blob
+from utils.file_parser import extract_docx_document, extract_pdf_document, iter_pdf_pages
+from utils.retrieval import chunk_pages, chunk_records, chunk_text
+
+
+def _pdf(page_texts):
+    """Har bir sahifasida bitta matn qatori bo'lgan oddiy PDF"""
+    objects = [b'<< /Type /Catalog /Pages 2 0 R >>', None,
+               b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>']
+    kids = []
+    for text in page_texts:
+        stream = b'BT /F1 10 Tf 20 700 Td (' + text.encode('latin-1') + b') Tj ET'
+        objects.append(b'<< /Length %d >>\nstream\n%s\nendstream' % (len(stream), stream))
+        objects.append(b'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] '
+                       b'/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>' % len(objects))
+        kids.append(b'%d 0 R' % len(objects))
+    objects[1] = b'<< /Type /Pages /Kids [%s] /Count %d >>' % (b' '.join(kids), len(kids))
+
+    data = b'%PDF-1.4\n'
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(data))
+        data += b'%d 0 obj\n%s\nendobj\n' % (number, body)
+    xref = len(data)
+    data += b'xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1)
+    data += b''.join(b'%010d 00000 n \n' % offset for offset in offsets)
+    data += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (len(objects) + 1, xref)
+    return data
+
+
+def _page_text(number):
+    return ' '.join(f'Sahifa {number} gap {sentence}.' for sentence in range(12))
+
+
+def _docx():
+    document = docx.Document()
+    document.add_paragraph('Kirish matni.')
+    document.add_paragraph('Ikkinchi  paragraf!')
+    table = document.add_table(rows=2, cols=2)
+    for number, row in enumerate(table.rows):
+        row.cells[0].text = f'Nomi {number}'
+        row.cells[1].text = f'{number * 100} UZS'
+    document.add_paragraph('Xulosa.')
+    buffer = BytesIO()
+    document.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+
+def test_docx_rows_are_separate_records():
+    document = extract_docx_document(_docx())
+    assert document.text.split('\n') == [
+        'Kirish matni.', 'Ikkinchi paragraf!', 'Nomi 0; 0 UZS;', 'Nomi 1; 100 UZS;', 'Xulosa.'
+    ]
+    # Ketma-ket paragraflar bitta yozuv, har bir jadval qatori - alohida
+    assert [document.text[start:end] for start, end in document.records] == [
+        'Kirish matni.\nIkkinchi paragraf!', 'Nomi 0; 0 UZS;', 'Nomi 1; 100 UZS;', 'Xulosa.'
+    ]
+    chunks = chunk_records(document.text, document.records)
+    assert [chunk.text for chunk in chunks][1:3] == ['Nomi 0; 0 UZS;', 'Nomi 1; 100 UZS;']
+
+
+def test_pdf_pages_are_read_through_bounded_window(tmp_path, app, monkeypatch):
+    path = tmp_path / 'katta.pdf'
+    path.write_bytes(_pdf([_page_text(number) for number in range(1, 13)]))
+    submitted = []
+    pool = ThreadPoolExecutor(max_workers=2)
+
+    def submit(fn, *args):
+        submitted.append(args[1:])
+        return ThreadPoolExecutor.submit(pool, fn, *args)
+
+    monkeypatch.setattr(pool, 'submit', submit)
+    monkeypatch.setattr(file_parser, '_get_pdf_pool', lambda: pool)
+    with app.app_context():
+        app.config.update(PDF_PARALLEL_MIN_PAGES=2, PDF_PAGES_PER_TASK=2, PDF_WORKERS=2)
+        try:
+            pages = iter_pdf_pages(str(path))
+            next(pages)
+            # Birinchi sahifa olinganda pulga faqat PDF_WORKERS * 2 ta oraliq yuborilgan
+            assert submitted == [(0, 2), (2, 4), (4, 6), (6, 8)]
+            assert [number for number, _text in pages] == list(range(2, 13))
+            assert len(submitted) == 6
+        finally:
+            app.config.update(PDF_PARALLEL_MIN_PAGES=100, PDF_PAGES_PER_TASK=100, PDF_WORKERS=2)
+            pool.shutdown()
+
+
+def test_streamed_page_chunks_keep_offsets_and_pages():
+    pages = [(number, _page_text(number)) for number in range(1, 30)]
+    pages.insert(3, (100, ''))  # bo'sh sahifa offsetlarga ta'sir qilmaydi
+    tail = "\n\nQo'shimcha ma'lumot:\nChegirma yo'q."
+    text = ' '.join(page for _number, page in pages if page) + tail
+
+    streamed = list(chunk_pages(iter(pages), tail_text=tail, chunk_size=300, overlap=80))
+    assert [chunk for chunk, _start, _end in streamed] == chunk_text(text, chunk_size=300, overlap=80)
+    for chunk, page_start, page_end in streamed[:-1]:
+        assert chunk.text.startswith(f'Sahifa {page_start} gap')
+        assert chunk.text.split(' gap ')[-2].endswith(f'Sahifa {page_end}')
+    last, page_start, page_end = streamed[-1]
+    assert last.text.endswith("Chegirma yo'q.") and page_start == 29
+
+
+def test_pdf_upload_stores_page_labels(user):
+    upload = save_upload(BytesIO(_pdf([_page_text(number) for number in range(1, 4)])))
+    path = store_blob(upload, 'katalog.pdf')
+    job = ingestion.enqueue_ingestion(user.id, 'katalog.pdf', path, file_sha256=upload.sha256)
+    assert job.status == 'done'
+    chunks = KnowledgeChunk.query.order_by(KnowledgeChunk.ordinal).all()
+    assert chunks and all(chunk.kb_id is None and chunk.document_id for chunk in chunks)
+    assert chunks[0].page_label.startswith('[p. 1')
+    assert chunks[-1].page_label.endswith('3]')
+
+    document = extract_pdf_document(job.file_path)
+    assert [(chunk.start_offset, chunk.end_offset) for chunk in chunks] == [
+        (chunk.start, chunk.end) for chunk in chunk_text(document.text)
+    ]
@@ -0,0 +1,76 @@
+import pytest
+
+from models.telegram_bot import TelegramBot
+from utils import endpoint_limits, rate_limit
+from utils.endpoint_limits import EndpointRateLimiter, parse_limit
+from utils.rate_limit import KeyedBuckets, TokenBucket
+
+
+@pytest.fixture
+def fake_time(clock, monkeypatch):
+    monkeypatch.setattr(rate_limit, 'time', clock)
+    return clock
+
+
+def test_token_bucket_refills_at_rate(fake_time):
+    bucket = TokenBucket(rate=2, capacity=3)
+    assert [bucket.try_acquire()[0] for _ in range(4)] == [True, True, True, False]
+    assert bucket.try_acquire() == (False, 0.5)
+
+    fake_time.advance(0.5)
+    assert bucket.try_acquire() == (True, 0.0)
+    # Uzoq kutish capacity dan ortiq token bermaydi
+    fake_time.advance(60)
+    assert [bucket.try_acquire()[0] for _ in range(4)] == [True, True, True, False]
+
+
+def test_penalize_empties_bucket(fake_time):
+    bucket = TokenBucket(rate=1, capacity=5)
+    bucket.penalize(3)
+    allowed, wait = bucket.try_acquire()
+    assert not allowed and wait == pytest.approx(4.0)
+    fake_time.advance(4)
+    assert bucket.try_acquire()[0]
+
+
+def test_keyed_buckets_evict_least_recent(fake_time):
+    buckets = KeyedBuckets(rate=1, capacity=1, max_keys=2)
+    buckets.get('a').try_acquire()
+    buckets.get('b')
+    buckets.get('a')
+    buckets.get('c')
+    assert len(buckets) == 2
+    assert buckets.get('a').try_acquire()[0] is False  # 'a' saqlangan, 'b' chiqarilgan
+
+
+def test_endpoint_limiter_is_per_key(fake_time):
+    limiter = EndpointRateLimiter()
+    limit = parse_limit('2/10')
+    assert limit == (0.2, 2.0)
+    assert limiter.hit('contact', '1.1.1.1', limit)[0]
+    assert limiter.hit('contact', '1.1.1.1', limit)[0]
+    allowed, wait = limiter.hit('contact', '1.1.1.1', limit)
+    assert not allowed and wait == pytest.approx(5.0)
+    assert limiter.hit('contact', '2.2.2.2', limit)[0]
+
+
+def test_webhook_limits_only_failed_secret_checks(app, user, monkeypatch):
+    monkeypatch.setattr(endpoint_limits, '_limiter', EndpointRateLimiter())
+    monkeypatch.setitem(app.config, 'RATE_LIMIT_WEBHOOK_AUTH_FAILURES', '3/60')
+    TelegramBot(user.id, '123:abc', webhook_secret='s3cret').save()
+    client = app.test_client()
+    url = f'/telegram/webhook/{user.id}'
+
+    # Haqiqiy update lar cheklanmaydi (matnsiz xabar - navbatga qo'yilmaydi)
+    for update_id in range(20):
+        response = client.post(url, json={'update_id': update_id, 'message': {'chat': {'id': 1}}},
+                               headers={'X-Telegram-Bot-Api-Secret-Token': 's3cret'})
+        assert response.status_code == 200
+
+    statuses = [client.post(url, json={'update_id': 100 + n}, headers={'X-Telegram-Bot-Api-Secret-Token': 'bad'}).status_code
+                for n in range(5)]
+    assert statuses == [403, 403, 403, 429, 429]
+
+    response = client.post(url, json={'update_id': 200, 'message': {'chat': {'id': 1}}},
+                           headers={'X-Telegram-Bot-Api-Secret-Token': 's3cret'})
+    assert response.status_code == 200
@@ -0,0 +1,38 @@
+from utils.retrieval import BM25Index, chunk_text, tokenize
+
+
+def test_chunks_advance_past_long_sentence():
+    text = 'Salom. ' * 5 + 'A' * 2000
+    chunks = chunk_text(text)
+    ends = [chunk.end for chunk in chunks]
+    # Har bir bo'lak oldingisidan keyinroq tugaydi - bir xil dumlar qaytarilmaydi
+    assert ends == sorted(set(ends))
+    assert ends[-1] == len(text.rstrip())
+    assert all(len(chunk.text) <= 800 for chunk in chunks)
+
+
+def test_chunks_overlap_on_sentence_boundaries():
+    sentences = [f'Bu {number}-gap va unda bir nechta soz bor.' for number in range(60)]
+    text = ' '.join(sentences)
+    chunks = chunk_text(text, chunk_size=300, overlap=100)
+    assert len(chunks) > 1
+    for previous, current in zip(chunks, chunks[1:]):
+        assert current.start < previous.end < current.end
+        assert text[current.start:previous.end].strip() in previous.text
+    assert chunks[0].start == 0 and chunks[-1].end == len(text)
+
+
+def test_tokenize_adds_prefix_terms():
+    assert tokenize("Narxi O'zbekistonda") == ['narxi', 'narx*', "o'zbekistonda", "o'zb*"]
+
+
+def test_bm25_ranks_matching_document_first():
+    index = BM25Index([
+        'Yetkazib berish Toshkent boylab bepul.',
+        'Mahsulot narxi 100 000 som, chegirma yoq.',
+        'Ish vaqti 9 dan 18 gacha.',
+    ])
+    results = index.search('narxlar qancha', top_k=2)
+    # 'narxlar' faqat 'narx*' prefiksi orqali mos keladi
+    assert results[0][0] == 1
+    assert index.search('umuman boshqa narsa', top_k=2) == []
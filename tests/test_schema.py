@@ -0,0 +1,42 @@
+from sqlalchemy import create_engine, inspect, text
+
+from utils.schema import upgrade_schema
+
+OLD_TABLES = [
+    'CREATE TABLE telegram_bots (id INTEGER PRIMARY KEY, bot_token VARCHAR(255))',
+    'CREATE TABLE knowledge_base (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, file_name VARCHAR(255), '
+    'file_path VARCHAR(500), content TEXT)',
+    'CREATE TABLE knowledge_chunks (id INTEGER PRIMARY KEY, kb_id INTEGER NOT NULL, ordinal INTEGER NOT NULL, '
+    'text TEXT NOT NULL)',
+    'CREATE TABLE webhook_jobs (id INTEGER PRIMARY KEY, status VARCHAR(20), shard INTEGER NOT NULL DEFAULT 0)',
+    'CREATE INDEX ix_webhook_jobs_shard_status ON webhook_jobs (shard, status, id)',
+]
+
+
+def _columns(engine, table):
+    return {column['name'] for column in inspect(engine).get_columns(table)}
+
+
+def test_upgrade_adds_missing_columns_once(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    with engine.begin() as connection:
+        for statement in OLD_TABLES:
+            connection.execute(text(statement))
+
+    added = upgrade_schema(engine)
+    assert sorted(added) == [
+        'knowledge_base.document_id', 'knowledge_chunks.document_id', 'knowledge_chunks.page_end',
+        'knowledge_chunks.page_start', 'telegram_bots.webhook_secret', 'webhook_jobs.next_attempt_at',
+    ]
+    assert {'document_id', 'page_start', 'page_end'} <= _columns(engine, 'knowledge_chunks')
+    indexes = {index['name'] for index in inspect(engine).get_indexes('webhook_jobs')}
+    assert indexes == {'ix_webhook_jobs_status_id'}
+
+    # Ikkinchi ishga tushish hech narsani o'zgartirmaydi
+    assert upgrade_schema(engine) == []
+
+
+def test_upgrade_is_noop_on_current_schema(app):
+    from models import db
+    with app.app_context():
+        assert upgrade_schema(db.engine) == []
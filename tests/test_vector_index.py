@@ -0,0 +1,45 @@
+import threading
+
+import numpy as np
+import pytest
+
+from utils import vector_index
+from utils.vector_index import VectorIndex, search_vectors
+
+
+class RemoteEmbedder:
+    name = 'remote'
+    remote = True
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.stall = False
+
+    def embed_query(self, text):
+        if self.stall:
+            self.release.wait(5)
+        return np.array([1.0, 0.0], dtype=np.float32)
+
+
+@pytest.fixture
+def embedder(app, monkeypatch):
+    embedder = RemoteEmbedder()
+    monkeypatch.setattr(vector_index, '_breaker', None)
+    monkeypatch.setattr(vector_index, 'get_embedder', lambda: embedder)
+    monkeypatch.setattr(vector_index, 'get_vector_index',
+                        lambda *args, **kwargs: VectorIndex(np.eye(2, dtype=np.float32)))
+    monkeypatch.setitem(app.config, 'EMBEDDING_TIMEOUT', 0.05)
+    with app.app_context():
+        yield embedder
+    embedder.release.set()
+
+
+def test_remote_query_embedding_is_searched(embedder):
+    assert search_vectors(1, 1, 'narxi', top_k=1)[0][0] == 0
+
+
+def test_stalled_query_embedding_falls_back_to_bm25(embedder):
+    embedder.stall = True
+    # Muddat o'tgach vektor natijalari bo'sh - retrieve_context faqat BM25 bilan qoladi
+    assert search_vectors(1, 1, 'narxi', top_k=1) == []
+    assert vector_index.get_embedding_breaker().get_metrics()['timeouts'] == 1
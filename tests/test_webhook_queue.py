@@ -0,0 +1,168 @@
+import json
+from datetime import datetime, timedelta
+
+import pytest
+
+from models import db
+from models.webhook_job import WebhookJob
+from utils import webhook_queue
+
+
+@pytest.fixture
+def queue(db_session, monkeypatch):
+    monkeypatch.setitem(webhook_queue._settings, 'num_shards', 1)
+    monkeypatch.setitem(webhook_queue._settings, 'debounce_seconds', 0.0)
+    monkeypatch.setitem(webhook_queue._settings, 'max_attempts', 3)
+    monkeypatch.setitem(webhook_queue._settings, 'retry_base_seconds', 2.0)
+    monkeypatch.setitem(webhook_queue._settings, 'retry_max_seconds', 60.0)
+    return webhook_queue
+
+
+def _message(chat_id, text, update_id=1):
+    return {'update_id': update_id, 'message': {'chat': {'id': chat_id}, 'text': text}}
+
+
+def test_same_chat_jobs_run_in_order(queue, user):
+    first = queue.enqueue_update(user.id, 10, _message(10, 'a'))
+    second = queue.enqueue_update(user.id, 10, _message(10, 'b'))
+
+    claimed = queue.claim_next_job(0)
+    assert claimed.id == first.id
+    # Birinchi ish bajarilayotganda shu chatning keyingi ishi olinmaydi
+    assert queue.claim_next_job(0) is None
+
+    queue._finish_job(claimed)
+    assert queue.claim_next_job(0).id == second.id
+
+
+def test_other_chats_are_not_blocked(queue, user):
+    queue.enqueue_update(user.id, 10, _message(10, 'a'))
+    queue.enqueue_update(user.id, 10, _message(10, 'b'))
+    other = queue.enqueue_update(user.id, 11, _message(11, 'c'))
+
+    queue.claim_next_job(0)
+    assert queue.claim_next_job(0).id == other.id
+
+
+def test_failed_job_backs_off_and_keeps_chat_order(queue, user):
+    first = queue.enqueue_update(user.id, 10, _message(10, 'a'))
+    queue.enqueue_update(user.id, 10, _message(10, 'b'))
+
+    claimed = queue.claim_next_job(0)
+    queue._finish_job(claimed, error='boom')
+    job = db.session.get(WebhookJob, first.id)
+    assert job.status == 'pending'
+    assert job.next_attempt_at > datetime.utcnow() + timedelta(seconds=1)
+    # Kutish tugamaguncha na o'zi, na chatdagi keyingi ish olinadi
+    assert queue.claim_next_job(0) is None
+
+    job.next_attempt_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    assert queue.claim_next_job(0).id == first.id
+
+
+def test_retry_delay_is_exponential_and_capped(queue):
+    assert [queue.retry_delay(n) for n in (1, 2, 3, 4)] == [2.0, 4.0, 8.0, 16.0]
+    assert queue.retry_delay(10) == 60.0
+
+
+def test_job_fails_after_max_attempts(queue, user):
+    queue.enqueue_update(user.id, 10, _message(10, 'a'))
+    for _ in range(3):
+        claimed = queue.claim_next_job(0)
+        queue._finish_job(claimed, error='boom')
+        claimed.next_attempt_at = None
+        db.session.commit()
+    assert claimed.status == 'failed'
+    assert queue.claim_next_job(0) is None
+
+
+def test_shard_is_computed_at_claim_time(queue, user, monkeypatch):
+    # Boshqa WEBHOOK_WORKERS bilan ishlagan jarayon yozgan ish
+    job = WebhookJob(user.id, 7, json.dumps(_message(7, 'a')), shard=5)
+    db.session.add(job)
+    db.session.commit()
+
+    monkeypatch.setitem(queue._settings, 'num_shards', 2)
+    assert queue.claim_next_job(0) is None
+    assert queue.claim_next_job(1).id == job.id
+
+
+@pytest.fixture
+def debounced(queue, monkeypatch):
+    monkeypatch.setitem(webhook_queue._settings, 'debounce_seconds', 1.0)
+    monkeypatch.setitem(webhook_queue._settings, 'debounce_max_wait', 5.0)
+    monkeypatch.setitem(webhook_queue._settings, 'debounce_max_messages', 3)
+    return queue
+
+
+def _age(job, seconds):
+    job.created_at = datetime.utcnow() - timedelta(seconds=seconds)
+    db.session.commit()
+
+
+def test_debounce_waits_for_chat_to_settle(debounced, user):
+    first = debounced.enqueue_update(user.id, 10, _message(10, 'a'))
+    second = debounced.enqueue_update(user.id, 10, _message(10, 'b'))
+    _age(first, 2)
+    # Oxirgi xabar hozirgina keldi - foydalanuvchi hali yozyapti
+    assert debounced.claim_next_job(0) is None
+
+    _age(second, 1.5)
+    claimed = debounced.claim_next_job(0)
+    assert [job.id for job in claimed.batch] == [first.id, second.id]
+
+
+def test_debounce_max_wait_bounds_the_delay(debounced, user):
+    first = debounced.enqueue_update(user.id, 10, _message(10, 'a'))
+    debounced.enqueue_update(user.id, 10, _message(10, 'b'))
+    _age(first, 6)
+    assert debounced.claim_next_job(0).id == first.id
+
+
+def test_followers_are_capped_and_same_kind_only(debounced, user):
+    jobs = [debounced.enqueue_update(user.id, 10, _message(10, text)) for text in 'abcd']
+    edited = debounced.enqueue_update(user.id, 10, {'update_id': 9, 'edited_message': {'chat': {'id': 10}, 'text': 'e'}})
+    for job in jobs + [edited]:
+        _age(job, 2)
+
+    claimed = debounced.claim_next_job(0)
+    assert [job.id for job in claimed.batch] == [job.id for job in jobs[:3]]
+    debounced.run_job(claimed, lambda user_id, update_data: None)
+
+    # Boshqa turdagi update kelgan joyda to'plam yopiladi
+    claimed = debounced.claim_next_job(0)
+    assert [job.id for job in claimed.batch] == [jobs[3].id]
+    debounced.run_job(claimed, lambda user_id, update_data: None)
+    assert [job.id for job in debounced.claim_next_job(0).batch] == [edited.id]
+
+
+def test_merge_updates_joins_text_and_captions():
+    updates = [
+        _message(10, 'salom', update_id=1),
+        {'update_id': 2, 'message': {'chat': {'id': 10}, 'photo': [{}], 'caption': 'bu nima?'}},
+        {'update_id': 3, 'message': {'chat': {'id': 10}, 'sticker': {}}},
+    ]
+    merged = webhook_queue.merge_updates(updates)
+    assert merged['update_id'] == 3
+    assert merged['message']['text'] == 'salom\nbu nima?'
+    assert webhook_queue.merge_updates(updates[1:2]) == updates[1]
+
+
+def test_backed_off_chat_does_not_starve_other_chats(queue, user):
+    retry_at = datetime.utcnow() + timedelta(minutes=5)
+    for number in range(25):
+        db.session.add(WebhookJob(user.id, 10, json.dumps(_message(10, str(number))), next_attempt_at=retry_at))
+    db.session.commit()
+    other = queue.enqueue_update(user.id, 11, _message(11, 'x'))
+
+    assert queue.claim_next_job(0).id == other.id
+
+
+def test_busy_chat_does_not_starve_other_chats(queue, user):
+    for number in range(25):
+        queue.enqueue_update(user.id, 10, _message(10, str(number)))
+    other = queue.enqueue_update(user.id, 11, _message(11, 'x'))
+
+    assert queue.claim_next_job(0).chat_id == 10
+    assert queue.claim_next_job(0).id == other.id
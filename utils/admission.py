@@ -0,0 +1,202 @@
+import threading
+import time
+from collections import deque, namedtuple
+from contextlib import contextmanager
+
+from flask import current_app, has_app_context
+
+from models import db
+from models.user import User
+from utils import metrics
+
+PlanLimits = namedtuple('PlanLimits', ['weight', 'max_concurrent', 'max_queue'])
+
+# Tarif bo'yicha ulush: weight - navbatdagi nisbiy ulush, max_concurrent - bir
+# vaqtda bajariladigan AI chaqiruvlari, max_queue - kutayotgan so'rovlar chegarasi
+PLAN_LIMITS = {
+    'free': PlanLimits(weight=1, max_concurrent=2, max_queue=4),
+    'basic': PlanLimits(weight=2, max_concurrent=4, max_queue=10),
+    'pro': PlanLimits(weight=4, max_concurrent=8, max_queue=20),
+}
+# Ro'yxatda bo'lmagan pullik tariflar
+DEFAULT_PAID_LIMITS = PlanLimits(weight=2, max_concurrent=4, max_queue=10)
+
+PLAN_CACHE_TTL = 60  # seconds
+
+
+class TenantBusyError(Exception):
+    """Tenant navbati to'lgan yoki kutish vaqti tugagan - so'rov rad etildi"""
+
+
+class _Ticket:
+    __slots__ = ('tag', 'granted')
+
+    def __init__(self, tag):
+        self.tag = tag
+        self.granted = False
+
+
+class _TenantState:
+    __slots__ = ('limits', 'active', 'queue', 'last_tag', 'admitted', 'shed')
+
+    def __init__(self, limits):
+        self.limits = limits
+        self.active = 0
+        self.queue = deque()
+        self.last_tag = 0.0
+        self.admitted = 0
+        self.shed = 0
+
+
+class FairScheduler:
+    """
+    AI chaqiruvlari uchun tenantlar bo'yicha adolatli navbat (weighted fair queuing).
+
+    Jarayon bo'yicha umumiy `capacity` ta slot bor. Har bir so'rovga virtual
+    tugash vaqti (tag = max(virtual vaqt, tenantning oxirgi tagi) + 1/weight)
+    beriladi; bo'sh slot eng kichik tagli so'rovga, tenantning o'z
+    max_concurrent chegarasi doirasida beriladi. Navbati max_queue dan oshgan
+    yoki `max_wait` dan ko'p kutgan so'rov TenantBusyError bilan rad etiladi.
+    """
+
+    def __init__(self, capacity=16, max_wait=10.0):
+        self.capacity = capacity
+        self.max_wait = max_wait
+        self._cond = threading.Condition()
+        self._tenants = {}
+        self._active = 0
+        self._virtual_time = 0.0
+        self._metrics = {'admitted': 0, 'queued': 0, 'shed_queue_full': 0, 'shed_timeout': 0, 'wait_seconds': 0.0}
+
+    def _dispatch(self):
+        """Bo'sh slotlarni eng kichik tagli navbatdagi so'rovlarga berish"""
+        granted = False
+        while self._active < self.capacity:
+            best = None
+            for state in self._tenants.values():
+                if state.queue and state.active < state.limits.max_concurrent:
+                    if best is None or state.queue[0].tag < best.queue[0].tag:
+                        best = state
+            if best is None:
+                break
+            ticket = best.queue.popleft()
+            ticket.granted = True
+            best.active += 1
+            self._active += 1
+            self._virtual_time = max(self._virtual_time, ticket.tag)
+            granted = True
+        if granted:
+            self._cond.notify_all()
+
+    def acquire(self, tenant, limits):
+        """Tenant uchun slot olish (navbat bo'yicha kutadi yoki TenantBusyError)"""
+        started = time.monotonic()
+        with self._cond:
+            state = self._tenants.get(tenant)
+            if state is None:
+                state = self._tenants[tenant] = _TenantState(limits)
+            state.limits = limits
+
+            if len(state.queue) >= limits.max_queue:
+                state.shed += 1
+                self._metrics['shed_queue_full'] += 1
+                raise TenantBusyError(f"Tenant {tenant} queue is full")
+
+            ticket = _Ticket(max(self._virtual_time, state.last_tag) + 1.0 / max(limits.weight, 0.001))
+            state.last_tag = ticket.tag
+            state.queue.append(ticket)
+            self._dispatch()
+
+            if not ticket.granted:
+                self._metrics['queued'] += 1
+                deadline = started + self.max_wait
+                while not ticket.granted:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        state.queue.remove(ticket)
+                        state.shed += 1
+                        self._metrics['shed_timeout'] += 1
+                        raise TenantBusyError(f"Tenant {tenant} waited too long for an AI slot")
+                    self._cond.wait(remaining)
+
+            state.admitted += 1
+            self._metrics['admitted'] += 1
+            self._metrics['wait_seconds'] += time.monotonic() - started
+
+    def release(self, tenant):
+        with self._cond:
+            state = self._tenants.get(tenant)
+            if state is not None and state.active > 0:
+                state.active -= 1
+                self._active -= 1
+            # Bo'sh tenantlarni unutish (tagi virtual vaqtdan orqada qolgan bo'lsa)
+            if state is not None and not state.active and not state.queue and state.last_tag <= self._virtual_time:
+                del self._tenants[tenant]
+            self._dispatch()
+
+    @contextmanager
+    def slot(self, tenant, limits):
+        self.acquire(tenant, limits)
+        try:
+            yield
+        finally:
+            self.release(tenant)
+
+    def get_metrics(self):
+        with self._cond:
+            data = dict(self._metrics)
+            data['wait_seconds'] = round(data['wait_seconds'], 3)
+            data['capacity'] = self.capacity
+            data['active'] = self._active
+            data['waiting'] = sum(len(state.queue) for state in self._tenants.values())
+            data['tenants'] = {
+                str(tenant): {'active': state.active, 'queued': len(state.queue), 'shed': state.shed}
+                for tenant, state in self._tenants.items()
+            }
+        return data
+
+
+def limits_for_plan(plan, plan_active=True):
+    """Tarif nomi bo'yicha cheklovlar (muddati o'tgan pullik tarif - free)"""
+    if not plan or plan == 'free' or not plan_active:
+        return PLAN_LIMITS['free']
+    return PLAN_LIMITS.get(plan, DEFAULT_PAID_LIMITS)
+
+
+_plans = {}
+_plans_lock = threading.Lock()
+
+def get_tenant_limits(user_id):
+    """Tenant tarifi bo'yicha cheklovlar (User.plan, qisqa muddat keshlanadi)"""
+    now = time.monotonic()
+    with _plans_lock:
+        cached = _plans.get(user_id)
+    if cached is not None and cached[1] > now:
+        return cached[0]
+
+    row = db.session.query(User.plan, User.plan_expires_at).filter_by(id=user_id).first()
+    if row is None:
+        limits = PLAN_LIMITS['free']
+    else:
+        limits = limits_for_plan(row.plan, User.plan_active_at(row.plan_expires_at))
+    with _plans_lock:
+        _plans[user_id] = (limits, now + PLAN_CACHE_TTL)
+    return limits
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+def get_scheduler():
+    """Jarayon bo'yicha yagona FairScheduler"""
+    global _scheduler
+    if _scheduler is None:
+        with _scheduler_lock:
+            if _scheduler is None:
+                config = current_app.config if has_app_context() else {}
+                _scheduler = FairScheduler(
+                    capacity=config.get('AI_SCHEDULER_CAPACITY', 16),
+                    max_wait=config.get('AI_QUEUE_MAX_WAIT', 10.0),
+                )
+                metrics.register('ai_admission', _scheduler.get_metrics)
+    return _scheduler
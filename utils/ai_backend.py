@@ -0,0 +1,277 @@
+import hashlib
+import logging
+import math
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import google.generativeai as genai
+from flask import current_app, has_app_context
+
+from utils import metrics
+from utils.retrieval import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+GEMINI_MODEL_NAME = 'gemini-1.5-flash'
+
+# Language-specific system instructions (set once per model handle)
+SYSTEM_PROMPTS = {
+    'uz': """Siz yordamchi AI assistentsiz. Foydalanuvchi savollariga aniq va foydali javoblar bering.
+             Agar kontekst berilgan bo'lsa, uni asosiy ma'lumot manbai sifatida ishlatib javob bering.
+             Javoblaringiz qisqa, aniq va tushunarli bo'lsin.""",
+    'ru': """Вы AI-помощник. Отвечайте точно и полезно на вопросы пользователя.
+             Если предоставлен контекст, используйте его как основной источник информации.
+             Ваши ответы должны быть краткими, точными и понятными.""",
+    'en': """You are an AI assistant. Provide accurate and helpful answers to user questions.
+             If context is provided, use it as the primary source of information.
+             Keep your answers concise, accurate and understandable."""
+}
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+class AIBackend(ABC):
+    """
+    Matn generatsiyasi backendi interfeysi.
+
+    `generate` to'liq javobni, `stream` esa javob bo'laklarini qaytaradi;
+    ikkalasi ham API xatolarida istisno ko'taradi. `timeout` - bitta so'rov
+    uchun tarmoq kutish chegarasi (sekund). Token hisobi va xatolar
+    `get_metrics` orqali ko'rinadi.
+    """
+
+    name = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._metrics = {
+            'requests': 0,
+            'streams': 0,
+            'errors': 0,
+            'prompt_tokens': 0,
+            'completion_tokens': 0,
+            'busy_seconds': 0.0,
+        }
+
+    @abstractmethod
+    def generate(self, prompt, language='uz', timeout=None):
+        """To'liq javob matni"""
+
+    @abstractmethod
+    def stream(self, prompt, language='uz', timeout=None):
+        """Javob matni bo'laklari (generator)"""
+
+    def _record(self, prompt_tokens=0, completion_tokens=0, elapsed=0.0, streamed=False, error=False):
+        with self._lock:
+            self._metrics['streams' if streamed else 'requests'] += 1
+            if error:
+                self._metrics['errors'] += 1
+            self._metrics['prompt_tokens'] += prompt_tokens
+            self._metrics['completion_tokens'] += completion_tokens
+            self._metrics['busy_seconds'] += elapsed
+
+    def get_metrics(self):
+        with self._lock:
+            data = dict(self._metrics)
+        data['busy_seconds'] = round(data['busy_seconds'], 3)
+        data['backend'] = self.name
+        return data
+
+
+class GeminiBackend(AIBackend):
+    """Google Gemini (production)"""
+
+    name = 'gemini'
+
+    def __init__(self, model_name=GEMINI_MODEL_NAME):
+        super().__init__()
+        self.model_name = model_name
+        self._models = {}
+        self._models_lock = threading.Lock()
+
+    def get_model(self, language):
+        """Process-wide Gemini model handle with the language's system instruction"""
+        model = self._models.get(language)
+        if model is None:
+            with self._models_lock:
+                model = self._models.get(language)
+                if model is None:
+                    model = genai.GenerativeModel(
+                        self.model_name,
+                        system_instruction=SYSTEM_PROMPTS.get(language, SYSTEM_PROMPTS['uz'])
+                    )
+                    self._models[language] = model
+        return model
+
+    @staticmethod
+    def _usage(response, prompt, text):
+        usage = getattr(response, 'usage_metadata', None)
+        prompt_tokens = getattr(usage, 'prompt_token_count', 0) or estimate_tokens(prompt)
+        completion_tokens = getattr(usage, 'candidates_token_count', 0) or estimate_tokens(text)
+        return prompt_tokens, completion_tokens
+
+    @staticmethod
+    def _request_options(timeout):
+        return {'timeout': timeout} if timeout else None
+
+    def generate(self, prompt, language='uz', timeout=None):
+        started = time.monotonic()
+        try:
+            response = self.get_model(language).generate_content(
+                prompt, request_options=self._request_options(timeout)
+            )
+            text = response.text
+        except Exception:
+            self._record(estimate_tokens(prompt), 0, time.monotonic() - started, error=True)
+            raise
+        self._record(*self._usage(response, prompt, text), elapsed=time.monotonic() - started)
+        return text
+
+    def stream(self, prompt, language='uz', timeout=None):
+        started = time.monotonic()
+        parts = []
+        response = None
+        try:
+            response = self.get_model(language).generate_content(
+                prompt, stream=True, request_options=self._request_options(timeout)
+            )
+            for chunk in response:
+                try:
+                    text = chunk.text
+                except ValueError:
+                    # Chunk without text parts (e.g. safety metadata only)
+                    continue
+                if text:
+                    parts.append(text)
+                    yield text
+        except Exception:
+            self._record(estimate_tokens(prompt), estimate_tokens(''.join(parts)),
+                         time.monotonic() - started, streamed=True, error=True)
+            raise
+        self._record(*self._usage(response, prompt, ''.join(parts)),
+                     elapsed=time.monotonic() - started, streamed=True)
+
+
+class FakeBackendError(RuntimeError):
+    """FakeBackend tomonidan ataylab yuzaga keltirilgan xato"""
+
+
+class FakeBackend(AIBackend):
+    """
+    Yuklama testlari uchun tarmoqsiz, deterministik backend.
+
+    Javob matni promptdan (sha256 urug'i bilan) hosil qilinadi - bir xil savol
+    doim bir xil javob beradi. Birinchi token kechikishi taqsimotdan olinadi
+    ('fixed', 'uniform' yoki 'lognormal', median = `latency`), keyin tokenlar
+    `tokens_per_second` tezlikda keladi. `error_rate` ulushidagi so'rovlar
+    FakeBackendError bilan tugaydi (streamda - javobning o'rtasida).
+    """
+
+    name = 'fake'
+
+    def __init__(self, latency=0.8, distribution='lognormal', sigma=0.5, tokens_per_second=80.0,
+                 response_tokens=120, chunk_tokens=8, error_rate=0.0, seed=0):
+        super().__init__()
+        self.latency = latency
+        self.distribution = distribution
+        self.sigma = sigma
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.chunk_tokens = max(1, chunk_tokens)
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+
+    def _first_token_delay(self):
+        with self._random_lock:
+            if self.distribution == 'fixed':
+                return self.latency
+            if self.distribution == 'uniform':
+                return self._random.uniform(0, 2 * self.latency)
+            return self.latency * math.exp(self._random.gauss(0, self.sigma))
+
+    def _fails(self):
+        if self.error_rate <= 0:
+            return False
+        with self._random_lock:
+            return self._random.random() < self.error_rate
+
+    def _words(self, prompt):
+        """Promptdagi so'zlardan deterministik javob"""
+        vocabulary = _WORD_RE.findall(prompt) or ['javob']
+        seed = int.from_bytes(hashlib.sha256(prompt.encode('utf-8')).digest()[:8], 'big')
+        rng = random.Random(seed)
+        return [rng.choice(vocabulary) for _ in range(self.response_tokens)]
+
+    def _chunks(self, prompt):
+        words = self._words(prompt)
+        for start in range(0, len(words), self.chunk_tokens):
+            piece = ' '.join(words[start:start + self.chunk_tokens])
+            yield (' ' if start else '') + piece, len(words[start:start + self.chunk_tokens])
+
+    def generate(self, prompt, language='uz', timeout=None):
+        started = time.monotonic()
+        delay = self._first_token_delay() + self.response_tokens / self.tokens_per_second
+        if self._fails():
+            time.sleep(delay / 2)
+            self._record(estimate_tokens(prompt), 0, time.monotonic() - started, error=True)
+            raise FakeBackendError("Injected AI backend failure")
+        time.sleep(delay)
+        text = ''.join(piece for piece, _ in self._chunks(prompt))
+        self._record(estimate_tokens(prompt), self.response_tokens, time.monotonic() - started)
+        return text
+
+    def stream(self, prompt, language='uz', timeout=None):
+        started = time.monotonic()
+        fail_at = None
+        if self._fails():
+            with self._random_lock:
+                fail_at = self._random.randint(0, self.response_tokens)
+        time.sleep(self._first_token_delay())
+
+        produced = 0
+        for piece, count in self._chunks(prompt):
+            if fail_at is not None and produced + count > fail_at:
+                self._record(estimate_tokens(prompt), produced, time.monotonic() - started,
+                             streamed=True, error=True)
+                raise FakeBackendError("Injected AI backend failure")
+            if produced:
+                time.sleep(count / self.tokens_per_second)
+            produced += count
+            yield piece
+        self._record(estimate_tokens(prompt), produced, time.monotonic() - started, streamed=True)
+
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def get_ai_backend():
+    """Sozlamadagi AI backend (AI_BACKEND: 'gemini' yoki 'fake')"""
+    global _backend
+    name = _setting('AI_BACKEND', 'gemini')
+    if _backend is None or _backend.name != name:
+        with _backend_lock:
+            if _backend is None or _backend.name != name:
+                if name == 'fake':
+                    _backend = FakeBackend(
+                        latency=_setting('FAKE_AI_LATENCY', 0.8),
+                        distribution=_setting('FAKE_AI_LATENCY_DISTRIBUTION', 'lognormal'),
+                        sigma=_setting('FAKE_AI_LATENCY_SIGMA', 0.5),
+                        tokens_per_second=_setting('FAKE_AI_TOKENS_PER_SECOND', 80.0),
+                        response_tokens=_setting('FAKE_AI_RESPONSE_TOKENS', 120),
+                        error_rate=_setting('FAKE_AI_ERROR_RATE', 0.0),
+                        seed=_setting('FAKE_AI_SEED', 0),
+                    )
+                else:
+                    _backend = GeminiBackend(_setting('GEMINI_MODEL_NAME', GEMINI_MODEL_NAME))
+                metrics.register('ai_backend', _backend.get_metrics)
+    return _backend
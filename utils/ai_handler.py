@@ -1,59 +1,359 @@
-import google.generativeai as genai
-from langdetect import detect
-import os
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app, has_app_context
+from utils import metrics
+from utils.admission import TenantBusyError, get_scheduler, get_tenant_limits
+from utils.ai_backend import get_ai_backend
+from utils.circuit_breaker import CircuitBreaker, CircuitOpenError, OPEN
+from utils.answer_cache import get_answer_cache
+from utils.language import detect_language
+from utils.prompt_assembly import assemble_prompt
+from utils.singleflight import SingleFlight
+from utils.retrieval import get_active_kb_id, retrieve_context
 
-def get_ai_response(prompt, context=None, language='uz'):
-    """Get AI response from Google Gemini with context"""
+logger = logging.getLogger(__name__)
+
+EMPTY_RESPONSE_MESSAGE = "Kechirasiz, javob berish mumkin emas."
+
+# Degraded mode: AI unavailable, answer with the best knowledge base passage
+DEGRADED_PREFIXES = {
+    'uz': "Hozir AI yordamchi javob bera olmayapti. Bilim bazasidagi eng mos ma'lumot:",
+    'ru': "Сейчас AI-помощник недоступен. Наиболее подходящая информация из базы знаний:",
+    'en': "The AI assistant is unavailable right now. The most relevant information from the knowledge base:"
+}
+MAX_DEGRADED_PASSAGE_CHARS = 1500
+
+# Load shedding: the tenant's AI queue is over its plan budget
+BUSY_MESSAGES = {
+    'uz': "Hozir so'rovlar juda ko'p. Iltimos, birozdan keyin qayta yozing.",
+    'ru': "Сейчас слишком много запросов. Пожалуйста, напишите чуть позже.",
+    'en': "We are receiving too many requests right now. Please try again in a moment."
+}
+
+# Identical concurrent questions share one upstream call
+_inflight = SingleFlight()
+metrics.register('ai_singleflight', _inflight.get_metrics)
+
+_breaker = None
+_executor = None
+_resilience_lock = threading.Lock()
+_degraded = {'answers': 0, 'no_passage': 0}
+
+# Sentinel for an exhausted stream iterator
+_DONE = object()
+
+# Extra seconds a single-flight follower waits beyond the leader's queue wait and AI deadline
+FOLLOWER_WAIT_MARGIN = 5.0
+
+ERROR_MESSAGES = {
+    'uz': "Xatolik yuz berdi. Qaytadan urinib ko'ring.",
+    'ru': "Произошла ошибка. Попробуйте еще раз.",
+    'en': "An error occurred. Please try again."
+}
+
+def resolve_language(prompt, language):
+    """Detect language if not provided"""
+    if not language or language == 'auto':
+        language = detect_language(prompt)
+    return language
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+def build_prompt(prompt, context=None, language='uz', history=None):
+    """
+    Prompt body sent to the model (system instruction is set on the model).
+    Conversation history and knowledge base context are fitted into the
+    AI_PROMPT_TOKEN_BUDGET so prompt size and latency stay predictable.
+    """
+    return assemble_prompt(
+        prompt, context, history, language,
+        budget=_setting('AI_PROMPT_TOKEN_BUDGET', 1500),
+        history_budget=_setting('AI_HISTORY_TOKEN_BUDGET', 400),
+    )
+
+def is_service_message(text):
+    """True for canned error/busy/degraded answers that should not enter chat memory"""
+    if text == EMPTY_RESPONSE_MESSAGE or text in ERROR_MESSAGES.values() or text in BUSY_MESSAGES.values():
+        return True
+    return any(text.startswith(prefix) for prefix in DEGRADED_PREFIXES.values())
+
+def _resilience_metrics():
+    data = _breaker.get_metrics()
+    with _resilience_lock:
+        data['degraded_answers'] = _degraded['answers']
+        data['degraded_without_passage'] = _degraded['no_passage']
+    return data
+
+def get_ai_breaker():
+    """Process-wide circuit breaker for AI backend calls"""
+    global _breaker
+    if _breaker is None:
+        with _resilience_lock:
+            if _breaker is None:
+                slow_call = _setting('AI_BREAKER_SLOW_CALL', 10.0)
+                _breaker = CircuitBreaker(
+                    failure_threshold=_setting('AI_BREAKER_FAILURES', 5),
+                    slow_call_threshold=slow_call or None,
+                    reset_timeout=_setting('AI_BREAKER_RESET', 30.0),
+                )
+                metrics.register('ai_circuit_breaker', _resilience_metrics)
+    return _breaker
+
+def get_ai_executor():
+    """Threads that run backend calls so the caller can stop waiting at the deadline"""
+    global _executor
+    if _executor is None:
+        with _resilience_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=_setting('AI_MAX_CONCURRENT_CALLS', 32),
+                    thread_name_prefix='ai-call'
+                )
+    return _executor
+
+def generate_ai_response(prompt, context=None, language='uz', timeout=None, history=None):
+    """
+    Generate a response from the configured AI backend with context.
+    Raises on API errors, on TimeoutError after `timeout` (AI_TIMEOUT) seconds
+    and with CircuitOpenError while the breaker is open.
+    """
+    language = resolve_language(prompt, language)
+    timeout = timeout or _setting('AI_TIMEOUT', 20.0)
+    breaker = get_ai_breaker()
+    if not breaker.allow():
+        raise CircuitOpenError("AI backend circuit is open")
+
+    backend = get_ai_backend()
+    started = time.monotonic()
+    future = get_ai_executor().submit(backend.generate, build_prompt(prompt, context, language, history), language, timeout)
+    try:
+        text = future.result(timeout=timeout)
+    except FutureTimeout:
+        breaker.record_failure(reason='timeouts')
+        raise TimeoutError(f"AI backend did not answer within {timeout}s")
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success(time.monotonic() - started)
+    return text
+
+def stream_ai_response(prompt, context=None, language='uz', timeout=None, history=None):
+    """
+    Yield text pieces from the configured AI backend. The whole stream must
+    finish within `timeout` (AI_TIMEOUT) seconds; raises like generate_ai_response.
+    """
+    language = resolve_language(prompt, language)
+    timeout = timeout or _setting('AI_TIMEOUT', 20.0)
+    breaker = get_ai_breaker()
+    if not breaker.allow():
+        raise CircuitOpenError("AI backend circuit is open")
+
+    backend = get_ai_backend()
+    executor = get_ai_executor()
+    started = time.monotonic()
+    deadline = started + timeout
+    pieces = backend.stream(build_prompt(prompt, context, language, history), language, timeout)
+    first_piece_at = None
+    failed = False
     try:
-        # Detect language if not provided
-        if not language or language == 'auto':
+        while True:
+            remaining = deadline - time.monotonic()
             try:
-                language = detect(prompt)
-                if language not in ['uz', 'ru', 'en']:
-                    language = 'uz'
-            except:
-                language = 'uz'
-        
-        # Language-specific system prompts
-        system_prompts = {
-            'uz': """Siz yordamchi AI assistentsiz. Foydalanuvchi savollariga aniq va foydali javoblar bering. 
-                     Agar kontekst berilgan bo'lsa, uni asosiy ma'lumot manbai sifatida ishlatib javob bering.
-                     Javoblaringiz qisqa, aniq va tushunarli bo'lsin.""",
-            'ru': """Вы AI-помощник. Отвечайте точно и полезно на вопросы пользователя. 
-                     Если предоставлен контекст, используйте его как основной источник информации.
-                     Ваши ответы должны быть краткими, точными и понятными.""",
-            'en': """You are an AI assistant. Provide accurate and helpful answers to user questions. 
-                     If context is provided, use it as the primary source of information.
-                     Keep your answers concise, accurate and understandable."""
-        }
-        
-        system_prompt = system_prompts.get(language, system_prompts['uz'])
-        
-        # Prepare the full prompt
-        if context:
-            full_prompt = f"""
-{system_prompt}
-
-Kontekst/Context/Контекст:
-{context[:3000]}  # Limit context to avoid token limits
-
-Savol/Question/Вопрос: {prompt}
-
-Javob/{language} tilida bering:
-"""
-        else:
-            full_prompt = f"{system_prompt}\n\nSavol: {prompt}\n\nJavob:"
-        
-        # Get response from Gemini
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        response = model.generate_content(full_prompt)
-        
-        return response.text if response.text else "Kechirasiz, javob berish mumkin emas."
-        
+                if remaining <= 0:
+                    raise FutureTimeout()
+                piece = executor.submit(next, pieces, _DONE).result(timeout=remaining)
+            except FutureTimeout:
+                failed = True
+                breaker.record_failure(reason='timeouts')
+                raise TimeoutError(f"AI backend stream did not finish within {timeout}s")
+            except Exception:
+                failed = True
+                breaker.record_failure()
+                raise
+            if piece is _DONE:
+                break
+            if first_piece_at is None:
+                first_piece_at = time.monotonic()
+            yield piece
+    finally:
+        # Also runs when the consumer stops early (e.g. client disconnected);
+        # slow-call detection uses the time to the first piece
+        if not failed:
+            breaker.record_success((first_piece_at or time.monotonic()) - started)
+
+def degraded_answer(user_id, prompt, language='uz', kb_id=None):
+    """Best-matching knowledge base passage, used while the AI backend is unavailable"""
+    try:
+        passage = retrieve_context(user_id, prompt, top_k=1, kb_id=kb_id)
     except Exception as e:
-        error_messages = {
-            'uz': "Xatolik yuz berdi. Qaytadan urinib ko'ring.",
-            'ru': "Произошла ошибка. Попробуйте еще раз.", 
-            'en': "An error occurred. Please try again."
-        }
-        return error_messages.get(language, error_messages['uz'])
\ No newline at end of file
+        logger.error(f"Degraded mode retrieval failed for user {user_id}: {str(e)}")
+        passage = ''
+
+    with _resilience_lock:
+        _degraded['answers'] += 1
+        if not passage:
+            _degraded['no_passage'] += 1
+    if not passage:
+        return ERROR_MESSAGES.get(language, ERROR_MESSAGES['uz'])
+
+    if len(passage) > MAX_DEGRADED_PASSAGE_CHARS:
+        passage = passage[:MAX_DEGRADED_PASSAGE_CHARS].rsplit(' ', 1)[0] + '...'
+    prefix = DEGRADED_PREFIXES.get(language, DEGRADED_PREFIXES['uz'])
+    return f"{prefix}\n\n{passage}"
+
+def _follower_timeout():
+    """How long a single-flight follower waits for the leader's answer"""
+    return _setting('AI_QUEUE_MAX_WAIT', 10.0) + _setting('AI_TIMEOUT', 20.0) + FOLLOWER_WAIT_MARGIN
+
+def get_ai_response(prompt, context=None, language='uz'):
+    """Get AI response with context (error message instead of exceptions)"""
+    try:
+        text = generate_ai_response(prompt, context, language)
+        return text if text else EMPTY_RESPONSE_MESSAGE
+
+    except Exception as e:
+        return ERROR_MESSAGES.get(language, ERROR_MESSAGES['uz'])
+
+def get_tenant_ai_response(user_id, prompt, language='uz', history=None):
+    """
+    Answer a question for a tenant: answer cache first, then knowledge base
+    retrieval and the AI backend. Only successful answers are cached, and
+    identical questions in flight at the same time wait for a single upstream
+    call. When the backend fails, times out or its circuit is open, the best
+    knowledge base passage is returned instead (degraded mode). When the
+    tenant's AI queue is over its plan budget, a localized "busy" message is
+    returned right away. `history` is the chat's recent [(question, answer)]
+    turns; such follow-up answers depend on the conversation and bypass the
+    answer cache.
+    """
+    kb_id = get_active_kb_id(user_id)
+    cache = get_answer_cache()
+    cache_key = None if history else cache.make_key(user_id, kb_id, language, prompt)
+
+    cached = cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        return cached
+
+    if get_ai_breaker().state == OPEN:
+        return degraded_answer(user_id, prompt, language, kb_id)
+
+    def answer_uncached():
+        # Per-tenant concurrency cap and fair share of the process's AI slots
+        with get_scheduler().slot(user_id, get_tenant_limits(user_id)):
+            started = time.monotonic()
+            context = retrieve_context(user_id, prompt, kb_id=kb_id)
+            text = generate_ai_response(prompt, context or None, language, history=history)
+        if text and cache_key:
+            cache.set(cache_key, user_id, text, latency=time.monotonic() - started)
+        return text
+
+    try:
+        text = _inflight.do(cache_key, answer_uncached, timeout=_follower_timeout()) if cache_key else answer_uncached()
+    except TenantBusyError:
+        return BUSY_MESSAGES.get(language, BUSY_MESSAGES['uz'])
+    except Exception as e:
+        logger.warning(f"AI answer failed for user {user_id}, using degraded mode: {str(e)}")
+        return degraded_answer(user_id, prompt, language, kb_id)
+
+    return text if text else EMPTY_RESPONSE_MESSAGE
+
+
+def open_tenant_ai_stream(user_id, prompt, language='uz', history=None):
+    """
+    Start a streamed answer for a tenant. Returns (text, None) when the whole
+    answer is known without streaming: a cached answer, a degraded answer
+    while the circuit is open, or the final text of an identical question
+    that is already being answered - such single-flight followers wait for
+    the leader and get its answer in one piece. Otherwise returns
+    (None, pieces), a generator that streams a new answer; the caller must
+    iterate or close it so waiting followers are released.
+    """
+    kb_id = get_active_kb_id(user_id)
+    cache = get_answer_cache()
+    cache_key = None if history else cache.make_key(user_id, kb_id, language, prompt)
+
+    cached = cache.get(cache_key) if cache_key else None
+    if cached is not None:
+        return cached, None
+
+    if get_ai_breaker().state == OPEN:
+        return degraded_answer(user_id, prompt, language, kb_id), None
+
+    if cache_key is None:
+        return None, _stream_answer(user_id, prompt, language, history, kb_id)
+
+    call, leader = _inflight.begin(cache_key)
+    if leader:
+        return None, _stream_answer(user_id, prompt, language, history, kb_id, cache_key, call)
+
+    try:
+        text = _inflight.wait(call, timeout=_follower_timeout())
+    except TenantBusyError:
+        return BUSY_MESSAGES.get(language, BUSY_MESSAGES['uz']), None
+    except Exception as e:
+        logger.warning(f"AI answer failed for user {user_id}, using degraded mode: {str(e)}")
+        return degraded_answer(user_id, prompt, language, kb_id), None
+    return (text if text else EMPTY_RESPONSE_MESSAGE), None
+
+
+def _stream_answer(user_id, prompt, language, history, kb_id, cache_key=None, call=None):
+    """Stream a new answer; as single-flight leader, hand the final text (or error) to followers"""
+    cache = get_answer_cache()
+    scheduler = get_scheduler()
+    text = None
+    error = None
+    try:
+        try:
+            scheduler.acquire(user_id, get_tenant_limits(user_id))
+        except TenantBusyError as e:
+            error = e
+            yield BUSY_MESSAGES.get(language, BUSY_MESSAGES['uz'])
+            return
+
+        started = time.monotonic()
+        parts = []
+        try:
+            context = retrieve_context(user_id, prompt, kb_id=kb_id)
+            for piece in stream_ai_response(prompt, context or None, language, history=history):
+                parts.append(piece)
+                yield piece
+        except Exception as e:
+            # Partial answers are not cached
+            logger.warning(f"AI stream failed for user {user_id}: {str(e)}")
+            error = e
+            if not parts:
+                yield degraded_answer(user_id, prompt, language, kb_id)
+            return
+        finally:
+            scheduler.release(user_id)
+
+        text = ''.join(parts)
+        if text and cache_key:
+            cache.set(cache_key, user_id, text, latency=time.monotonic() - started)
+        elif not text:
+            yield EMPTY_RESPONSE_MESSAGE
+    finally:
+        if call is not None:
+            if text is None and error is None:
+                # The consumer stopped early (e.g. client disconnected)
+                error = RuntimeError("Answer stream was closed before it finished")
+            _inflight.finish(cache_key, call, text, error)
+
+
+def stream_tenant_ai_response(user_id, prompt, language='uz', history=None):
+    """
+    Streaming variant of get_tenant_ai_response: yields answer pieces as they
+    arrive. A cached answer, or the answer of an identical question already
+    in flight, is yielded at once; the completed text is cached unless the
+    answer was given with conversation history.
+    """
+    text, pieces = open_tenant_ai_stream(user_id, prompt, language, history=history)
+    if pieces is None:
+        yield text
+        return
+    yield from pieces
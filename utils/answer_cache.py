@@ -0,0 +1,181 @@
+import hashlib
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+
+from models import db
+from models.cached_answer import CachedAnswer
+from utils import metrics
+from utils.retrieval import normalize_text
+
+logger = logging.getLogger(__name__)
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s']+")
+_SPACE_RE = re.compile(r'\s+')
+
+CacheEntry = namedtuple('CacheEntry', ['user_id', 'answer', 'latency', 'expires_at'])
+
+
+def normalize_question(question):
+    """Savolni kesh kaliti uchun normallashtirish ('Narxi qancha?' == 'narxi  qancha')"""
+    text = _PUNCTUATION_RE.sub(' ', normalize_text(question or ''))
+    return _SPACE_RE.sub(' ', text).strip()
+
+
+class AnswerCache:
+    """
+    Takroriy savollar uchun javob keshi.
+
+    Kalit - (tenant, bilim bazasi versiyasi, til, normallashtirilgan savol).
+    Birinchi daraja - jarayon ichidagi LRU + TTL; ikkinchi (ixtiyoriy) daraja -
+    barcha gunicorn workerlari uchun umumiy `cached_answers` jadvali.
+    """
+
+    def __init__(self, max_entries=5000, ttl=3600, shared=None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared  # None yoki 'sql'
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {'hits': 0, 'shared_hits': 0, 'misses': 0, 'stores': 0, 'saved_seconds': 0.0, 'invalidations': 0}
+
+    @staticmethod
+    def make_key(user_id, kb_version, language, question):
+        raw = f'{user_id}:{kb_version or 0}:{language}:{normalize_question(question)}'
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def _record_hit(self, entry, shared=False):
+        with self._lock:
+            self._metrics['hits'] += 1
+            if shared:
+                self._metrics['shared_hits'] += 1
+            self._metrics['saved_seconds'] += entry.latency or 0.0
+
+    def get(self, key):
+        """Keshdan javobni olish (bo'lmasa None)"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._entries.move_to_end(key)
+                else:
+                    del self._entries[key]
+                    entry = None
+        if entry is not None:
+            self._record_hit(entry)
+            return entry.answer
+
+        if self.shared == 'sql':
+            entry = self._get_shared(key)
+            if entry is not None:
+                self._put_local(key, entry)
+                self._record_hit(entry, shared=True)
+                return entry.answer
+
+        with self._lock:
+            self._metrics['misses'] += 1
+        return None
+
+    def set(self, key, user_id, answer, latency=0.0):
+        """Javobni keshga yozish"""
+        entry = CacheEntry(user_id, answer, latency, time.time() + self.ttl)
+        self._put_local(key, entry)
+        with self._lock:
+            self._metrics['stores'] += 1
+        if self.shared == 'sql':
+            self._set_shared(key, entry)
+
+    def _put_local(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _get_shared(self, key):
+        try:
+            row = CachedAnswer.query.filter(
+                CachedAnswer.key_hash == key,
+                CachedAnswer.expires_at > datetime.utcnow()
+            ).first()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Javob keshini o'qishda xato: {str(e)}")
+            return None
+        if row is None:
+            return None
+        expires_at = time.time() + max(0.0, (row.expires_at - datetime.utcnow()).total_seconds())
+        return CacheEntry(row.user_id, row.answer, row.latency, expires_at)
+
+    def _set_shared(self, key, entry):
+        try:
+            row = db.session.get(CachedAnswer, key)
+            expires_at = datetime.utcnow() + timedelta(seconds=self.ttl)
+            if row is None:
+                db.session.add(CachedAnswer(
+                    key_hash=key,
+                    user_id=entry.user_id,
+                    answer=entry.answer,
+                    latency=entry.latency,
+                    expires_at=expires_at
+                ))
+            else:
+                row.answer = entry.answer
+                row.latency = entry.latency
+                row.expires_at = expires_at
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Javob keshiga yozishda xato: {str(e)}")
+
+    def invalidate_user(self, user_id):
+        """Foydalanuvchining barcha keshlangan javoblarini o'chirish (yangi fayl yuklanganda)"""
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry.user_id == user_id]:
+                del self._entries[key]
+            self._metrics['invalidations'] += 1
+        if self.shared == 'sql':
+            try:
+                CachedAnswer.query.filter(
+                    (CachedAnswer.user_id == user_id) | (CachedAnswer.expires_at < datetime.utcnow())
+                ).delete(synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Javob keshini tozalashda xato: {str(e)}")
+
+    def get_metrics(self):
+        with self._lock:
+            data = dict(self._metrics)
+            data['entries'] = len(self._entries)
+        lookups = data['hits'] + data['misses']
+        data['hit_ratio'] = round(data['hits'] / lookups, 4) if lookups else 0.0
+        data['saved_seconds'] = round(data['saved_seconds'], 3)
+        data['shared'] = self.shared
+        return data
+
+
+_answer_cache = None
+_answer_cache_lock = threading.Lock()
+
+def get_answer_cache():
+    """Jarayon bo'yicha yagona AnswerCache"""
+    global _answer_cache
+    if _answer_cache is None:
+        with _answer_cache_lock:
+            if _answer_cache is None:
+                config = current_app.config if has_app_context() else {}
+                shared = config.get('ANSWER_CACHE_SHARED', 'none')
+                _answer_cache = AnswerCache(
+                    max_entries=config.get('ANSWER_CACHE_MAX_ENTRIES', 5000),
+                    ttl=config.get('ANSWER_CACHE_TTL', 3600),
+                    shared=shared if shared != 'none' else None,
+                )
+                metrics.register('answer_cache', _answer_cache.get_metrics)
+    return _answer_cache
@@ -0,0 +1,127 @@
+import logging
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from flask import current_app, has_app_context
+
+from models.cache_version import CacheVersion
+from models.telegram_bot import TelegramBot
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+BOT_ROUTES_VERSION = TelegramBot.ROUTES_VERSION
+
+BotRoute = namedtuple('BotRoute', ['bot_id', 'user_id', 'token', 'webhook_secret', 'language'])
+
+
+class BotRoutingTable:
+    """
+    Webhook uchun jarayon ichidagi bot marshrutlash jadvali (user_id -> bot).
+
+    Yozuvlar TTL bilan saqlanadi. Boshqa workerlar botni o'zgartirsa,
+    `cache_versions` jadvalidagi hisoblagich oshadi va jadval har
+    `version_check_interval` sekundda bir marta shuni tekshiradi.
+    """
+
+    def __init__(self, ttl=300, negative_ttl=30, version_check_interval=2.0, max_entries=50000):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.version_check_interval = version_check_interval
+        self.max_entries = max_entries
+        self._routes = OrderedDict()  # user_id -> (BotRoute | None, expires_at)
+        self._version = None
+        self._version_checked_at = 0.0
+        self._lock = threading.Lock()
+        self._metrics = {'hits': 0, 'misses': 0, 'negative_hits': 0, 'invalidations': 0, 'version_changes': 0}
+
+    def _check_version(self):
+        """Boshqa workerlardagi o'zgarishlarni tekshirish (vaqti-vaqti bilan)"""
+        now = time.monotonic()
+        if now - self._version_checked_at < self.version_check_interval:
+            return
+        self._version_checked_at = now
+        try:
+            version = CacheVersion.get_version(BOT_ROUTES_VERSION)
+        except Exception as e:
+            logger.error(f"Bot marshrut versiyasini o'qishda xato: {str(e)}")
+            return
+        with self._lock:
+            if self._version is not None and version != self._version:
+                self._routes.clear()
+                self._metrics['version_changes'] += 1
+            self._version = version
+
+    def get(self, user_id):
+        """
+        Foydalanuvchi boti marshrutini olish
+
+        Returns:
+            BotRoute: Bot ma'lumotlari yoki bot bo'lmasa None
+        """
+        self._check_version()
+        now = time.monotonic()
+        with self._lock:
+            entry = self._routes.get(user_id)
+            if entry is not None and entry[1] > now:
+                self._routes.move_to_end(user_id)
+                if entry[0] is None:
+                    self._metrics['negative_hits'] += 1
+                else:
+                    self._metrics['hits'] += 1
+                return entry[0]
+            self._metrics['misses'] += 1
+
+        telegram_bot = TelegramBot.find_by_user_id(user_id)
+        route = None
+        if telegram_bot:
+            route = BotRoute(
+                bot_id=telegram_bot.id,
+                user_id=telegram_bot.user_id,
+                token=telegram_bot.token,
+                webhook_secret=telegram_bot.webhook_secret,
+                language=telegram_bot.language
+            )
+
+        ttl = self.ttl if route else self.negative_ttl
+        with self._lock:
+            self._routes[user_id] = (route, time.monotonic() + ttl)
+            self._routes.move_to_end(user_id)
+            while len(self._routes) > self.max_entries:
+                self._routes.popitem(last=False)
+        return route
+
+    def invalidate(self, user_id=None):
+        """Bitta foydalanuvchi (yoki barcha) marshrutini o'chirish"""
+        with self._lock:
+            if user_id is None:
+                self._routes.clear()
+            else:
+                self._routes.pop(user_id, None)
+            self._metrics['invalidations'] += 1
+
+    def get_metrics(self):
+        with self._lock:
+            data = dict(self._metrics)
+            data['entries'] = len(self._routes)
+            data['version'] = self._version
+        return data
+
+
+_routing_table = None
+_routing_table_lock = threading.Lock()
+
+def get_bot_routing_table():
+    """Jarayon bo'yicha yagona BotRoutingTable"""
+    global _routing_table
+    if _routing_table is None:
+        with _routing_table_lock:
+            if _routing_table is None:
+                config = current_app.config if has_app_context() else {}
+                _routing_table = BotRoutingTable(
+                    ttl=config.get('BOT_ROUTE_TTL', 300),
+                    version_check_interval=config.get('BOT_ROUTE_VERSION_CHECK_INTERVAL', 2.0),
+                )
+                metrics.register('bot_routing', _routing_table.get_metrics)
+    return _routing_table
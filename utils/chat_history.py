@@ -0,0 +1,106 @@
+import logging
+import secrets
+
+from flask import current_app, has_app_context, session
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.chat_message import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY = 'chat_conversation_id'
+
+
+def _history_limit():
+    if has_app_context():
+        return current_app.config.get('CHAT_HISTORY_LIMIT', 20)
+    return 20
+
+
+def get_conversation_id(create=True):
+    """Joriy suhbat ID si (sessiyada faqat shu qisqa ID saqlanadi)"""
+    # Eski cookie dagi to'liq tarixni olib tashlash
+    if 'chat_history' in session:
+        session.pop('chat_history')
+    conversation_id = session.get(SESSION_KEY)
+    if conversation_id is None and create:
+        conversation_id = secrets.token_hex(16)
+        session[SESSION_KEY] = conversation_id
+    return conversation_id
+
+
+def append_exchange(conversation_id, user_id, user_text, ai_text, limit=None):
+    """
+    Savol-javobni saqlash. Suhbatda faqat oxirgi `limit` (standart -
+    CHAT_HISTORY_LIMIT) ta juftlik qoladi (ring buffer): eskilari shu
+    tranzaksiyada o'chiriladi.
+    """
+    limit = limit or _history_limit()
+    for attempt in range(3):
+        try:
+            last_seq = db.session.query(db.func.max(ChatMessage.seq)).filter_by(
+                conversation_id=conversation_id
+            ).scalar() or 0
+            seq = last_seq + 1
+            db.session.add(ChatMessage(
+                conversation_id=conversation_id,
+                user_id=user_id,
+                seq=seq,
+                user_text=user_text,
+                ai_text=ai_text
+            ))
+            ChatMessage.query.filter(
+                ChatMessage.conversation_id == conversation_id,
+                ChatMessage.seq <= seq - limit
+            ).delete(synchronize_session=False)
+            db.session.commit()
+            return seq
+        except IntegrityError:
+            # Parallel so'rov shu seq ni oldi - qayta urinish
+            db.session.rollback()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Chat tarixini saqlashda xato: {str(e)}")
+            return None
+    logger.error(f"Chat tarixini saqlab bo'lmadi: {conversation_id}")
+    return None
+
+
+def get_history_page(conversation_id, user_id, before=None, limit=20):
+    """
+    Suhbat tarixining bir sahifasi (eng yangilaridan orqaga)
+
+    Args:
+        before (int, optional): Shu seq dan oldingi yozuvlar
+        limit (int): Sahifadagi yozuvlar soni
+
+    Returns:
+        tuple: (yozuvlar eskidan yangiga, keyingi sahifa uchun `before` yoki None)
+    """
+    if not conversation_id:
+        return [], None
+    query = ChatMessage.query.filter_by(conversation_id=conversation_id, user_id=user_id)
+    if before is not None:
+        query = query.filter(ChatMessage.seq < before)
+    rows = query.order_by(ChatMessage.seq.desc()).limit(limit + 1).all()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    next_before = rows[0].seq if has_more and rows else None
+    return [row.to_dict() for row in rows], next_before
+
+
+def clear_history(conversation_id, user_id):
+    """Suhbatni o'chirish va sessiyada yangi suhbat boshlash"""
+    if conversation_id:
+        try:
+            ChatMessage.query.filter_by(conversation_id=conversation_id, user_id=user_id).delete(
+                synchronize_session=False
+            )
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Chat tarixini o'chirishda xato: {str(e)}")
+    session.pop(SESSION_KEY, None)
@@ -0,0 +1,267 @@
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+
+from models import db
+from models.chat_message import ChatMessage
+from utils import metrics
+from utils.chat_history import append_exchange
+
+logger = logging.getLogger(__name__)
+
+_WORD_RE = re.compile(r"[\w']+", re.UNICODE)
+
+# Oldingi javobga ishora qiluvchi so'zlar (olmoshlar, "yana", "shu" va h.k.)
+FOLLOW_UP_WORDS = frozenset({
+    # uz
+    'u', 'bu', 'shu', "o'sha", 'osha', 'ular', 'uni', 'unga', 'uning', 'unda', 'undan',
+    'buni', 'bunga', 'buning', 'bunda', 'shuni', 'shunga', 'shuning', 'shunda', 'ularni', 'ularning', 'yana',
+    # ru
+    'он', 'она', 'оно', 'они', 'его', 'ее', 'её', 'их', 'ему', 'ей', 'им', 'это', 'этот', 'эта', 'эти',
+    'этого', 'тот', 'та', 'те', 'том', 'тогда', 'ещё', 'еще',
+    # en
+    'it', 'its', 'they', 'them', 'their', 'this', 'that', 'these', 'those', 'he', 'she', 'him', 'her', 'else',
+})
+# Savol boshida kelsa davom ettirish belgisi
+FOLLOW_UP_STARTS = frozenset({'va', 'keyin', 'а', 'и', 'and', 'also', 'what about'})
+
+
+def looks_like_follow_up(question):
+    """
+    Savol oldingi suhbatga tayanadimi (olmosh/ishora so'zlari yoki "va ...",
+    "а ...", "and ..." bilan boshlanishi). Faqat shunday savollar tarix bilan
+    yuboriladi; qolganlari mustaqil savol sifatida javob keshidan foydalanadi.
+    """
+    words = _WORD_RE.findall(question.lower())
+    if not words:
+        return False
+    if words[0] in FOLLOW_UP_STARTS or ' '.join(words[:2]) in FOLLOW_UP_STARTS:
+        return True
+    return any(word in FOLLOW_UP_WORDS for word in words)
+
+
+def conversation_key(chat_key):
+    """Telegram chati uchun chat_messages dagi suhbat ID si"""
+    user_id, chat_id = chat_key
+    return f'tg:{user_id}:{chat_id}'
+
+
+def _size(text):
+    return len(text.encode('utf-8'))
+
+
+def _clip(text, max_bytes):
+    """Matnni UTF-8 baytlari bo'yicha qisqartirish (belgini buzmasdan)"""
+    data = text.encode('utf-8')
+    if len(data) <= max_bytes:
+        return text
+    return data[:max_bytes].decode('utf-8', errors='ignore')
+
+
+class _ChatTurns:
+    __slots__ = ('turns', 'nbytes', 'last_seen')
+
+    def __init__(self, max_turns):
+        self.turns = deque(maxlen=max_turns)
+        self.nbytes = 0
+        self.last_seen = time.monotonic()
+
+
+class ChatMemory:
+    """
+    Telegram chatlar uchun oxirgi savol-javoblar xotirasi. chat_key - (user_id, chat_id).
+
+    Har bir chatda ko'pi bilan `max_turns` ta juftlik (ring buffer) va
+    `max_bytes` bayt matn saqlanadi - oshsa eng eski juftliklar chiqarib
+    yuboriladi.
+
+    shared='sql' - juftliklar `chat_messages` jadvalida: navbatdagi ish
+    qaysi jarayonga tushsa ham bir xil tarixni ko'radi (`idle_ttl` dan eski
+    juftliklar o'qilmaydi, har `cleanup_interval` sekundda o'chiriladi;
+    chat boshiga `max_turns` dan ortiq qator yozuvda o'chiriladi). shared=None - jarayon
+    ichida: chatlar soni `max_chats` bilan cheklangan (LRU), `idle_ttl`
+    sekund yozilmagan chatlar unutiladi, xotira taxminan
+    max_chats * max_bytes dan oshmaydi; faqat bitta jarayon bilan to'g'ri.
+    """
+
+    def __init__(self, max_turns=6, max_bytes=4096, max_chats=20000, idle_ttl=3600, shared=None,
+                 cleanup_interval=300):
+        self.shared = shared  # None yoki 'sql'
+        self.max_turns = max_turns
+        self.max_bytes = max_bytes
+        self.max_chats = max_chats
+        self.idle_ttl = idle_ttl
+        self.cleanup_interval = cleanup_interval
+        self._last_cleanup = time.monotonic()
+        self._chats = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._metrics = {'appends': 0, 'turns_dropped': 0, 'evicted_lru': 0, 'expired': 0, 'shared_errors': 0,
+                         'rows_deleted': 0}
+
+    def _drop_chat(self, chat_key):
+        state = self._chats.pop(chat_key)
+        self._bytes -= state.nbytes
+
+    def _expire(self, now):
+        # LRU tartibida eng eski chatlar boshida turadi
+        while self._chats:
+            chat_key, state = next(iter(self._chats.items()))
+            if now - state.last_seen <= self.idle_ttl:
+                break
+            self._drop_chat(chat_key)
+            self._metrics['expired'] += 1
+
+    def _clip_turn(self, question, answer):
+        # Bitta juftlik butun limitni egallamasligi uchun har biri yarmidan oshmaydi
+        half = self.max_bytes // 2
+        return _clip(question, half), _clip(answer, half)
+
+    def _get_shared(self, chat_key):
+        try:
+            rows = db.session.query(ChatMessage.user_text, ChatMessage.ai_text).filter(
+                ChatMessage.conversation_id == conversation_key(chat_key),
+                ChatMessage.created_at >= datetime.utcnow() - timedelta(seconds=self.idle_ttl)
+            ).order_by(ChatMessage.seq.desc()).limit(self.max_turns).all()
+        except Exception as e:
+            db.session.rollback()
+            self._incr('shared_errors')
+            logger.error(f"Chat xotirasini o'qishda xato: {str(e)}")
+            return []
+
+        # Eng yangilaridan boshlab bayt limitiga sig'adiganlari
+        turns = []
+        nbytes = 0
+        for question, answer in rows:
+            turn = self._clip_turn(question, answer)
+            turn_bytes = _size(turn[0]) + _size(turn[1])
+            if turns and nbytes + turn_bytes > self.max_bytes:
+                break
+            turns.append(turn)
+            nbytes += turn_bytes
+        turns.reverse()
+        return turns
+
+    def _cleanup_shared(self):
+        """`idle_ttl` dan eski Telegram juftliklarini chat_messages dan o'chirish (davriy)"""
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_cleanup < self.cleanup_interval:
+                return
+            self._last_cleanup = now
+        try:
+            deleted = ChatMessage.query.filter(
+                ChatMessage.conversation_id.like('tg:%'),
+                ChatMessage.created_at < datetime.utcnow() - timedelta(seconds=self.idle_ttl)
+            ).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self._incr('shared_errors')
+            logger.error(f"Eski chat xotirasini o'chirishda xato: {str(e)}")
+            return
+        with self._lock:
+            self._metrics['rows_deleted'] += deleted
+
+    def _incr(self, name):
+        with self._lock:
+            self._metrics[name] += 1
+
+    def get(self, chat_key):
+        """Chatning saqlangan juftliklari [(savol, javob), ...] eskidan yangiga"""
+        if self.shared == 'sql':
+            return self._get_shared(chat_key)
+
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            state = self._chats.get(chat_key)
+            if state is None:
+                return []
+            return list(state.turns)
+
+    def append(self, chat_key, question, answer):
+        """Savol-javob juftligini chat xotirasiga qo'shish"""
+        turn = self._clip_turn(question, answer)
+        if self.shared == 'sql':
+            if append_exchange(conversation_key(chat_key), chat_key[0], turn[0], turn[1], limit=self.max_turns) is None:
+                self._incr('shared_errors')
+            else:
+                self._incr('appends')
+            self._cleanup_shared()
+            return
+
+        turn_bytes = _size(turn[0]) + _size(turn[1])
+        now = time.monotonic()
+
+        with self._lock:
+            self._expire(now)
+            state = self._chats.get(chat_key)
+            if state is None:
+                state = self._chats[chat_key] = _ChatTurns(self.max_turns)
+            self._chats.move_to_end(chat_key)
+            state.last_seen = now
+
+            if len(state.turns) == state.turns.maxlen:
+                old = state.turns.popleft()
+                state.nbytes -= _size(old[0]) + _size(old[1])
+                self._bytes -= _size(old[0]) + _size(old[1])
+                self._metrics['turns_dropped'] += 1
+            state.turns.append(turn)
+            state.nbytes += turn_bytes
+            self._bytes += turn_bytes
+
+            while state.nbytes > self.max_bytes and len(state.turns) > 1:
+                old = state.turns.popleft()
+                state.nbytes -= _size(old[0]) + _size(old[1])
+                self._bytes -= _size(old[0]) + _size(old[1])
+                self._metrics['turns_dropped'] += 1
+
+            while len(self._chats) > self.max_chats:
+                self._drop_chat(next(iter(self._chats)))
+                self._metrics['evicted_lru'] += 1
+            self._metrics['appends'] += 1
+
+    def clear(self, chat_key):
+        if self.shared == 'sql':
+            ChatMessage.query.filter_by(conversation_id=conversation_key(chat_key)).delete(synchronize_session=False)
+            db.session.commit()
+            return
+        with self._lock:
+            if chat_key in self._chats:
+                self._drop_chat(chat_key)
+
+    def get_metrics(self):
+        with self._lock:
+            data = dict(self._metrics)
+            data['chats'] = len(self._chats)
+            data['bytes'] = self._bytes
+        data['shared'] = self.shared
+        return data
+
+
+_memory = None
+_memory_lock = threading.Lock()
+
+def get_chat_memory():
+    """Jarayon bo'yicha yagona ChatMemory"""
+    global _memory
+    if _memory is None:
+        with _memory_lock:
+            if _memory is None:
+                config = current_app.config if has_app_context() else {}
+                _memory = ChatMemory(
+                    max_turns=config.get('CHAT_MEMORY_TURNS', 6),
+                    max_bytes=config.get('CHAT_MEMORY_MAX_BYTES', 4096),
+                    max_chats=config.get('CHAT_MEMORY_MAX_CHATS', 20000),
+                    idle_ttl=config.get('CHAT_MEMORY_IDLE_TTL', 3600),
+                    shared='sql' if config.get('CHAT_MEMORY_BACKEND', 'sql') == 'sql' else None,
+                    cleanup_interval=config.get('CHAT_MEMORY_CLEANUP_INTERVAL', 300),
+                )
+                metrics.register('chat_memory', _memory.get_metrics)
+    return _memory
@@ -0,0 +1,116 @@
+import threading
+import time
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Circuit ochiq - tashqi xizmatga so'rov yuborilmadi"""
+
+
+class CircuitBreaker:
+    """
+    Ketma-ket xatolar yoki sekin javoblardan keyin tashqi xizmatga so'rovlarni
+    vaqtincha to'xtatish.
+
+    closed -> (failure_threshold ta ketma-ket xato/sekin chaqiruv) -> open ->
+    (reset_timeout o'tgach) -> half_open: bitta sinov chaqiruvi; muvaffaqiyatli
+    bo'lsa closed, aks holda yana open.
+
+    Holatni faqat closed dagi chaqiruvlar va half_open dagi sinov chaqiruvi
+    natijalari o'zgartiradi; open paytida kelgan kechikkan natijalar faqat
+    metrikalarda hisoblanadi.
+    """
+
+    def __init__(self, failure_threshold=5, slow_call_threshold=None, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.slow_call_threshold = slow_call_threshold
+        self.reset_timeout = reset_timeout
+        self._state = CLOSED
+        self._consecutive_failures = 0
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._trial_thread = None
+        self._lock = threading.Lock()
+        self._metrics = {
+            'calls': 0,
+            'successes': 0,
+            'failures': 0,
+            'timeouts': 0,
+            'slow_calls': 0,
+            'rejected': 0,
+            'opened': 0,
+        }
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._current_state()
+
+    def _current_state(self):
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._state = HALF_OPEN
+            self._trial_in_flight = False
+        return self._state
+
+    def allow(self):
+        """So'rov yuborish mumkinmi (half_open da faqat bitta sinov chaqiruvi)"""
+        with self._lock:
+            state = self._current_state()
+            if state == CLOSED:
+                self._metrics['calls'] += 1
+                return True
+            if state == HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                self._trial_thread = threading.get_ident()
+                self._metrics['calls'] += 1
+                return True
+            self._metrics['rejected'] += 1
+            return False
+
+    def _is_trial(self):
+        """Natija half_open dagi yagona sinov chaqiruvidanmi (uni shu oqim boshlagan)"""
+        return self._trial_in_flight and self._trial_thread == threading.get_ident()
+
+    def record_success(self, elapsed=0.0):
+        """Muvaffaqiyatli chaqiruv (chegaradan sekin bo'lsa xato sifatida hisoblanadi)"""
+        if self.slow_call_threshold is not None and elapsed > self.slow_call_threshold:
+            self.record_failure(reason='slow_calls')
+            return
+        with self._lock:
+            self._metrics['successes'] += 1
+            state = self._current_state()
+            if state == CLOSED:
+                self._consecutive_failures = 0
+            elif state == HALF_OPEN and self._is_trial():
+                self._consecutive_failures = 0
+                self._state = CLOSED
+                self._trial_in_flight = False
+
+    def record_failure(self, reason='failures'):
+        """Muvaffaqiyatsiz chaqiruv ('failures', 'timeouts' yoki 'slow_calls')"""
+        with self._lock:
+            self._metrics[reason] += 1
+            state = self._current_state()
+            if state == CLOSED:
+                self._consecutive_failures += 1
+                if self._consecutive_failures < self.failure_threshold:
+                    return
+            elif not (state == HALF_OPEN and self._is_trial()):
+                # Ochiq paytidagi kechikkan xato kutish vaqtini uzaytirmaydi
+                return
+            self._metrics['opened'] += 1
+            self._state = OPEN
+            self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+    def get_metrics(self):
+        with self._lock:
+            data = dict(self._metrics)
+            data['state'] = self._current_state()
+            data['consecutive_failures'] = self._consecutive_failures
+            if self._state == OPEN:
+                data['retry_in_seconds'] = round(max(0.0, self.reset_timeout - (time.monotonic() - self._opened_at)), 1)
+        return data
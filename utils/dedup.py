@@ -0,0 +1,157 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.processed_update import ProcessedUpdate
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+SQL_CLEANUP_INTERVAL = 300  # seconds
+
+
+class UpdateDeduplicator:
+    """
+    Telegram update_id bo'yicha takroriy webhooklarni aniqlash.
+
+    Birinchi daraja - jarayon ichidagi cheklangan hajmli TTL lug'at;
+    ikkinchi (ixtiyoriy) daraja - barcha workerlar uchun umumiy SQL jadval.
+    """
+
+    def __init__(self, ttl=86400, max_entries=100000, use_sql=False):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.use_sql = use_sql
+        self._entries = OrderedDict()  # (bot_key, update_id) -> expires_at
+        self._lock = threading.Lock()
+        self._last_sql_cleanup = 0.0
+        self._metrics = {'claimed': 0, 'duplicates': 0, 'sql_duplicates': 0, 'evicted': 0}
+
+    @staticmethod
+    def make_key(bot_key, update_id):
+        return (str(bot_key), int(update_id))
+
+    def _evict(self, now):
+        """Muddati o'tgan va ortiqcha yozuvlarni o'chirish (lock ichida chaqiriladi)"""
+        while self._entries:
+            key, expires_at = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            self._entries.popitem(last=False)
+            self._metrics['evicted'] += 1
+
+    def seen(self, bot_key, update_id):
+        """Update shu jarayonda allaqachon qabul qilinganmi (DB ga murojaat qilmaydi)"""
+        key = self.make_key(bot_key, update_id)
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is not None and expires_at > now:
+                self._metrics['duplicates'] += 1
+                return True
+        return False
+
+    def claim(self, bot_key, update_id):
+        """
+        Update ni qayta ishlash uchun belgilash
+
+        Returns:
+            bool: Birinchi marta ko'rilgan bo'lsa True, takroriy bo'lsa False
+        """
+        key = self.make_key(bot_key, update_id)
+        now = time.monotonic()
+        with self._lock:
+            expires_at = self._entries.get(key)
+            if expires_at is not None and expires_at > now:
+                self._metrics['duplicates'] += 1
+                return False
+            self._entries[key] = now + self.ttl
+            self._evict(now)
+
+        if self.use_sql and not self._claim_sql(key):
+            with self._lock:
+                self._metrics['duplicates'] += 1
+                self._metrics['sql_duplicates'] += 1
+            return False
+
+        with self._lock:
+            self._metrics['claimed'] += 1
+        return True
+
+    def release(self, bot_key, update_id):
+        """Update qayta ishlanmay qolgan bo'lsa (masalan navbatga qo'yishda xato) belgini olib tashlash"""
+        key = self.make_key(bot_key, update_id)
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.use_sql:
+            try:
+                ProcessedUpdate.query.filter_by(
+                    bot_key=key[0],
+                    update_id=key[1]
+                ).delete(synchronize_session=False)
+                db.session.commit()
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Update belgisini o'chirishda xato: {str(e)}")
+
+    def _claim_sql(self, key):
+        """Umumiy SQL darajasida belgilash (unique constraint orqali)"""
+        try:
+            db.session.add(ProcessedUpdate(bot_key=key[0], update_id=key[1]))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            return False
+        except Exception as e:
+            # SQL daraja ishlamasa ham xabarni yo'qotmaymiz
+            db.session.rollback()
+            logger.error(f"Update dedup SQL xatosi: {str(e)}")
+            return True
+
+        if time.monotonic() - self._last_sql_cleanup > SQL_CLEANUP_INTERVAL:
+            self._last_sql_cleanup = time.monotonic()
+            self._cleanup_sql()
+        return True
+
+    def _cleanup_sql(self):
+        """TTL dan eski SQL yozuvlarini o'chirish"""
+        try:
+            ProcessedUpdate.query.filter(
+                ProcessedUpdate.created_at < datetime.utcnow() - timedelta(seconds=self.ttl)
+            ).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Eski dedup yozuvlarini tozalashda xato: {str(e)}")
+
+    def get_metrics(self):
+        with self._lock:
+            data = dict(self._metrics)
+            data['memory_entries'] = len(self._entries)
+        data['sql_enabled'] = self.use_sql
+        return data
+
+
+_deduplicator = None
+_deduplicator_lock = threading.Lock()
+
+def get_update_deduplicator():
+    """Jarayon bo'yicha yagona UpdateDeduplicator"""
+    global _deduplicator
+    if _deduplicator is None:
+        with _deduplicator_lock:
+            if _deduplicator is None:
+                config = current_app.config if has_app_context() else {}
+                _deduplicator = UpdateDeduplicator(
+                    ttl=config.get('WEBHOOK_DEDUP_TTL', 86400),
+                    max_entries=config.get('WEBHOOK_DEDUP_MAX_ENTRIES', 100000),
+                    use_sql=config.get('WEBHOOK_DEDUP_SQL', False),
+                )
+                metrics.register('webhook_dedup', _deduplicator.get_metrics)
+    return _deduplicator
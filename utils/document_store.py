@@ -0,0 +1,240 @@
+import hashlib
+import logging
+import os
+import secrets
+from collections import namedtuple
+from datetime import datetime
+
+from flask import current_app, has_app_context
+from sqlalchemy import delete, update
+
+from models import db
+from models.ingestion_job import IngestionJob
+from models.knowledge_base import KnowledgeBase
+from models.knowledge_chunk import KnowledgeChunk
+from models.knowledge_document import KnowledgeDocument
+
+logger = logging.getLogger(__name__)
+
+BLOB_FOLDER = 'uploads/knowledge/blobs'
+READ_SIZE = 64 * 1024
+
+# path - vaqtinchalik fayl; sha256 - hex; size - o'qilgan baytlar
+StoredUpload = namedtuple('StoredUpload', ['path', 'sha256', 'size'])
+
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+def _extension(filename):
+    return filename.lower().split('.')[-1]
+
+
+def save_upload(stream, max_bytes=None):
+    """
+    Yuklanayotgan faylni diskka oqim bilan yozish va shu bilan birga SHA-256
+    hisoblash (fayl ikkinchi marta o'qilmaydi). `max_bytes` dan oshsa yozish
+    to'xtatiladi - qaytgan size limitdan katta bo'ladi.
+
+    Returns:
+        StoredUpload: Vaqtinchalik fayl, uning SHA-256 i va hajmi
+    """
+    folder = os.path.join(_setting('KB_BLOB_FOLDER', BLOB_FOLDER), 'incoming')
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f'{secrets.token_hex(8)}.part')
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(path, 'wb') as f:
+            while True:
+                block = stream.read(READ_SIZE)
+                if not block:
+                    break
+                size += len(block)
+                if max_bytes is not None and size > max_bytes:
+                    break
+                digest.update(block)
+                f.write(block)
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return StoredUpload(path, digest.hexdigest(), size)
+
+
+def blob_path(sha256, filename):
+    folder = _setting('KB_BLOB_FOLDER', BLOB_FOLDER)
+    return os.path.join(folder, sha256[:2], f'{sha256}.{_extension(filename)}')
+
+
+def store_blob(upload, filename):
+    """
+    Vaqtinchalik faylni kontent-manzilli joyiga ko'chirish. Bir xil fayl
+    diskda bitta nusxada saqlanadi (mavjud nusxa bir xil baytlar bilan almashadi).
+    """
+    path = blob_path(upload.sha256, filename)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(upload.path, path)
+    return path
+
+
+def _blob_in_use(file_path):
+    if db.session.query(KnowledgeDocument.id).filter_by(file_path=file_path).first() is not None:
+        return True
+    return db.session.query(IngestionJob.id).filter(
+        IngestionJob.file_path == file_path,
+        IngestionJob.status.in_(['pending', 'running'])
+    ).first() is not None
+
+
+def discard_blob(file_path):
+    """
+    Kontent-manzilli faylni hech bir hujjat yoki tugamagan ish ishlatmasa o'chirish.
+
+    Fayl avval vaqtinchalik nomga ko'chiriladi va havolalar qayta tekshiriladi:
+    shu orada xuddi shu faylni yuklagan so'rov (uning navbat yozuvi blob
+    joylanishidan oldin saqlanadi) paydo bo'lsa fayl joyiga qaytariladi.
+    """
+    if _blob_in_use(file_path) or not os.path.exists(file_path):
+        return
+    doomed = f'{file_path}.{secrets.token_hex(4)}.deleting'
+    try:
+        os.replace(file_path, doomed)
+    except FileNotFoundError:
+        return
+    if _blob_in_use(file_path):
+        # Bir xil baytlar - parallel joylangan nusxa ustiga yozilsa ham farqi yo'q
+        os.replace(doomed, file_path)
+    else:
+        os.remove(doomed)
+
+
+def content_key(file_sha256, filename, additional_text=None):
+    """Umumiy hujjat kaliti: fayl baytlari, fayl turi va qo'shimcha matn"""
+    payload = f'{file_sha256}\n{_extension(filename)}\n{additional_text or ""}'
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def find_document(content_hash):
+    """Tayyor (havolasi bor) umumiy hujjat yoki None"""
+    return KnowledgeDocument.query.filter(
+        KnowledgeDocument.content_hash == content_hash,
+        KnowledgeDocument.ref_count > 0
+    ).first()
+
+
+def acquire_document(document_id):
+    """
+    Hujjatga yangi havola qo'shish (commit qilinmaydi - bilim bazasi bilan
+    birga saqlanadi). Hujjat ayni paytda o'chirilayotgan bo'lsa False.
+    """
+    result = db.session.execute(
+        update(KnowledgeDocument)
+        .where(KnowledgeDocument.id == document_id, KnowledgeDocument.ref_count > 0)
+        .values(ref_count=KnowledgeDocument.ref_count + 1, last_used_at=datetime.utcnow())
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount == 1
+
+
+def create_document(content_hash, file_sha256, file_path, content):
+    """
+    Yangi umumiy hujjat (bitta havola bilan, commit qilinmaydi). Xuddi shu
+    kalitli hujjat parallel yaratilgan bo'lsa IntegrityError.
+    """
+    document = KnowledgeDocument(
+        content_hash=content_hash,
+        file_sha256=file_sha256,
+        file_path=file_path,
+        content=content,
+        ref_count=1
+    )
+    db.session.add(document)
+    db.session.flush()
+    return document
+
+
+def release_document(document_id):
+    """
+    Hujjatdan bitta havolani olib tashlash (commit qilinadi). Oxirgi havola
+    bo'lsa hujjat, uning bo'laklari, indekslari va fayli o'chiriladi.
+
+    Returns:
+        bool: Hujjat o'chirildimi
+    """
+    db.session.execute(
+        update(KnowledgeDocument)
+        .where(KnowledgeDocument.id == document_id)
+        .values(ref_count=KnowledgeDocument.ref_count - 1)
+        .execution_options(synchronize_session=False)
+    )
+    file_path = db.session.query(KnowledgeDocument.file_path).filter_by(id=document_id).scalar()
+    result = db.session.execute(
+        delete(KnowledgeDocument)
+        .where(KnowledgeDocument.id == document_id, KnowledgeDocument.ref_count <= 0)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount == 1:
+        KnowledgeChunk.query.filter_by(document_id=document_id).delete(synchronize_session=False)
+    db.session.commit()
+    if result.rowcount != 1:
+        return False
+
+    from utils.retrieval import discard_document_index
+    from utils.vector_index import remove_document_vectors
+    discard_document_index(document_id)
+    try:
+        remove_document_vectors(document_id)
+        discard_blob(file_path)
+    except OSError as e:
+        logger.error(f"Hujjat fayllarini o'chirishda xato (document {document_id}): {str(e)}")
+    logger.info(f"Umumiy hujjat o'chirildi: {document_id}")
+    return True
+
+
+def delete_knowledge_bases(knowledge_bases):
+    """
+    Bilim bazalarini o'chirish (commit qilinadi). Umumiy hujjatga bog'langan
+    bazaning havolasi bo'shatiladi; hujjatsiz (eski) bazaning fayli va
+    indekslari darhol o'chiriladi. Foydalanuvchi o'chirilganda FK cascade
+    havolalarni bo'shatmaydi, shuning uchun bu funksiya undan oldin chaqiriladi.
+
+    Returns:
+        int: O'chirilgan bazalar soni
+    """
+    removed = [(kb.id, kb.user_id, kb.document_id, kb.file_path) for kb in knowledge_bases]
+    for kb in knowledge_bases:
+        db.session.delete(kb)
+    db.session.commit()
+
+    from utils.retrieval import forget_kb
+    from utils.vector_index import remove_kb_vectors
+    for kb_id, user_id, document_id, file_path in removed:
+        forget_kb(kb_id)
+        if document_id is not None:
+            release_document(document_id)
+            continue
+        try:
+            remove_kb_vectors(user_id, kb_id)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        except OSError as e:
+            logger.error(f"Bilim bazasi fayllarini o'chirishda xato (kb {kb_id}): {str(e)}")
+    return len(removed)
+
+
+def superseded_knowledge_bases(user_id):
+    """Foydalanuvchining nofaol, hech bir tugamagan ishga tegishli bo'lmagan bilim bazalari"""
+    in_progress = db.session.query(IngestionJob.kb_id).filter(
+        IngestionJob.user_id == user_id,
+        IngestionJob.status.in_(['pending', 'running']),
+        IngestionJob.kb_id.isnot(None)
+    )
+    return KnowledgeBase.query.filter(
+        KnowledgeBase.user_id == user_id,
+        KnowledgeBase.is_active.is_(False),
+        ~KnowledgeBase.id.in_(in_progress)
+    ).all()
@@ -0,0 +1,205 @@
+import logging
+import math
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+
+from flask import current_app, has_app_context, jsonify, request
+from flask_babel import _
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.rate_limit_bucket import RateLimitBucket
+from utils import metrics
+from utils.rate_limit import KeyedBuckets
+
+logger = logging.getLogger(__name__)
+
+Limit = namedtuple('Limit', ['rate', 'burst'])
+
+SQL_CLEANUP_INTERVAL = 300  # seconds
+SQL_IDLE_BUCKET_TTL = 3600  # seconds
+
+
+def parse_limit(value):
+    """'10/60' -> 60 sekundda 10 ta so'rov (burst 10, to'lish tezligi 10/60 sekundiga)"""
+    count, _sep, seconds = str(value).partition('/')
+    count = float(count)
+    seconds = float(seconds or 1)
+    return Limit(rate=count / seconds, burst=count)
+
+
+class EndpointRateLimiter:
+    """
+    Ochiq endpointlar uchun token bucket cheklovi (IP / tenant / endpoint kaliti).
+
+    Birinchi daraja - jarayon ichidagi bucketlar: bu yerda rad etilgan so'rov
+    DB ga umuman tegmaydi. Ikkinchi (ixtiyoriy) daraja - barcha gunicorn
+    workerlari uchun umumiy `rate_limit_buckets` jadvali.
+    """
+
+    def __init__(self, shared=None, max_keys=50000):
+        self.shared = shared  # None yoki 'sql'
+        self.max_keys = max_keys
+        self._local = {}
+        self._lock = threading.Lock()
+        self._last_sql_cleanup = 0.0
+        self._metrics = {'allowed': 0, 'rejected': 0, 'shared_rejected': 0, 'shared_errors': 0}
+
+    def _local_buckets(self, name, limit):
+        with self._lock:
+            buckets = self._local.get(name)
+            if buckets is None or (buckets.rate, buckets.capacity) != (limit.rate, limit.burst):
+                buckets = KeyedBuckets(limit.rate, limit.burst, self.max_keys)
+                self._local[name] = buckets
+            return buckets
+
+    def _incr(self, name):
+        with self._lock:
+            self._metrics[name] += 1
+
+    def hit(self, name, key, limit):
+        """
+        Bitta so'rovni hisobga olish
+
+        Returns:
+            tuple: (ruxsat: bool, Retry-After sekund)
+        """
+        allowed, wait = self._local_buckets(name, limit).get(key).try_acquire()
+        if not allowed:
+            self._incr('rejected')
+            return False, wait
+
+        if self.shared == 'sql':
+            allowed, wait = self._hit_shared(f'{name}:{key}', limit)
+            if not allowed:
+                self._incr('rejected')
+                self._incr('shared_rejected')
+                return False, wait
+
+        self._incr('allowed')
+        return True, 0.0
+
+    def _hit_shared(self, key, limit):
+        now = time.time()
+        try:
+            row = db.session.query(RateLimitBucket).filter_by(key=key).with_for_update().first()
+            if row is None:
+                row = RateLimitBucket(key=key, tokens=limit.burst, updated_at=now)
+                db.session.add(row)
+                tokens = limit.burst
+            else:
+                tokens = min(limit.burst, row.tokens + max(0.0, now - row.updated_at) * limit.rate)
+
+            allowed = tokens >= 1
+            row.tokens = tokens - 1 if allowed else tokens
+            row.updated_at = now
+            db.session.commit()
+            self._cleanup_shared(now)
+            return allowed, 0.0 if allowed else (1 - tokens) / limit.rate
+        except IntegrityError:
+            # Boshqa worker shu kalitni hozirgina yaratdi
+            db.session.rollback()
+            return True, 0.0
+        except Exception as e:
+            # Cheklov xizmati ishlamasa so'rovni to'xtatmaymiz
+            db.session.rollback()
+            self._incr('shared_errors')
+            logger.error(f"Rate limit jadvalida xato: {str(e)}")
+            return True, 0.0
+
+    def _cleanup_shared(self, now):
+        if now - self._last_sql_cleanup < SQL_CLEANUP_INTERVAL:
+            return
+        self._last_sql_cleanup = now
+        try:
+            RateLimitBucket.query.filter(
+                RateLimitBucket.updated_at < now - SQL_IDLE_BUCKET_TTL
+            ).delete(synchronize_session=False)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Rate limit jadvalini tozalashda xato: {str(e)}")
+
+    def get_metrics(self):
+        with self._lock:
+            data = dict(self._metrics)
+            data['tracked_keys'] = sum(len(buckets) for buckets in self._local.values())
+        data['shared'] = self.shared
+        return data
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+def get_endpoint_limiter():
+    """Jarayon bo'yicha yagona EndpointRateLimiter"""
+    global _limiter
+    if _limiter is None:
+        with _limiter_lock:
+            if _limiter is None:
+                config = current_app.config if has_app_context() else {}
+                shared = config.get('RATE_LIMIT_BACKEND', 'memory')
+                _limiter = EndpointRateLimiter(shared='sql' if shared == 'sql' else None)
+                metrics.register('endpoint_rate_limit', _limiter.get_metrics)
+    return _limiter
+
+
+def client_ip():
+    """So'rov yuboruvchi IP (ProxyFix orqali X-Forwarded-For hisobga olingan)"""
+    return request.remote_addr or 'unknown'
+
+
+def hit_limit(name, default, key=None):
+    """
+    Bitta so'rovni RATE_LIMIT_<NAME> sozlamasi bo'yicha hisobga olish
+    (sozlama bo'sh bo'lsa cheklanmaydi)
+
+    Args:
+        name (str): Cheklov nomi
+        default (str): Sozlama bo'lmasa ishlatiladigan qiymat ('10/60')
+        key (str, optional): Bucket kaliti (standart - IP)
+
+    Returns:
+        tuple: (ruxsat: bool, Retry-After sekund)
+    """
+    value = current_app.config.get(f'RATE_LIMIT_{name.upper()}', default)
+    if not value:
+        return True, 0.0
+    return get_endpoint_limiter().hit(name, key or client_ip(), parse_limit(value))
+
+
+def too_many_requests(wait, body=None):
+    """429 javobi (Retry-After sarlavhasi bilan)"""
+    if body is None:
+        body = {
+            'success': False,
+            'error': _('Juda ko\'p so\'rov yuborildi. Birozdan keyin qayta urinib ko\'ring.')
+        }
+    result = jsonify(body)
+    result.status_code = 429
+    result.headers['Retry-After'] = str(max(1, int(math.ceil(wait))))
+    return result
+
+
+def rate_limited(name, default, key_func=None, response=None):
+    """
+    Endpointni token bucket bilan cheklash (view ichidagi har qanday DB ishidan oldin)
+
+    Args:
+        name (str): Cheklov nomi; qiymati RATE_LIMIT_<NAME> sozlamasidan olinadi
+        default (str): Sozlama bo'lmasa ishlatiladigan qiymat ('10/60')
+        key_func (callable, optional): view argumentlaridan kalit (standart - IP)
+        response (callable, optional): 429 javobi uchun dict qaytaruvchi funksiya
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            key = key_func(*args, **kwargs) if key_func else None
+            allowed, wait = hit_limit(name, default, key)
+            if allowed:
+                return view(*args, **kwargs)
+            return too_many_requests(wait, response() if response else None)
+        return wrapper
+    return decorator
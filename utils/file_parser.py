@@ -1,37 +1,341 @@
 import PyPDF2
-import docx
-import pandas as pd
+import codecs
+import csv
+import multiprocessing
+import os
 import re
-from io import BytesIO
+import threading
+import zipfile
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO, TextIOWrapper
+from xml.etree.ElementTree import iterparse
+
+from flask import current_app, has_app_context
+
+# text - to'liq matn; pages - [(matndagi boshlanish offseti, sahifa raqami)] yoki None;
+# records - [(boshlanish, tugash)] har biri alohida bo'lak bo'ladigan yozuvlar (CSV qatorlari) yoki None
+ParsedDocument = namedtuple('ParsedDocument', ['text', 'pages', 'records'], defaults=(None,))
+
+# WordprocessingML teglari
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+W_BODY, W_P, W_T, W_TAB, W_BR, W_CR = _W + 'body', _W + 'p', _W + 't', _W + 'tab', _W + 'br', _W + 'cr'
+W_TBL, W_TR, W_TC = _W + 'tbl', _W + 'tr', _W + 'tc'
+
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+def _get_pdf_pool():
+    """Katta PDF lar uchun jarayonlar puli (birinchi kerak bo'lganda yaratiladi)"""
+    global _pdf_pool
+    if _pdf_pool is None:
+        with _pdf_pool_lock:
+            if _pdf_pool is None:
+                # Ko'p oqimli gunicorn jarayonini fork qilish xavfli - spawn
+                _pdf_pool = ProcessPoolExecutor(
+                    max_workers=_setting('PDF_WORKERS', 2),
+                    mp_context=multiprocessing.get_context('spawn')
+                )
+    return _pdf_pool
+
+def extract_pdf_page_range(file_path, start, stop):
+    """
+    [start, stop) sahifalar matni. Har bir oraliq o'z PdfReader ini ochadi,
+    shuning uchun o'qilgan sahifalar obyektlari oraliq tugashi bilan bo'shaydi.
+
+    Returns:
+        list: [(sahifa raqami 1 dan, tozalangan matn), ...]
+    """
+    reader = PyPDF2.PdfReader(file_path)
+    return [
+        (number + 1, clean_text(reader.pages[number].extract_text() or ''))
+        for number in range(start, stop)
+    ]
+
+def iter_pdf_pages(file_path, on_progress=None):
+    """
+    PDF sahifalarini tartib bilan bittadan qaytaruvchi generator.
+
+    PDF_PARALLEL_MIN_PAGES dan kichik hujjat bitta o'qishda olinadi. Kattaroq
+    hujjat PDF_PAGES_PER_TASK talik oraliqlarga bo'linadi (xotira sahifalar
+    soniga bog'liq o'smaydi) va PDF_WORKERS > 1 bo'lsa oraliqlar jarayonlar
+    pulida parallel o'qiladi. Pulga bir vaqtda ko'pi bilan PDF_WORKERS * 2
+    oraliq yuboriladi - o'qilgan, lekin hali olinmagan sahifalar to'planmaydi.
+
+    Args:
+        file_path (str): Saqlangan PDF fayl
+        on_progress (callable, optional): on_progress(o'qilgan sahifalar, jami)
+
+    Yields:
+        tuple: (sahifa raqami, matn)
+    """
+    total = len(PyPDF2.PdfReader(file_path).pages)
+    large = total >= _setting('PDF_PARALLEL_MIN_PAGES', 100)
+    per_task = max(_setting('PDF_PAGES_PER_TASK', 100), 1) if large else max(total, 1)
+    starts = list(range(0, total, per_task))
+    stops = [min(start + per_task, total) for start in starts]
+
+    workers = _setting('PDF_WORKERS', 2)
+    if large and len(starts) > 1 and workers > 1:
+        batches = _iter_pool_ranges(file_path, zip(starts, stops), window=workers * 2)
+    else:
+        batches = (extract_pdf_page_range(file_path, start, stop) for start, stop in zip(starts, stops))
+
+    done = 0
+    for batch in batches:
+        for number, text in batch:
+            yield number, text
+        done += len(batch)
+        if on_progress:
+            on_progress(done, total)
+
+def _iter_pool_ranges(file_path, ranges, window):
+    """Oraliqlarni pulda o'qish: navbatda ko'pi bilan `window` ta future, natijalar tartib bilan"""
+    pool = _get_pdf_pool()
+    pending = deque()
+    try:
+        for start, stop in ranges:
+            pending.append(pool.submit(extract_pdf_page_range, file_path, start, stop))
+            if len(pending) >= window:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # O'qish to'xtatilsa (xato yoki generator yopildi) boshlanmagan oraliqlar bekor qilinadi
+        for future in pending:
+            future.cancel()
+
+def extract_pdf_document(file_path, on_progress=None):
+    """PDF matni va har bir sahifaning matndagi boshlanish offseti"""
+    parts = []
+    pages = []
+    offset = 0
+    for number, text in iter_pdf_pages(file_path, on_progress):
+        if not text:
+            continue
+        if parts:
+            offset += 1  # sahifalar orasidagi bo'shliq
+        pages.append((offset, number))
+        parts.append(text)
+        offset += len(text)
+    return ParsedDocument(' '.join(parts), pages)
 
 def extract_text_from_pdf(file_content):
     """Extract text from PDF file"""
     try:
         pdf_reader = PyPDF2.PdfReader(BytesIO(file_content))
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text()
-        return clean_text(text)
+        return clean_text(' '.join(page.extract_text() or '' for page in pdf_reader.pages))
     except Exception as e:
         return f"Error extracting PDF: {str(e)}"
 
+def _paragraph_text(paragraph):
+    parts = []
+    for node in paragraph.iter():
+        if node.tag == W_T:
+            parts.append(node.text or '')
+        elif node.tag in (W_TAB, W_BR, W_CR):
+            parts.append(' ')
+    return ''.join(parts).strip()
+
+def iter_docx_records(source):
+    """
+    DOCX ni python-docx obyekt modelisiz o'qish: word/document.xml zip ichidan
+    oqim bilan ochiladi va iterparse bilan yuriladi. Tugagan elementlar darhol
+    tozalanadi, shuning uchun xotira hujjat hajmiga bog'liq o'smaydi.
+
+    Args:
+        source (str | file): Fayl yo'li yoki fayl obyekti
+
+    Yields:
+        tuple: ('paragraph', matn) yoki ('row', [katak matnlari]) - hujjat tartibida.
+        Ichma-ich jadvallar tashqi katak matniga qo'shiladi.
+    """
+    with zipfile.ZipFile(source) as archive, archive.open('word/document.xml') as document:
+        body = None
+        tables = []  # ochiq jadvallar: har biri uchun joriy qator va katak
+        for event, elem in iterparse(document, events=('start', 'end')):
+            tag = elem.tag
+            if event == 'start':
+                if tag == W_BODY:
+                    body = elem
+                elif tag == W_TBL:
+                    tables.append({'elem': elem, 'row': None, 'cell': None})
+                elif tag == W_TR and tables:
+                    tables[-1]['row'] = []
+                elif tag == W_TC and tables:
+                    tables[-1]['cell'] = []
+                continue
+
+            if tag == W_P:
+                text = _paragraph_text(elem)
+                if tables and tables[-1]['cell'] is not None:
+                    if text:
+                        tables[-1]['cell'].append(text)
+                elif text:
+                    yield 'paragraph', text
+                elem.clear()
+            elif tag == W_TC and tables:
+                table = tables[-1]
+                if table['row'] is not None:
+                    table['row'].append(' '.join(table['cell'] or []))
+                table['cell'] = None
+            elif tag == W_TR and tables:
+                cells = tables[-1]['row'] or []
+                tables[-1]['row'] = None
+                if len(tables) > 1:
+                    # Ichki jadval qatori - tashqi katak matni sifatida
+                    outer_cell = tables[-2]['cell']
+                    if outer_cell is not None and any(cells):
+                        outer_cell.append('; '.join(cell for cell in cells if cell))
+                elif any(cells):
+                    yield 'row', cells
+                elem.clear()
+                # Uzun jadvallarda tugagan qatorlar ham xotirada to'planmasin
+                if elem in tables[-1]['elem']:
+                    tables[-1]['elem'].remove(elem)
+            elif tag == W_TBL and tables:
+                tables.pop()
+
+            # Tugagan yuqori darajadagi elementlarni body dan olib tashlash
+            if body is not None and not tables and tag in (W_P, W_TBL):
+                body.clear()
+
+def extract_docx_document(source):
+    """
+    DOCX matni: paragraflar va jadval qatorlari ('katak; katak;') hujjat
+    tartibida, har biri alohida qatorda. Har bir jadval qatori - alohida
+    yozuv (records), ketma-ket paragraflar esa bitta yozuv bo'lib odatdagidek
+    bo'laklanadi.
+    """
+    parts = []
+    records = []
+    offset = 0
+    paragraphs_start = None  # ochiq paragraflar yozuvining boshlanishi
+    for kind, value in iter_docx_records(source):
+        if kind == 'row':
+            text = clean_text('; '.join(cell for cell in value if cell)) + ';'
+        else:
+            text = clean_text(value)
+        if not text.strip(';'):
+            continue
+        if parts:
+            offset += 1
+        if kind == 'row':
+            if paragraphs_start is not None:
+                records.append((paragraphs_start, offset - 1))
+                paragraphs_start = None
+            records.append((offset, offset + len(text)))
+        elif paragraphs_start is None:
+            paragraphs_start = offset
+        parts.append(text)
+        offset += len(text)
+    if paragraphs_start is not None:
+        records.append((paragraphs_start, offset))
+    return ParsedDocument('\n'.join(parts), None, records)
+
 def extract_text_from_docx(file_content):
     """Extract text from DOCX file"""
     try:
-        doc = docx.Document(BytesIO(file_content))
-        text = ""
-        for paragraph in doc.paragraphs:
-            text += paragraph.text + "\n"
-        return clean_text(text)
+        return extract_docx_document(BytesIO(file_content)).text
     except Exception as e:
         return f"Error extracting DOCX: {str(e)}"
 
+CSV_SAMPLE_BYTES = 64 * 1024
+CSV_PROGRESS_ROWS = 1000
+
+def sniff_encoding(sample):
+    """
+    Matn kodirovkasini aniqlash: UTF-8 (BOM bilan yoki BOMsiz), bo'lmasa cp1251.
+    Namuna belgi o'rtasida kesilgan bo'lishi mumkin - oxiridagi chala belgi xato emas.
+    Namunadan keyin uchragan noto'g'ri baytlar o'qishda almashtiriladi.
+    """
+    try:
+        codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return 'cp1251'
+    return 'utf-8-sig'
+
+def _sniff_dialect(sample):
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=',;\t|')
+    except csv.Error:
+        return csv.excel
+
+def iter_csv_records(stream):
+    """
+    CSV ni qatorma-qator o'qib har bir qatorni ixcham yozuvga aylantirish:
+    "ustun: qiymat; ustun: qiymat". Birinchi qator sarlavha hisoblanadi,
+    bo'sh qiymatlar tashlab ketiladi. Butun fayl xotiraga yuklanmaydi.
+
+    Args:
+        stream: Matn oqimi (newline='' bilan ochilgan)
+
+    Yields:
+        str: Qator yozuvi
+    """
+    dialect = _sniff_dialect(stream.read(CSV_SAMPLE_BYTES))
+    stream.seek(0)
+    reader = csv.reader(stream, dialect)
+
+    header = None
+    for row in reader:
+        values = [clean_text(value) for value in row]
+        if not any(values):
+            continue
+        if header is None:
+            header = [value or f'{number + 1}-ustun' for number, value in enumerate(values)]
+            continue
+        fields = []
+        for number, value in enumerate(values):
+            if not value:
+                continue
+            name = header[number] if number < len(header) else f'{number + 1}-ustun'
+            fields.append(f'{name}: {value}')
+        if fields:
+            yield '; '.join(fields)
+
+def _csv_document(stream, on_progress=None, total=None):
+    """Yozuvlar alohida qatorlarga yoziladi, har birining offsetlari saqlanadi"""
+    parts = []
+    records = []
+    offset = 0
+    for number, record in enumerate(iter_csv_records(stream), 1):
+        if parts:
+            offset += 1
+        records.append((offset, offset + len(record)))
+        parts.append(record)
+        offset += len(record)
+        if on_progress and total and number % CSV_PROGRESS_ROWS == 0:
+            on_progress(stream.buffer.tell(), total)
+    return ParsedDocument('\n'.join(parts), None, records)
+
+def extract_csv_document(file_path, on_progress=None):
+    """
+    Saqlangan CSV faylni oqim bilan o'qish (pandas siz)
+
+    Returns:
+        ParsedDocument: har bir qator - alohida yozuv (records)
+    """
+    with open(file_path, 'rb') as f:
+        encoding = sniff_encoding(f.read(CSV_SAMPLE_BYTES))
+    total = os.path.getsize(file_path)
+    with open(file_path, encoding=encoding, errors='replace', newline='') as stream:
+        document = _csv_document(stream, on_progress, total)
+    if on_progress:
+        on_progress(total, total)
+    return document
+
 def extract_text_from_csv(file_content):
     """Extract text from CSV file"""
     try:
-        df = pd.read_csv(BytesIO(file_content))
-        text = df.to_string(index=False)
-        return clean_text(text)
+        encoding = sniff_encoding(file_content[:CSV_SAMPLE_BYTES])
+        stream = TextIOWrapper(BytesIO(file_content), encoding=encoding, errors='replace', newline='')
+        return _csv_document(stream).text
     except Exception as e:
         return f"Error extracting CSV: {str(e)}"
 
@@ -57,6 +361,24 @@ def clean_text(text):
     text = re.sub(r'[^\w\s\.\,\!\?\;\:\-\(\)]', '', text)
     return text.strip()
 
+def parse_file_path(file_path, filename, on_progress=None):
+    """
+    Saqlangan faylni diskdan o'qib matnga aylantirish (xatoda exception)
+
+    Returns:
+        ParsedDocument: matn va (PDF uchun) sahifa offsetlari
+    """
+    extension = filename.lower().split('.')[-1]
+    if extension == 'pdf':
+        return extract_pdf_document(file_path, on_progress)
+    if extension == 'docx':
+        return extract_docx_document(file_path)
+    if extension == 'csv':
+        return extract_csv_document(file_path, on_progress)
+
+    with open(file_path, 'rb') as f:
+        return ParsedDocument(parse_file(f.read(), filename), None)
+
 def parse_file(file_content, filename):
     """Parse file based on extension and extract text"""
     extension = filename.lower().split('.')[-1]
@@ -0,0 +1,525 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, exists, or_, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import aliased
+
+from models import db
+from models.ingestion_job import IngestionJob
+from models.knowledge_base import KnowledgeBase
+from models.knowledge_chunk import KnowledgeChunk
+from utils import metrics
+from utils.answer_cache import get_answer_cache
+from utils.document_store import (
+    acquire_document, blob_path, content_key, create_document, delete_knowledge_bases, discard_blob,
+    find_document, release_document, store_blob, superseded_knowledge_bases
+)
+from utils.file_parser import iter_pdf_pages, parse_file_path
+from utils.retrieval import index_knowledge_base, store_knowledge_chunks, store_page_chunks
+
+logger = logging.getLogger(__name__)
+
+# Bosqichlar va ularning umumiy jarayondagi ulushi
+STAGES = (
+    ('parse', 0.5),
+    ('clean', 0.05),
+    ('chunk', 0.15),
+    ('index', 0.25),
+    ('activate', 0.05),
+)
+
+
+def _stage_offsets():
+    offsets = {}
+    start = 0.0
+    for name, weight in STAGES:
+        offsets[name] = (start, weight)
+        start += weight
+    return offsets
+
+
+_STAGE_OFFSETS = _stage_offsets()
+
+PROGRESS_COMMIT_INTERVAL = 0.5  # seconds
+
+# Worker pool holati (har bir gunicorn jarayoni uchun alohida)
+_workers = []
+_wakeup = threading.Event()
+_stop_event = threading.Event()
+_settings = {
+    'poll_interval': 1.0,
+    'lease_seconds': 600,
+    'max_attempts': 2,
+}
+_stats_lock = threading.Lock()
+_stats = {'completed': 0, 'reused': 0, 'failed': 0, 'retried': 0, 'seconds': 0.0}
+
+
+class IngestionError(Exception):
+    """Faylni bilim bazasiga aylantirib bo'lmadi (qayta urinish foydasiz)"""
+
+
+def _incr(name, value=1):
+    with _stats_lock:
+        _stats[name] += value
+
+
+def get_metrics():
+    with _stats_lock:
+        data = dict(_stats)
+    data['seconds'] = round(data['seconds'], 3)
+    data['workers'] = sum(1 for worker in _workers if worker.is_alive())
+    return data
+
+
+def is_running():
+    """Worker pool ushbu jarayonda ishlayaptimi"""
+    return any(worker.is_alive() for worker in _workers)
+
+
+class _Progress:
+    """Bosqich ichidagi jarayonni job yozuviga tez-tez commit qilmasdan yozish"""
+
+    def __init__(self, job):
+        self.job = job
+        self._last_commit = 0.0
+
+    def stage(self, name):
+        self.update(name, 0.0, force=True)
+
+    def update(self, name, fraction, force=False):
+        start, weight = _STAGE_OFFSETS[name]
+        self.job.stage = name
+        self.job.progress = start + weight * min(max(fraction, 0.0), 1.0)
+        now = time.monotonic()
+        if force or now - self._last_commit >= PROGRESS_COMMIT_INTERVAL:
+            self._last_commit = now
+            db.session.commit()
+
+
+def _document_key(job):
+    return content_key(job.file_sha256, job.file_name, job.additional_text) if job.file_sha256 else None
+
+
+def _can_reuse(job):
+    """Fayl avval qayta ishlangan va foydalanuvchining navbatda boshqa fayli yo'q"""
+    key = _document_key(job)
+    if key is None or find_document(key) is None:
+        return False
+    return db.session.query(IngestionJob.id).filter(
+        IngestionJob.user_id == job.user_id,
+        IngestionJob.status.in_(['pending', 'running'])
+    ).first() is None
+
+
+def enqueue_ingestion(user_id, file_name, file_path=None, additional_text=None, file_sha256=None, upload=None):
+    """
+    Yuklangan faylni qayta ishlash navbatiga qo'yish
+
+    Args:
+        user_id (int): Bilim bazasi egasi
+        file_name (str): Foydalanuvchiga ko'rsatiladigan fayl nomi
+        file_path (str): Diskdagi fayl
+        additional_text (str, optional): Faylga qo'shiladigan matn
+        file_sha256 (str, optional): Yuklashda hisoblangan SHA-256 (umumiy hujjatni topish uchun)
+        upload (StoredUpload, optional): save_upload dagi vaqtinchalik fayl. Avval
+            blobga havola qiluvchi navbat yozuvi saqlanadi, keyin fayl blob joyiga
+            ko'chiriladi - parallel discard_blob uni o'chirib yubora olmaydi.
+
+    Returns:
+        IngestionJob: Saqlangan navbat yozuvi
+    """
+    if upload is not None:
+        file_sha256 = upload.sha256
+        file_path = blob_path(upload.sha256, file_name)
+    job = IngestionJob(
+        user_id=user_id,
+        file_name=file_name,
+        file_path=file_path,
+        additional_text=additional_text or None,
+        file_sha256=file_sha256
+    )
+    # Worker pool o'chirilgan yoki fayl tayyor hujjatga ulanadi - so'rov ichida bajaramiz.
+    # Ish darhol 'running' holatida yoziladi (fayl joylanguncha ham), shuning uchun workerlar uni olmaydi.
+    inline = not is_running() or _can_reuse(job)
+    if inline or upload is not None:
+        job.status = 'running'
+        job.locked_at = datetime.utcnow()
+    if inline:
+        job.attempts = 1
+    try:
+        db.session.add(job)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        raise e
+
+    if upload is not None:
+        try:
+            store_blob(upload, file_name)
+        except Exception as e:
+            job.status = 'failed'
+            job.error = str(e)
+            job.finished_at = datetime.utcnow()
+            db.session.commit()
+            raise
+
+    if inline:
+        run_job(job)
+    else:
+        if upload is not None:
+            job.status = 'pending'
+            job.locked_at = None
+            db.session.commit()
+        _wakeup.set()
+    return job
+
+
+def claim_next_job():
+    """
+    Navbatdagi ishni egallash. Bitta foydalanuvchining fayllari yuklangan
+    tartibda qayta ishlanadi, shuning uchun oxirgi yuklangan fayl faol bo'ladi.
+    """
+    candidates = IngestionJob.query.filter_by(status='pending').order_by(IngestionJob.id).limit(20).all()
+
+    seen_users = set()
+    for candidate in candidates:
+        if candidate.user_id in seen_users:
+            continue
+        seen_users.add(candidate.user_id)
+
+        other = aliased(IngestionJob)
+        blocker = exists().where(and_(
+            other.user_id == candidate.user_id,
+            or_(
+                other.status == 'running',
+                and_(other.status == 'pending', other.id < candidate.id)
+            )
+        ))
+        result = db.session.execute(
+            update(IngestionJob)
+            .where(IngestionJob.id == candidate.id, IngestionJob.status == 'pending', ~blocker)
+            .values(status='running', locked_at=datetime.utcnow(), attempts=IngestionJob.attempts + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            db.session.refresh(candidate)
+            return candidate
+
+    return None
+
+
+def _create_kb(job, content=None, document_id=None):
+    # Yangi baza tayyor bo'lguncha nofaol - eski baza javob berishda davom etadi
+    kb = KnowledgeBase(
+        user_id=job.user_id,
+        file_name=job.file_name,
+        file_path=job.file_path,
+        content=content,
+        is_active=False,
+        document_id=document_id
+    )
+    db.session.add(kb)
+    db.session.flush()
+    job.kb_id = kb.id
+    return kb
+
+
+def _activate(job, kb, progress):
+    progress.stage('activate')
+    # Bitta UPDATE: yangi baza faol, qolganlari nofaol bo'ladi
+    db.session.execute(
+        update(KnowledgeBase)
+        .where(KnowledgeBase.user_id == job.user_id)
+        .values(is_active=(KnowledgeBase.id == kb.id))
+        .execution_options(synchronize_session=False)
+    )
+    job.status = 'done'
+    job.stage = 'done'
+    job.progress = 1.0
+    job.error = None
+    job.finished_at = datetime.utcnow()
+    db.session.commit()
+
+    # Eski fayl asosidagi javoblar endi yaroqsiz
+    get_answer_cache().invalidate_user(job.user_id)
+
+    # Almashtirilgan bazalar boshqa ishlatilmaydi: ularning umumiy hujjat
+    # havolalari bo'shatiladi (aks holda hujjat hech qachon o'chirilmasdi)
+    try:
+        delete_knowledge_bases(superseded_knowledge_bases(job.user_id))
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Eski bilim bazalarini o'chirishda xato (user {job.user_id}): {str(e)}")
+
+
+def _reuse_document(job):
+    """Xuddi shu fayl avval qayta ishlangan bo'lsa uning hujjatiga havola olish"""
+    key = _document_key(job)
+    document = find_document(key) if key else None
+    if document is None or not acquire_document(document.id):
+        return None
+    return document
+
+
+def _attach_document(job, shared, progress):
+    """Tahlil, bo'laklar va indekslar umumiy hujjatdan - hech narsa qayta ishlanmaydi"""
+    kb = _create_kb(job, document_id=shared.id)
+    _activate(job, kb, progress)
+    _incr('reused')
+
+
+def _additional_text(job):
+    return f"\n\nQo'shimcha ma'lumot:\n{job.additional_text}" if job.additional_text else ''
+
+
+def _reuse_after_conflict(job, progress):
+    """Xuddi shu fayl boshqa workerda tayyor bo'ldi - o'shani ishlatamiz (bir marta)"""
+    db.session.rollback()
+    shared = _reuse_document(job)
+    if shared is None:
+        raise IngestionError("Umumiy hujjatni saqlab ham, topib ham bo'lmadi")
+    _attach_document(job, shared, progress)
+
+
+def _ingest_pdf(job, progress):
+    """
+    PDF sahifalari o'qilishi bilan bo'laklanib yoziladi - to'liq matn
+    xotirada yig'ilmaydi va hujjatda saqlanmaydi. Bo'laklar avval nofaol
+    bilim bazasiga yoziladi (jarayon commit lari chala hujjatni ko'rsatmasin),
+    oxirida bitta UPDATE bilan umumiy hujjatga o'tkaziladi.
+    """
+    progress.stage('parse')
+    kb = _create_kb(job)
+
+    def pages():
+        try:
+            yield from iter_pdf_pages(
+                job.file_path,
+                on_progress=lambda done, total: progress.update('parse', done / max(total, 1))
+            )
+        except Exception as e:
+            raise IngestionError(f"Faylni tahlil qilishda xatolik: {str(e)}")
+
+    count = store_page_chunks(kb.id, pages(), tail_text=_additional_text(job))
+    if not count:
+        raise IngestionError("Fayldan matn olinmadi")
+
+    progress.stage('chunk')
+    try:
+        shared = create_document(_document_key(job), job.file_sha256, job.file_path, None)
+    except IntegrityError:
+        db.session.rollback()
+        # Yozilgan bo'laklar bilan nofaol baza kerak emas
+        _discard_partial(job)
+        db.session.commit()
+        _reuse_after_conflict(job, progress)
+        return
+    KnowledgeChunk.query.filter_by(kb_id=kb.id).update(
+        {'kb_id': None, 'document_id': shared.id}, synchronize_session=False
+    )
+    kb.document_id = shared.id
+    shared.chunk_count = count
+    db.session.commit()
+
+    progress.stage('index')
+    index_knowledge_base(kb.id, user_id=job.user_id, document_id=shared.id)
+
+    _activate(job, kb, progress)
+
+
+def _ingest(job, progress):
+    """parse -> clean -> chunk -> index -> activate (tayyor hujjat bo'lsa darhol activate)"""
+    shared = _reuse_document(job)
+    if shared is not None:
+        _attach_document(job, shared, progress)
+        return
+    if job.file_sha256 and job.file_name.lower().endswith('.pdf'):
+        _ingest_pdf(job, progress)
+        return
+
+    progress.stage('parse')
+    try:
+        # Fayl diskdan o'qiladi; PDF sahifalari / CSV baytlari bo'yicha jarayon ko'rsatiladi
+        document = parse_file_path(
+            job.file_path, job.file_name,
+            on_progress=lambda done, total: progress.update('parse', done / max(total, 1))
+        )
+    except Exception as e:
+        raise IngestionError(f"Faylni tahlil qilishda xatolik: {str(e)}")
+
+    progress.stage('clean')
+    content = (document.text or '').strip()
+    pages_end = len(content)
+    content += _additional_text(job)
+    if not content:
+        raise IngestionError("Fayldan matn olinmadi")
+
+    progress.stage('chunk')
+    document_id = None
+    if job.file_sha256:
+        # Matn va bo'laklar umumiy hujjatda - bilim bazasida nusxa saqlanmaydi
+        try:
+            shared = create_document(_document_key(job), job.file_sha256, job.file_path, content)
+        except IntegrityError:
+            _reuse_after_conflict(job, progress)
+            return
+        document_id = shared.id
+    kb = _create_kb(job, content=None if document_id else content, document_id=document_id)
+    rows = store_knowledge_chunks(
+        kb.id, content, pages=document.pages, pages_end=pages_end, records=document.records,
+        document_id=document_id
+    )
+    if document_id:
+        shared.chunk_count = len(rows)
+    db.session.commit()
+
+    progress.stage('index')
+    index_knowledge_base(kb.id, user_id=job.user_id, document_id=document_id)
+
+    _activate(job, kb, progress)
+
+
+def _discard_partial(job):
+    """
+    Muvaffaqiyatsiz urinishda yaratilgan nofaol bilim bazasini o'chirish
+
+    Returns:
+        int: Bo'shatilishi kerak bo'lgan umumiy hujjat ID si (commit dan keyin) yoki None
+    """
+    if job.kb_id is None:
+        return None
+    kb = db.session.get(KnowledgeBase, job.kb_id)
+    document_id = None
+    if kb is not None and not kb.is_active:
+        document_id = kb.document_id
+        db.session.delete(kb)
+    job.kb_id = None
+    return document_id
+
+
+def run_job(job):
+    """Bitta ishni bajarish"""
+    started = time.monotonic()
+    if job.status == 'pending':
+        job.status = 'running'
+        job.locked_at = datetime.utcnow()
+        job.attempts = (job.attempts or 0) + 1
+        db.session.commit()
+
+    try:
+        _ingest(job, _Progress(job))
+        _incr('completed')
+        _incr('seconds', time.monotonic() - started)
+        logger.info(f"Bilim bazasi tayyor: {job.file_name} (user {job.user_id}, job {job.id})")
+        return
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Faylni qayta ishlashda xato (job {job.id}): {str(e)}")
+        error = str(e)
+        # So'rov ichida bajarilganda (worker pool yo'q) qayta urinadigan hech kim yo'q
+        retry = is_running() and not isinstance(e, IngestionError) and job.attempts < _settings['max_attempts']
+
+    try:
+        document_id = _discard_partial(job)
+        job.error = error
+        if retry:
+            job.status = 'pending'
+            job.stage = 'queued'
+            job.progress = 0.0
+            job.locked_at = None
+            _incr('retried')
+        else:
+            job.status = 'failed'
+            job.finished_at = datetime.utcnow()
+            _incr('failed')
+        db.session.commit()
+
+        if document_id is not None:
+            release_document(document_id)
+        if not retry:
+            if job.file_sha256:
+                # Umumiy fayl boshqa hujjat yoki ish uchun kerak bo'lishi mumkin
+                discard_blob(job.file_path)
+            elif os.path.exists(job.file_path):
+                os.remove(job.file_path)
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Ish holatini saqlashda xato (job {job.id}): {str(e)}")
+
+
+def requeue_stale_jobs():
+    """Worker o'lib qolgan (lease muddati o'tgan) ishlarni navbatga qaytarish"""
+    stale_before = datetime.utcnow() - timedelta(seconds=_settings['lease_seconds'])
+    IngestionJob.query.filter(
+        IngestionJob.status == 'running',
+        IngestionJob.locked_at < stale_before
+    ).update({'status': 'pending', 'stage': 'queued', 'progress': 0.0, 'locked_at': None}, synchronize_session=False)
+    db.session.commit()
+
+
+def _worker_loop(app, number):
+    last_maintenance = 0.0
+    with app.app_context():
+        while not _stop_event.is_set():
+            job = None
+            try:
+                if number == 0 and time.monotonic() - last_maintenance > 60:
+                    last_maintenance = time.monotonic()
+                    requeue_stale_jobs()
+                job = claim_next_job()
+                if job is not None:
+                    run_job(job)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Ingestion worker xatosi: {str(e)}")
+            finally:
+                db.session.remove()
+
+            if job is None:
+                _wakeup.wait(_settings['poll_interval'])
+                _wakeup.clear()
+
+
+def start_workers(app):
+    """
+    Fayllarni qayta ishlovchi worker pool ni ishga tushirish
+
+    Returns:
+        int: Ishga tushirilgan workerlar soni (0 - fayllar so'rov ichida qayta ishlanadi)
+    """
+    num_workers = int(app.config.get('INGESTION_WORKERS', 2))
+    _settings['poll_interval'] = float(app.config.get('INGESTION_POLL_INTERVAL', 1.0))
+    _settings['lease_seconds'] = int(app.config.get('INGESTION_JOB_LEASE_SECONDS', 600))
+    _settings['max_attempts'] = int(app.config.get('INGESTION_JOB_MAX_ATTEMPTS', 2))
+    metrics.register('kb_ingestion', get_metrics)
+
+    if num_workers <= 0 or is_running():
+        return 0
+
+    _stop_event.clear()
+    _workers[:] = []
+    for number in range(num_workers):
+        worker = threading.Thread(
+            target=_worker_loop,
+            args=(app, number),
+            name=f'ingestion-worker-{number}',
+            daemon=True
+        )
+        worker.start()
+        _workers.append(worker)
+    return num_workers
+
+
+def stop_workers(timeout=5):
+    """Worker pool ni to'xtatish"""
+    _stop_event.set()
+    _wakeup.set()
+    for worker in _workers:
+        worker.join(timeout)
+    _workers[:] = []
@@ -0,0 +1,181 @@
+import re
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+
+from utils import metrics
+
+SUPPORTED_LANGUAGES = ('uz', 'ru', 'en')
+DEFAULT_LANGUAGE = 'uz'
+
+# O'zbek lotin yozuvidagi oʻ/gʻ: turli apostrof belgilari bilan
+_UZ_LATIN_MARKER_RE = re.compile(r"[og][ʻʼ'‘’`]", re.IGNORECASE)
+_UZ_CYRILLIC_LETTERS = set('ўқғҳЎҚҒҲ')
+_CYRILLIC_RE = re.compile(r'[Ѐ-ӿ]')
+_LATIN_RE = re.compile(r'[A-Za-z]')
+_WORD_RE = re.compile(r"[^\W\d_]+(?:[ʻʼ'‘’`][^\W\d_]+)*", re.UNICODE)
+
+# Ko'p uchraydigan so'zlar va qo'shimchalar (kichik harflarda)
+_UZ_LATIN_WORDS = {
+    'va', 'bu', 'men', 'siz', 'biz', 'uchun', 'bilan', 'qancha', 'qanday', 'qayerda', 'nima',
+    'nechta', 'bormi', 'kerak', 'mumkin', 'mumkinmi', 'salom', 'rahmat', 'yoq', 'ha', 'emas',
+    'bor', 'narxi', 'qachon', 'kim', 'qaysi', 'iltimos', 'yaxshi', 'assalomu', 'alaykum',
+}
+_UZ_LATIN_SUFFIXES = ('lar', 'larni', 'ning', 'dagi', 'ga', 'da', 'dan', 'ni', 'mi', 'miz', 'siz', 'ingiz')
+_EN_WORDS = {
+    'the', 'is', 'are', 'what', 'how', 'where', 'when', 'which', 'who', 'do', 'does', 'can',
+    'you', 'your', 'i', 'a', 'an', 'of', 'to', 'and', 'for', 'in', 'on', 'with', 'price',
+    'hello', 'hi', 'thanks', 'please', 'have', 'there', 'much', 'many', 'it', 'this',
+}
+_UZ_CYRILLIC_WORDS = {
+    'ва', 'бу', 'учун', 'билан', 'қанча', 'қандай', 'нима', 'борми', 'керак', 'мумкин',
+    'салом', 'раҳмат', 'йўқ', 'ҳа', 'эмас', 'нархи',
+}
+
+# Ball farqi bundan kichik bo'lsa natija noaniq hisoblanadi
+MIN_MARGIN = 1.0
+
+
+def _score_latin(text, words):
+    """O'zbek (lotin) va ingliz tillari uchun ballar"""
+    uz = 0.0
+    en = 0.0
+    uz += 2.0 * len(_UZ_LATIN_MARKER_RE.findall(text))
+    lowered = text.lower()
+    uz += 0.5 * (lowered.count('sh') + lowered.count('ch'))
+    # O'zbek lotin alifbosida 'w' va 'ch' dan tashqari 'c' deyarli uchramaydi
+    en += lowered.count('w') + 0.5 * max(0, lowered.count('c') - lowered.count('ch'))
+    uz += lowered.count('q') * 0.5 + lowered.count('x') * 0.3
+
+    for word in words:
+        if word in _UZ_LATIN_WORDS:
+            uz += 2.0
+        elif word in _EN_WORDS:
+            en += 2.0
+        elif len(word) > 4 and word.endswith(_UZ_LATIN_SUFFIXES):
+            uz += 0.5
+    if "'" in text or '’' in text:
+        # Inglizcha qisqartmalar (it's, don't)
+        en += 1.0 * len(re.findall(r"\b\w+'(?:s|t|re|ll|ve|m|d)\b", lowered))
+    return uz, en
+
+
+def _score_cyrillic(text, words):
+    """O'zbek (kirill) va rus tillari uchun ballar"""
+    uz = 3.0 * sum(1 for ch in text if ch in _UZ_CYRILLIC_LETTERS)
+    uz += 2.0 * sum(1 for word in words if word in _UZ_CYRILLIC_WORDS)
+    # Rus tilida ko'p uchraydigan, o'zbek kirillida kam ishlatiladigan harflar
+    ru = 1.0 * sum(1 for ch in text.lower() if ch in 'ыщьъ')
+    ru += 0.5 * len(words)
+    return uz, ru
+
+
+def classify(text):
+    """
+    Yozuv statistikasi va o'zbek belgilari bo'yicha til aniqlash
+
+    Returns:
+        tuple: (til yoki None, ishonchli bo'lsa True)
+    """
+    if not text:
+        return None, False
+    cyrillic = len(_CYRILLIC_RE.findall(text))
+    latin = len(_LATIN_RE.findall(text))
+    if not cyrillic and not latin:
+        return None, False
+
+    words = [word.lower() for word in _WORD_RE.findall(text)]
+    if cyrillic > latin:
+        uz, ru = _score_cyrillic(text, words)
+        if uz > 0 and uz >= ru:
+            return 'uz', uz - ru >= MIN_MARGIN or any(ch in _UZ_CYRILLIC_LETTERS for ch in text)
+        return 'ru', ru - uz >= MIN_MARGIN
+
+    uz, en = _score_latin(text, words)
+    if abs(uz - en) < MIN_MARGIN:
+        return ('uz' if uz >= en else 'en'), False
+    return ('uz' if uz > en else 'en'), True
+
+
+def _langdetect(text):
+    """Noaniq holatlar uchun langdetect (deterministik urug' bilan)"""
+    try:
+        from langdetect import DetectorFactory, detect
+        DetectorFactory.seed = 0
+        language = detect(text)
+    except Exception:
+        return None
+    return language if language in SUPPORTED_LANGUAGES else None
+
+
+_stats = {'fast': 0, 'fallback': 0}
+_stats_lock = threading.Lock()
+
+
+@lru_cache(maxsize=4096)
+def detect_language(text, default=DEFAULT_LANGUAGE):
+    """
+    Matn tilini aniqlash ('uz', 'ru' yoki 'en'): avval tezkor yozuv tahlili,
+    faqat noaniq bo'lsa langdetect
+    """
+    language, confident = classify(text)
+    if confident:
+        with _stats_lock:
+            _stats['fast'] += 1
+        return language
+    with _stats_lock:
+        _stats['fallback'] += 1
+    return _langdetect(text) or language or default
+
+
+class ChatLanguageCache:
+    """
+    Chat bo'yicha aniqlangan til (LRU). Qisqa yoki noaniq xabarlar chatning
+    oldingi tilini oladi; faqat ishonchli natija saqlangan tilni almashtiradi.
+    """
+
+    def __init__(self, max_entries=50000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._metrics = {'hits': 0, 'detections': 0}
+
+    def detect(self, chat_key, text, default=DEFAULT_LANGUAGE):
+        language, confident = classify(text)
+        with self._lock:
+            cached = self._entries.get(chat_key)
+            if cached is not None and not confident:
+                self._entries.move_to_end(chat_key)
+                self._metrics['hits'] += 1
+                return cached
+            self._metrics['detections'] += 1
+
+        if confident:
+            with _stats_lock:
+                _stats['fast'] += 1
+        else:
+            language = detect_language(text, default)
+        with self._lock:
+            self._entries[chat_key] = language
+            self._entries.move_to_end(chat_key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return language
+
+    def get_metrics(self):
+        with self._lock:
+            data = dict(self._metrics)
+            data['entries'] = len(self._entries)
+        with _stats_lock:
+            data['fast'] = _stats['fast']
+            data['fallback'] = _stats['fallback']
+        return data
+
+
+_chat_languages = ChatLanguageCache()
+metrics.register('language_detection', _chat_languages.get_metrics)
+
+
+def detect_chat_language(chat_key, text, default=DEFAULT_LANGUAGE):
+    """Chat uchun tilni aniqlash (chat bo'yicha keshlangan)"""
+    return _chat_languages.detect(chat_key, text, default)
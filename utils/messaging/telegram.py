@@ -4,10 +4,190 @@ import logging
 import secrets
 import hashlib
 import hmac
+import random
+import threading
+import time
+from flask import current_app, has_app_context
+from requests.adapters import HTTPAdapter
+from utils.rate_limit import KeyedBuckets, TokenBucket
+from utils import metrics
 
 logger = logging.getLogger(__name__)
 
-def send_message_to_telegram(bot_token, chat_id, text):
+TELEGRAM_API_BASE = "https://api.telegram.org"
+
+# Telegram bitta xabar matni uchun ruxsat etgan maksimal uzunlik
+TELEGRAM_MESSAGE_LIMIT = 4096
+
+# Streaming javob uchun dastlabki xabar (keyin tahrirlanadi)
+STREAM_PLACEHOLDER = "⏳"
+
+class TelegramClient:
+    """
+    Telegram Bot API klienti: keep-alive ulanishlar puli, bot va chat bo'yicha
+    token bucketlar (Telegram limitlari: ~30 xabar/s bot uchun, 1 xabar/s chat
+    uchun) va HTTP 429 `retry_after` ni hisobga oladigan qayta urinish.
+    """
+
+    def __init__(self, api_base=TELEGRAM_API_BASE, bot_rate=30, chat_rate=1, chat_burst=1,
+                 max_retries=3, timeout=10, max_throttle_wait=30, pool_maxsize=32):
+        self.api_base = api_base.rstrip('/')
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_throttle_wait = max_throttle_wait
+        self.bot_rate = bot_rate
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._bot_buckets = {}
+        self._chat_buckets = KeyedBuckets(chat_rate, chat_burst)
+        self._lock = threading.Lock()
+        self._metrics = {
+            'requests': 0,
+            'failures': 0,
+            'retries': 0,
+            'rate_limited_429': 0,
+            'throttled': 0,
+            'throttle_wait_seconds': 0.0,
+            'throttle_timeouts': 0,
+            'waiting': 0,
+            'max_waiting': 0,
+        }
+
+    def _bot_bucket(self, bot_token):
+        with self._lock:
+            bucket = self._bot_buckets.get(bot_token)
+            if bucket is None:
+                bucket = TokenBucket(self.bot_rate, self.bot_rate)
+                self._bot_buckets[bot_token] = bucket
+            return bucket
+
+    def _incr(self, name, value=1):
+        with self._lock:
+            self._metrics[name] += value
+
+    def _throttle(self, bot_token, chat_id):
+        """Bot va chat limitlari bo'yicha navbat kutish"""
+        buckets = [self._bot_bucket(bot_token)]
+        if chat_id is not None:
+            buckets.append(self._chat_buckets.get((bot_token, str(chat_id))))
+
+        with self._lock:
+            self._metrics['waiting'] += 1
+            self._metrics['max_waiting'] = max(self._metrics['max_waiting'], self._metrics['waiting'])
+        try:
+            waited_total = 0.0
+            for bucket in reversed(buckets):
+                waited = bucket.acquire(timeout=self.max_throttle_wait)
+                if waited is None:
+                    self._incr('throttle_timeouts')
+                    raise requests.exceptions.Timeout("Telegram rate limit navbatida kutish vaqti tugadi")
+                waited_total += waited
+            if waited_total > 0.001:
+                self._incr('throttled')
+                self._incr('throttle_wait_seconds', waited_total)
+        finally:
+            self._incr('waiting', -1)
+
+    def request(self, bot_token, method, payload=None, chat_id=None, http_method='POST'):
+        """
+        Bot API metodini chaqirish
+
+        Args:
+            bot_token (str): Telegram bot tokeni
+            method (str): API metodi (masalan 'sendMessage')
+            payload (dict, optional): JSON ma'lumotlar
+            chat_id (str/int, optional): Chat limitini qo'llash uchun chat ID
+            http_method (str): 'POST' yoki 'GET'
+
+        Returns:
+            requests.Response: Oxirgi urinish javobi
+        """
+        url = f"{self.api_base}/bot{bot_token}/{method}"
+        if chat_id is not None:
+            self._throttle(bot_token, chat_id)
+
+        attempt = 0
+        while True:
+            self._incr('requests')
+            try:
+                response = self.session.request(http_method, url, json=payload, timeout=self.timeout)
+            except requests.exceptions.ConnectionError:
+                # Ulanish o'rnatilmagan - xabar yetib bormagan, qayta urinish xavfsiz
+                if attempt >= self.max_retries:
+                    self._incr('failures')
+                    raise
+                delay = self._backoff(attempt)
+            else:
+                if response.status_code == 429:
+                    self._incr('rate_limited_429')
+                    delay = self._retry_after(response, attempt)
+                    # Boshqa so'rovlar ham kutishi uchun bucketlarni jazolash
+                    self._bot_bucket(bot_token).penalize(delay)
+                    if chat_id is not None:
+                        self._chat_buckets.get((bot_token, str(chat_id))).penalize(delay)
+                elif response.status_code >= 500:
+                    delay = self._backoff(attempt)
+                else:
+                    return response
+
+                if attempt >= self.max_retries:
+                    self._incr('failures')
+                    return response
+
+            attempt += 1
+            self._incr('retries')
+            time.sleep(delay)
+
+    @staticmethod
+    def _backoff(attempt):
+        """Eksponensial kutish (jitter bilan)"""
+        return min(30.0, 0.5 * (2 ** attempt)) * (0.5 + random.random() / 2)
+
+    def _retry_after(self, response, attempt):
+        try:
+            retry_after = response.json().get('parameters', {}).get('retry_after')
+            if retry_after is not None:
+                return float(retry_after)
+        except ValueError:
+            pass
+        header = response.headers.get('Retry-After')
+        if header and header.isdigit():
+            return float(header)
+        return self._backoff(attempt)
+
+    def get_metrics(self):
+        """Navbat chuqurligi va cheklovlar bo'yicha metrikalar"""
+        with self._lock:
+            data = dict(self._metrics)
+        data['throttle_wait_seconds'] = round(data['throttle_wait_seconds'], 3)
+        data['tracked_bots'] = len(self._bot_buckets)
+        data['tracked_chats'] = len(self._chat_buckets)
+        return data
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_telegram_client():
+    """Jarayon bo'yicha yagona TelegramClient"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                config = current_app.config if has_app_context() else {}
+                _client = TelegramClient(
+                    api_base=config.get('TELEGRAM_API_BASE', TELEGRAM_API_BASE),
+                    bot_rate=config.get('TELEGRAM_BOT_RATE', 30),
+                    chat_rate=config.get('TELEGRAM_CHAT_RATE', 1),
+                    max_retries=config.get('TELEGRAM_MAX_RETRIES', 3),
+                )
+                metrics.register('telegram_client', _client.get_metrics)
+    return _client
+
+def send_message_to_telegram(bot_token, chat_id, text, parse_mode='HTML'):
     """
     Telegram botiga xabar yuborish funksiyasi
     
@@ -15,20 +195,20 @@ def send_message_to_telegram(bot_token, chat_id, text):
         bot_token (str): Telegram bot tokeni
         chat_id (str/int): Chat ID
         text (str): Yuborilishi kerak bo'lgan xabar matni
+        parse_mode (str, optional): 'HTML' yoki None (oddiy matn)
     
     Returns:
         dict: Telegram API javobini qaytaradi
     """
     try:
-        url = f"https://api.telegram.org/bot{bot_token}/sendMessage"
-        
         payload = {
             'chat_id': chat_id,
-            'text': text,
-            'parse_mode': 'HTML'
+            'text': text
         }
+        if parse_mode:
+            payload['parse_mode'] = parse_mode
         
-        response = requests.post(url, json=payload, timeout=10)
+        response = get_telegram_client().request(bot_token, 'sendMessage', payload, chat_id=chat_id)
         
         if response.status_code == 200:
             return {
@@ -61,6 +241,127 @@ def send_message_to_telegram(bot_token, chat_id, text):
             'error': f"Kutilmagan xato: {str(e)}"
         }
 
+def edit_message_text(bot_token, chat_id, message_id, text, parse_mode='HTML'):
+    """
+    Yuborilgan xabar matnini tahrirlash funksiyasi
+    
+    Args:
+        bot_token (str): Telegram bot tokeni
+        chat_id (str/int): Chat ID
+        message_id (int): Tahrirlanadigan xabar ID si
+        text (str): Yangi matn
+        parse_mode (str, optional): 'HTML' yoki None (oddiy matn)
+    
+    Returns:
+        dict: Tahrirlash natijasi
+    """
+    try:
+        payload = {
+            'chat_id': chat_id,
+            'message_id': message_id,
+            'text': text
+        }
+        if parse_mode:
+            payload['parse_mode'] = parse_mode
+        
+        response = get_telegram_client().request(bot_token, 'editMessageText', payload, chat_id=chat_id)
+        
+        if response.status_code == 200:
+            return {
+                'success': True,
+                'data': response.json()
+            }
+        elif response.status_code == 400 and 'message is not modified' in response.text:
+            # Matn o'zgarmagan - xabar allaqachon kerakli holatda
+            return {
+                'success': True,
+                'data': None
+            }
+        else:
+            logger.error(f"Telegram API xatosi: {response.status_code} - {response.text}")
+            return {
+                'success': False,
+                'error': f"HTTP {response.status_code}: {response.text}"
+            }
+            
+    except requests.exceptions.Timeout:
+        logger.error("Xabarni tahrirlashda timeout xatosi")
+        return {
+            'success': False,
+            'error': "Timeout xatosi"
+        }
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Xabarni tahrirlashda so'rov xatosi: {str(e)}")
+        return {
+            'success': False,
+            'error': f"So'rov xatosi: {str(e)}"
+        }
+    except Exception as e:
+        logger.error(f"Xabarni tahrirlashda kutilmagan xato: {str(e)}")
+        return {
+            'success': False,
+            'error': f"Kutilmagan xato: {str(e)}"
+        }
+
+def _split_message(text):
+    """Matnni Telegram limitiga sig'adigan bo'laklarga ajratish"""
+    return [text[i:i + TELEGRAM_MESSAGE_LIMIT] for i in range(0, len(text), TELEGRAM_MESSAGE_LIMIT)] or ['']
+
+def _finalize_message(bot_token, chat_id, message_id, text):
+    """Yakuniy matnni yozish: HTML, bo'lmasa oddiy matn, bo'lmasa yangi xabar"""
+    result = edit_message_text(bot_token, chat_id, message_id, text)
+    if not result['success']:
+        # Model javobidagi yopilmagan teglar HTML tahlilini buzishi mumkin
+        result = edit_message_text(bot_token, chat_id, message_id, text, parse_mode=None)
+    if not result['success']:
+        result = send_message_to_telegram(bot_token, chat_id, text, parse_mode=None)
+    return result
+
+def stream_message_to_telegram(bot_token, chat_id, pieces, edit_interval=1.5):
+    """
+    Javobni bo'laklab yuborish: avval qisqa xabar yuboriladi, keyin u kelayotgan
+    matn bilan joyida tahrirlanadi. Oraliq tahrirlar `edit_interval` dan tez
+    bo'lmaydi (Telegram tahrirlash limitlari); yakuniy tahrir har doim bajariladi.
+    
+    Args:
+        bot_token (str): Telegram bot tokeni
+        chat_id (str/int): Chat ID
+        pieces (iterable): Javob matni bo'laklari
+        edit_interval (float): Oraliq tahrirlar orasidagi minimal vaqt (sekund)
+    
+    Returns:
+        dict: Yakuniy yuborish natijasi
+    """
+    placeholder = send_message_to_telegram(bot_token, chat_id, STREAM_PLACEHOLDER, parse_mode=None)
+    if not placeholder['success']:
+        # Tahrirlanadigan xabar yo'q - to'liq javobni oddiy usulda yuborish
+        return send_message_to_telegram(bot_token, chat_id, ''.join(pieces))
+
+    message_id = placeholder['data']['result']['message_id']
+    parts = []
+    shown = STREAM_PLACEHOLDER
+    last_edit = time.monotonic()
+
+    try:
+        for piece in pieces:
+            parts.append(piece)
+            if time.monotonic() - last_edit < edit_interval:
+                continue
+            # Oraliq matn yopilmagan teglarga ega bo'lishi mumkin, shuning uchun oddiy matn
+            text = ''.join(parts)[:TELEGRAM_MESSAGE_LIMIT]
+            if text and text != shown:
+                if edit_message_text(bot_token, chat_id, message_id, text, parse_mode=None)['success']:
+                    shown = text
+                last_edit = time.monotonic()
+    except Exception as e:
+        logger.error(f"Javob oqimini o'qishda xato: {str(e)}")
+
+    chunks = _split_message(''.join(parts) or shown)
+    result = _finalize_message(bot_token, chat_id, message_id, chunks[0])
+    for chunk in chunks[1:]:
+        result = send_message_to_telegram(bot_token, chat_id, chunk)
+    return result
+
 def get_bot_info(bot_token):
     """
     Bot haqida ma'lumot olish funksiyasi
@@ -72,9 +373,7 @@ def get_bot_info(bot_token):
         dict: Bot ma'lumotlari yoki xato
     """
     try:
-        url = f"https://api.telegram.org/bot{bot_token}/getMe"
-        
-        response = requests.get(url, timeout=10)
+        response = get_telegram_client().request(bot_token, 'getMe', http_method='GET')
         
         if response.status_code == 200:
             data = response.json()
@@ -123,8 +422,6 @@ def set_webhook(bot_token, webhook_url, secret_token=None):
         dict: Webhook o'rnatish natijasi
     """
     try:
-        url = f"https://api.telegram.org/bot{bot_token}/setWebhook"
-        
         payload = {
             'url': webhook_url,
             'max_connections': 40,
@@ -134,7 +431,7 @@ def set_webhook(bot_token, webhook_url, secret_token=None):
         if secret_token:
             payload['secret_token'] = secret_token
         
-        response = requests.post(url, json=payload, timeout=10)
+        response = get_telegram_client().request(bot_token, 'setWebhook', payload)
         
         if response.status_code == 200:
             data = response.json()
@@ -187,9 +484,7 @@ def delete_webhook(bot_token):
         dict: Webhook o'chirish natijasi
     """
     try:
-        url = f"https://api.telegram.org/bot{bot_token}/deleteWebhook"
-        
-        response = requests.post(url, timeout=10)
+        response = get_telegram_client().request(bot_token, 'deleteWebhook')
         
         if response.status_code == 200:
             data = response.json()
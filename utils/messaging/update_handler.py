@@ -0,0 +1,85 @@
+import logging
+
+from flask import current_app
+
+from utils.ai_handler import get_tenant_ai_response, is_service_message, open_tenant_ai_stream
+from utils.chat_memory import get_chat_memory, looks_like_follow_up
+from utils.messaging.telegram import send_message_to_telegram, stream_message_to_telegram
+from utils.bot_routing import get_bot_routing_table
+from utils.language import detect_chat_language
+
+logger = logging.getLogger(__name__)
+
+def handle_telegram_update(user_id, update_data):
+    """
+    Navbatdan olingan Telegram update ni qayta ishlash: AI javobini olish va yuborish
+
+    Args:
+        user_id (int): Bot egasining ID si
+        update_data (dict): Telegram update
+    """
+    message = update_data.get('message') or {}
+    user_message = message.get('text') or message.get('caption', '')
+    if not user_message:
+        return
+
+    chat_id = message['chat']['id']
+
+    bot_route = get_bot_routing_table().get(user_id)
+    if not bot_route:
+        logger.error(f"User {user_id} uchun bot topilmadi")
+        return
+
+    # Bot tili; 'auto' bo'lsa chat bo'yicha aniqlanadi
+    language = bot_route.language or 'uz'
+    if language == 'auto':
+        language = detect_chat_language((user_id, chat_id), user_message)
+
+    # Chatning oxirgi savol-javoblari (promptga token budjeti doirasida qo'shiladi).
+    # Tarixli javob keshlanmaydi, shuning uchun u faqat oldingi suhbatga
+    # tayangan savollarga beriladi - mustaqil savollar keshdan javob oladi
+    memory = get_chat_memory() if current_app.config.get('TELEGRAM_CHAT_MEMORY', True) else None
+    chat_key = (user_id, chat_id)
+    history = memory.get(chat_key) if memory and looks_like_follow_up(user_message) else None
+
+    parts = []
+    if current_app.config.get('TELEGRAM_STREAMING', True):
+        ready_answer, stream = open_tenant_ai_stream(user_id, user_message, language, history=history)
+        if stream is None:
+            # Javob tayyor (kesh yoki shu savolga parallel berilgan javob) -
+            # vaqtinchalik xabar va tahrirlarsiz bitta xabar
+            parts.append(ready_answer)
+            result = send_message_to_telegram(bot_route.token, chat_id, ready_answer)
+        else:
+            def pieces():
+                for piece in stream:
+                    parts.append(piece)
+                    yield piece
+
+            # Javob kelishi bilan xabarni joyida tahrirlab borish
+            try:
+                result = stream_message_to_telegram(
+                    bot_route.token,
+                    chat_id,
+                    pieces(),
+                    edit_interval=current_app.config.get('TELEGRAM_STREAM_EDIT_INTERVAL', 1.5)
+                )
+            finally:
+                # Oqim oxirigacha o'qilmagan bo'lsa ham shu savolni kutayotganlar bo'shatiladi
+                stream.close()
+    else:
+        # AI javobini olish (kesh yoki bilim bazasi + Gemini)
+        ai_response = get_tenant_ai_response(user_id, user_message, language, history=history)
+        parts.append(ai_response)
+
+        # Javobni Telegram orqali yuborish
+        result = send_message_to_telegram(bot_route.token, chat_id, ai_response)
+
+    answer = ''.join(parts)
+    if memory and result['success'] and answer and not is_service_message(answer):
+        memory.append(chat_key, user_message, answer)
+
+    if result['success']:
+        logger.info(f"Xabar muvaffaqiyatli yuborildi: {user_id}")
+    else:
+        logger.error(f"Xabar yuborishda xato: {result['error']}")
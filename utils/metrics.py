@@ -0,0 +1,32 @@
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+_providers = {}
+_lock = threading.Lock()
+
+def register(name, provider):
+    """
+    Metrika manbasini ro'yxatdan o'tkazish
+
+    Args:
+        name (str): Metrika guruhi nomi
+        provider (callable): dict qaytaruvchi funksiya
+    """
+    with _lock:
+        _providers[name] = provider
+
+def snapshot():
+    """Barcha ro'yxatdan o'tgan metrikalarning joriy qiymatlari"""
+    with _lock:
+        providers = dict(_providers)
+
+    result = {}
+    for name, provider in providers.items():
+        try:
+            result[name] = provider()
+        except Exception as e:
+            logger.error(f"Metrikani olishda xato ({name}): {str(e)}")
+            result[name] = {'error': str(e)}
+    return result
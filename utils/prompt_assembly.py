@@ -0,0 +1,98 @@
+from utils.retrieval import estimate_tokens
+
+CHARS_PER_TOKEN = 4  # estimate_tokens bilan bir xil taxmin
+
+# Bo'laklar orasidagi ajratgich va yaxlitlash uchun
+SEPARATOR_TOKENS = 1
+
+# Bo'lakning qolgan qismi shundan kam bo'lsa kesib qo'shmaymiz
+MIN_PARTIAL_CHUNK_TOKENS = 50
+
+
+def _clip_to_tokens(text, max_tokens):
+    """Matnni token limitiga so'z chegarasida qisqartirish"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    clipped = text[:max_chars].rsplit(' ', 1)[0]
+    return clipped + '...'
+
+
+def _format_turn(question, answer):
+    return f"Foydalanuvchi/User: {question}\nJavob/Answer: {answer}"
+
+
+def _fit_history(history, budget):
+    """Eng yangi juftliklardan boshlab budjetga sig'adiganlari (eskidan yangiga)"""
+    selected = []
+    used = 0
+    for question, answer in reversed(history or []):
+        turn = _format_turn(question, answer)
+        tokens = estimate_tokens(turn) + SEPARATOR_TOKENS
+        if used + tokens > budget:
+            break
+        selected.append(turn)
+        used += tokens
+    selected.reverse()
+    return selected, used
+
+
+def _fit_context(context, budget):
+    """Kontekst bo'laklarini tartib bo'yicha budjetga sig'dirish (oxirgisi kesilishi mumkin)"""
+    selected = []
+    used = 0
+    for chunk in (context or '').split('\n\n'):
+        if not chunk.strip():
+            continue
+        tokens = estimate_tokens(chunk) + SEPARATOR_TOKENS
+        if used + tokens <= budget:
+            selected.append(chunk)
+            used += tokens
+            continue
+        remaining = budget - used
+        if remaining >= MIN_PARTIAL_CHUNK_TOKENS:
+            selected.append(_clip_to_tokens(chunk, remaining))
+        break
+    return '\n\n'.join(selected)
+
+
+def assemble_prompt(prompt, context=None, history=None, language='uz', budget=1500, history_budget=400):
+    """
+    Modelga yuboriladigan prompt: savol, chat tarixi va bilim bazasi konteksti
+    umumiy token budjetiga sig'diriladi. Savol har doim kiradi (budjetning
+    yarmigacha qisqartiriladi), keyin eng yangi suhbat juftliklari
+    (`history_budget` gacha), qolgan joy kontekstga beriladi.
+
+    Args:
+        prompt (str): Foydalanuvchi savoli
+        context (str, optional): retrieve_context natijasi
+        history (list, optional): [(savol, javob), ...] eskidan yangiga
+        language (str): Javob tili
+        budget (int): Promptning taxminiy tokenlar soni chegarasi
+        history_budget (int): Chat tarixi uchun ajratilgan eng ko'p token
+
+    Returns:
+        str: Tayyor prompt
+    """
+    question = _clip_to_tokens(prompt, max(budget // 2, 1))
+    if context:
+        tail = f"\nSavol/Question/Вопрос: {question}\n\nJavob/{language} tilida bering:\n"
+        header = "\nKontekst/Context/Контекст:\n"
+    else:
+        tail = f"Savol: {question}\n\nJavob:"
+        header = ""
+    remaining = budget - estimate_tokens(tail) - estimate_tokens(header)
+
+    turns, used = _fit_history(history, max(0, min(history_budget, remaining)))
+    remaining -= used
+    history_block = ""
+    if turns:
+        history_block = "Suhbat tarixi/Conversation/История:\n" + "\n\n".join(turns) + "\n\n"
+        remaining -= estimate_tokens("Suhbat tarixi/Conversation/История:\n")
+
+    if context:
+        fitted = _fit_context(context, max(0, remaining))
+        if fitted:
+            return f"{header}{fitted}\n\n{history_block}{tail}"
+        tail = f"Savol: {question}\n\nJavob:"
+    return f"{history_block}{tail}"
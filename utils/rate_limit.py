@@ -0,0 +1,85 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TokenBucket:
+    """
+    Token bucket: sekundiga `rate` ta token to'ldiriladi, eng ko'pi `capacity` ta.
+    Thread-safe.
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else max(rate, 1))
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        elapsed = now - self._updated
+        if elapsed > 0:
+            self._tokens = min(self.capacity, self._tokens + elapsed * self.rate)
+            self._updated = now
+
+    def try_acquire(self, tokens=1):
+        """
+        Token olishga urinish (kutmasdan)
+
+        Returns:
+            tuple: (olindi: bool, qancha kutish kerak: float sekund)
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return True, 0.0
+            return False, (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens=1, timeout=None):
+        """
+        Token bo'shaguncha kutish
+
+        Returns:
+            float: Kutilgan vaqt (sekund) yoki timeout tugasa None
+        """
+        started = time.monotonic()
+        while True:
+            acquired, wait = self.try_acquire(tokens)
+            if acquired:
+                return time.monotonic() - started
+            if timeout is not None and time.monotonic() - started + wait > timeout:
+                return None
+            time.sleep(wait)
+
+    def penalize(self, seconds):
+        """Tashqi cheklov (masalan HTTP 429 retry_after) bo'yicha bucketni bo'shatish"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, 0.0) - seconds * self.rate
+
+
+class KeyedBuckets:
+    """Kalit bo'yicha token bucketlar (eng uzoq ishlatilmaganlari o'chiriladi)"""
+
+    def __init__(self, rate, capacity=None, max_keys=10000):
+        self.rate = rate
+        self.capacity = capacity
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = TokenBucket(self.rate, self.capacity)
+                self._buckets[key] = bucket
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            return bucket
+
+    def __len__(self):
+        return len(self._buckets)
@@ -0,0 +1,492 @@
+import bisect
+import logging
+import math
+import re
+import threading
+from collections import Counter, OrderedDict, namedtuple
+
+from flask import current_app, has_app_context
+from sqlalchemy.exc import IntegrityError
+
+from models import db
+from models.knowledge_base import KnowledgeBase
+from models.knowledge_chunk import KnowledgeChunk
+
+logger = logging.getLogger(__name__)
+
+Chunk = namedtuple('Chunk', ['ordinal', 'text', 'start', 'end'])
+
+# O'zbek lotin yozuvidagi turli apostroflarni bittaga keltirish (oʻ, gʻ, tutuq belgisi)
+_APOSTROPHES = str.maketrans({
+    'ʻ': "'", 'ʼ': "'", '‘': "'", '’': "'", '`': "'", '´': "'",
+})
+_TOKEN_RE = re.compile(r"[\w']+")
+_SENTENCE_RE = re.compile(r'(?<=[.!?;])\s+')
+
+PREFIX_LENGTH = 4
+RRF_K = 60  # reciprocal rank fusion konstantasi
+
+
+def normalize_text(text):
+    """Kichik harflarga o'tkazish va apostroflarni bir xillashtirish"""
+    return text.lower().translate(_APOSTROPHES)
+
+
+def tokenize(text):
+    """
+    Matnni qidiruv termlariga ajratish (o'zbek lotin/kirill, rus, ingliz).
+
+    Har bir so'z o'zi va qo'shimchalarsiz moslashish uchun prefiks term
+    (masalan 'narxi' -> 'narx*') sifatida qo'shiladi.
+    """
+    terms = []
+    for token in _TOKEN_RE.findall(normalize_text(text)):
+        token = token.strip("'_")
+        if not token:
+            continue
+        terms.append(token)
+        if len(token) > PREFIX_LENGTH:
+            terms.append(token[:PREFIX_LENGTH] + '*')
+    return terms
+
+
+def chunk_text(text, chunk_size=800, overlap=100):
+    """
+    Matnni gap chegaralari bo'yicha taxminan `chunk_size` belgili bo'laklarga ajratish
+
+    Returns:
+        list[Chunk]: Bo'laklar (tartib raqami, matn, boshlanish va tugash offseti)
+    """
+    if not text:
+        return []
+
+    # Gaplar va ularning offsetlari
+    units = []
+    position = 0
+    for part in _SENTENCE_RE.split(text):
+        start = text.find(part, position)
+        if start < 0:
+            start = position
+        # Juda uzun gaplarni qattiq bo'lish
+        for offset in range(0, len(part), chunk_size):
+            piece = part[offset:offset + chunk_size]
+            if piece.strip():
+                units.append((start + offset, start + offset + len(piece)))
+        position = start + len(part)
+
+    chunks = []
+    first = 0
+    while first < len(units):
+        start = units[first][0]
+        last = first
+        while last + 1 < len(units) and units[last + 1][1] - start <= chunk_size:
+            last += 1
+        end = units[last][1]
+        chunks.append(Chunk(len(chunks), text[start:end].strip(), start, end))
+        if last + 1 >= len(units):
+            break
+
+        # Keyingi bo'lak oldingisining oxirgi gaplari bilan boshlanadi (overlap),
+        # lekin u albatta units[last + 1] ni ham sig'dirishi kerak - aks holda
+        # bir xil oxirli bo'laklar qayta-qayta chiqadi
+        next_first = last + 1
+        following_end = units[last + 1][1]
+        while (next_first - 1 > first
+               and end - units[next_first - 1][0] <= overlap
+               and following_end - units[next_first - 1][0] <= chunk_size):
+            next_first -= 1
+        first = next_first
+    return chunks
+
+
+class BM25Index:
+    """Bo'laklar ustida BM25 inverted index"""
+
+    def __init__(self, texts, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings = {}
+        self.doc_lengths = []
+
+        for doc_id, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self.doc_lengths.append(sum(counts.values()))
+            for term, tf in counts.items():
+                self.postings.setdefault(term, []).append((doc_id, tf))
+
+        num_docs = len(self.doc_lengths)
+        self.avg_length = (sum(self.doc_lengths) / num_docs) if num_docs else 0.0
+        self.idf = {
+            term: math.log(1 + (num_docs - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def __len__(self):
+        return len(self.doc_lengths)
+
+    def search(self, query, top_k=4):
+        """
+        So'rov bo'yicha eng mos bo'laklarni topish
+
+        Returns:
+            list[tuple]: (bo'lak indeksi, ball) - ball bo'yicha kamayish tartibida
+        """
+        scores = {}
+        avg_length = self.avg_length or 1.0
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = self.idf[term]
+            for doc_id, tf in docs:
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+
+        ranked = sorted(scores.items(), key=lambda item: item[1], reverse=True)
+        return ranked[:top_k]
+
+
+class KnowledgeIndexCache:
+    """Bilim bazasi (kb_id) yoki umumiy hujjat bo'yicha qurilgan indekslar uchun LRU kesh"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._indexes = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, kb_id):
+        with self._lock:
+            index = self._indexes.get(kb_id)
+            if index is not None:
+                self._indexes.move_to_end(kb_id)
+            return index
+
+    def put(self, kb_id, index):
+        with self._lock:
+            self._indexes[kb_id] = index
+            self._indexes.move_to_end(kb_id)
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+
+    def discard(self, kb_id):
+        with self._lock:
+            self._indexes.pop(kb_id, None)
+
+
+# BM25 indeksi va undagi hujjat tartibiga mos bo'lak ID lari (matnlar kesh da saqlanmaydi)
+KnowledgeIndex = namedtuple('KnowledgeIndex', ['chunk_ids', 'bm25'])
+
+_index_cache = KnowledgeIndexCache()
+
+# kb_id -> umumiy hujjat ID si (yoki False); bazaning hujjati yaratilgandan keyin o'zgarmaydi
+_kb_documents = KnowledgeIndexCache(max_entries=4096)
+
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+def estimate_tokens(text):
+    """Taxminiy token soni (~4 belgi = 1 token)"""
+    return max(1, len(text) // 4) if text else 0
+
+
+def _page_lookup(pages, text_end):
+    """Matn offseti -> sahifa raqami (sahifalangan matndan keyingi qism uchun None)"""
+    starts = [start for start, _number in pages]
+
+    def page_at(offset):
+        if offset >= text_end:
+            return None
+        position = bisect.bisect_right(starts, offset) - 1
+        return pages[max(position, 0)][1]
+    return page_at
+
+
+def chunk_records(text, records, chunk_size=800, overlap=100):
+    """
+    Har bir yozuv (masalan CSV qatori) alohida bo'lak bo'ladi; `chunk_size` dan
+    uzun yozuv odatdagidek bo'linadi. Oxirgi yozuvdan keyingi matn (qo'shimcha
+    ma'lumot) chunk_text bilan bo'laklanadi.
+
+    Returns:
+        list[Chunk]: Bo'laklar
+    """
+    chunks = []
+
+    def add(start, end):
+        if end - start <= chunk_size:
+            piece = text[start:end].strip()
+            if piece:
+                chunks.append(Chunk(len(chunks), piece, start, end))
+            return
+        for chunk in chunk_text(text[start:end], chunk_size, overlap):
+            chunks.append(Chunk(len(chunks), chunk.text, start + chunk.start, start + chunk.end))
+
+    for start, end in records:
+        add(start, end)
+    tail = records[-1][1] if records else 0
+    if text[tail:].strip():
+        add(tail, len(text))
+    return chunks
+
+
+def chunk_pages(pages, tail_text=None, chunk_size=800, overlap=100):
+    """
+    Sahifalar oqimini to'liq matnni yig'masdan bo'laklash. Sahifalar (bo'sh
+    bo'lmaganlari) orasiga bitta bo'shliq qo'yiladi - offsetlar
+    extract_pdf_document matnidagi bilan bir xil. Xotirada faqat oxirgi bir
+    necha bo'lak matni turadi.
+
+    Args:
+        pages (iterable): (sahifa raqami, matn) - tartib bilan
+        tail_text (str, optional): Sahifalardan keyingi matn (sahifasiz bo'laklar)
+
+    Yields:
+        tuple: (Chunk, boshlanish sahifasi, tugash sahifasi)
+    """
+    page_starts = []
+    buffer = ''
+    base = 0  # buffer ning matndagi offseti
+    ordinal = 0
+    pages = iter(pages)
+    while True:
+        page = next(pages, None)
+        if page is not None:
+            number, text = page
+            if not text:
+                continue
+            if page_starts:
+                buffer += ' '
+            page_starts.append((base + len(buffer), number))
+            buffer += text
+            if len(buffer) < 4 * chunk_size:
+                continue
+            page_at = _page_lookup(page_starts, math.inf)
+            chunks = chunk_text(buffer, chunk_size, overlap)
+            # Oxiridagi bo'laklar keyingi sahifa bilan o'zgarishi mumkin - ular keyingi safar
+            ready = [chunk for chunk in chunks[:-1] if chunk.end <= len(buffer) - chunk_size]
+        else:
+            pages_end = base + len(buffer)
+            if tail_text:
+                buffer += tail_text
+            page_at = _page_lookup(page_starts, pages_end) if page_starts else (lambda offset: None)
+            ready = chunks = chunk_text(buffer, chunk_size, overlap)
+
+        for chunk in ready:
+            start, end = base + chunk.start, base + chunk.end
+            yield Chunk(ordinal, chunk.text, start, end), page_at(start), page_at(end - 1)
+            ordinal += 1
+        if page is None:
+            return
+        if ready:
+            # Keyingi bo'lak (overlap bilan) shu joydan boshlanadi
+            cut = chunks[len(ready)].start
+            buffer = buffer[cut:]
+            base += cut
+
+
+def store_page_chunks(kb_id, pages, tail_text=None, batch_size=500):
+    """
+    Sahifalar oqimini bo'laklab knowledge_chunks ga `batch_size` talik
+    INSERT lar bilan yozish (commit qilinmaydi)
+
+    Returns:
+        int: Yozilgan bo'laklar soni
+    """
+    chunk_size = _setting('KB_CHUNK_SIZE', 800)
+    overlap = _setting('KB_CHUNK_OVERLAP', 100)
+    rows = []
+    count = 0
+    for chunk, page_start, page_end in chunk_pages(pages, tail_text, chunk_size=chunk_size, overlap=overlap):
+        rows.append({
+            'ordinal': chunk.ordinal,
+            'text': chunk.text,
+            'token_estimate': estimate_tokens(chunk.text),
+            'start_offset': chunk.start,
+            'end_offset': chunk.end,
+            'page_start': page_start,
+            'page_end': page_end,
+        })
+        if len(rows) >= batch_size:
+            KnowledgeChunk.bulk_create(kb_id, rows)
+            count += len(rows)
+            rows = []
+    KnowledgeChunk.bulk_create(kb_id, rows)
+    return count + len(rows)
+
+
+def store_knowledge_chunks(kb_id, content, pages=None, pages_end=None, records=None, document_id=None):
+    """
+    Matnni bo'laklab knowledge_chunks jadvaliga bitta INSERT bilan yozish (commit qilinmaydi)
+
+    Args:
+        pages (list, optional): [(boshlanish offseti, sahifa raqami)] - PDF sahifalari
+        pages_end (int, optional): Sahifalangan matn tugaydigan offset (undan keyin qo'shimcha matn)
+        records (list, optional): [(boshlanish, tugash)] - har biri alohida bo'lak bo'ladigan yozuvlar
+        document_id (int, optional): Bo'laklar umumiy hujjatga yoziladi (kb_id o'rniga)
+
+    Returns:
+        list[dict]: Yozilgan bo'laklar
+    """
+    chunk_size = _setting('KB_CHUNK_SIZE', 800)
+    overlap = _setting('KB_CHUNK_OVERLAP', 100)
+    if records:
+        chunks = chunk_records(content or '', records, chunk_size=chunk_size, overlap=overlap)
+    else:
+        chunks = chunk_text(content or '', chunk_size=chunk_size, overlap=overlap)
+    page_at = _page_lookup(pages, len(content) if pages_end is None else pages_end) if pages else None
+    rows = [
+        {
+            'ordinal': chunk.ordinal,
+            'text': chunk.text,
+            'token_estimate': estimate_tokens(chunk.text),
+            'start_offset': chunk.start,
+            'end_offset': chunk.end,
+            'page_start': page_at(chunk.start) if page_at else None,
+            'page_end': page_at(chunk.end - 1) if page_at else None,
+        }
+        for chunk in chunks
+    ]
+    KnowledgeChunk.bulk_create(None if document_id else kb_id, rows, document_id=document_id)
+    return rows
+
+
+def _index_key(kb_id, document_id):
+    return ('document', document_id) if document_id else kb_id
+
+
+def get_kb_document_id(kb_id):
+    """Bilim bazasi ishlatadigan umumiy hujjat ID si (eski bazalar uchun None)"""
+    document_id = _kb_documents.get(kb_id)
+    if document_id is None:
+        document_id = db.session.query(KnowledgeBase.document_id).filter_by(id=kb_id).scalar() or False
+        _kb_documents.put(kb_id, document_id)
+    return document_id or None
+
+
+def discard_document_index(document_id):
+    """O'chirilgan umumiy hujjatning BM25 indeksini keshdan chiqarish"""
+    _index_cache.discard(_index_key(None, document_id))
+
+
+def forget_kb(kb_id):
+    """O'chirilgan bilim bazasi uchun keshlangan indeks va hujjat bog'lanishini unutish"""
+    _index_cache.discard(kb_id)
+    _kb_documents.discard(kb_id)
+
+
+def index_knowledge_base(kb_id, user_id=None, document_id=None):
+    """
+    Saqlangan bo'laklardan BM25 indeksini qurish (yuklash vaqtida).
+    `user_id` berilsa bo'laklarning vektor indeksi ham diskka yoziladi.
+    `document_id` berilsa umumiy hujjat bo'laklari indekslanadi - indeks
+    shu hujjatni ishlatadigan barcha bilim bazalari uchun bitta.
+    """
+    if document_id:
+        criteria = {'document_id': document_id}
+    else:
+        criteria = {'kb_id': kb_id}
+    rows = db.session.query(KnowledgeChunk.id, KnowledgeChunk.text).filter_by(
+        **criteria
+    ).order_by(KnowledgeChunk.ordinal).all()
+    index = KnowledgeIndex([row.id for row in rows], BM25Index(row.text for row in rows))
+    _index_cache.put(_index_key(kb_id, document_id), index)
+
+    if user_id is not None:
+        from utils.vector_index import build_vector_index
+        try:
+            build_vector_index(user_id, kb_id, [row.text for row in rows], document_id=document_id)
+        except Exception as e:
+            # Vektor indeks bo'lmasa ham BM25 bilan ishlayveramiz
+            logger.error(f"Vektor indeksini qurishda xato (kb {kb_id}): {str(e)}")
+    return index
+
+
+def get_active_kb_id(user_id):
+    """Foydalanuvchining faol bilim bazasi ID si (matn ustunini yuklamasdan)"""
+    return db.session.query(KnowledgeBase.id).filter_by(
+        user_id=user_id,
+        is_active=True
+    ).order_by(KnowledgeBase.uploaded_at.desc()).limit(1).scalar()
+
+
+def _backfill_chunks(kb_id):
+    """Bo'laklari saqlanmagan eski bilim bazalari uchun bo'laklarni bir marta yozish"""
+    content = db.session.query(KnowledgeBase.content).filter_by(id=kb_id).scalar()
+    try:
+        store_knowledge_chunks(kb_id, content)
+        db.session.commit()
+    except IntegrityError:
+        # Boshqa worker allaqachon yozib bo'ldi
+        db.session.rollback()
+
+
+def get_kb_index(kb_id):
+    """Kesh dagi indeksni olish yoki saqlangan bo'laklardan qurish"""
+    document_id = get_kb_document_id(kb_id)
+    index = _index_cache.get(_index_key(kb_id, document_id))
+    if index is None:
+        if document_id is None:
+            has_chunks = db.session.query(KnowledgeChunk.id).filter_by(kb_id=kb_id).first() is not None
+            if not has_chunks:
+                _backfill_chunks(kb_id)
+        index = index_knowledge_base(kb_id, document_id=document_id)
+    return index
+
+
+def retrieve_context(user_id, question, top_k=None, kb_id=None):
+    """
+    Savolga eng mos bilim bazasi bo'laklarini kontekst sifatida qaytarish
+
+    Args:
+        user_id (int): Bilim bazasi egasi
+        question (str): Foydalanuvchi savoli
+        top_k (int, optional): Nechta bo'lak olinadi
+        kb_id (int, optional): Faol bilim bazasi ID si (oldindan ma'lum bo'lsa)
+
+    Returns:
+        str: Tanlangan bo'laklar (hujjatdagi tartibda) yoki bo'sh satr
+    """
+    if kb_id is None:
+        kb_id = get_active_kb_id(user_id)
+    if kb_id is None:
+        return ""
+
+    index = get_kb_index(kb_id)
+    if not index.chunk_ids:
+        return ""
+
+    top_k = top_k or _setting('KB_TOP_K', 4)
+    rankings = [index.bm25.search(question, top_k * 2)]
+
+    from utils.vector_index import search_vectors
+    try:
+        vector_hits = search_vectors(user_id, kb_id, question, top_k * 2, document_id=get_kb_document_id(kb_id))
+        # Indeks boshqa bo'laklash sozlamasi bilan qurilgan bo'lsa ishlatmaymiz
+        if all(doc_id < len(index.chunk_ids) for doc_id, _score in vector_hits):
+            rankings.append(vector_hits)
+    except Exception as e:
+        logger.error(f"Vektor qidiruvda xato (kb {kb_id}): {str(e)}")
+
+    # Mos bo'lak topilmasa (masalan salomlashish) hujjat boshini beramiz
+    doc_ids = fuse_rankings(rankings)[:top_k] or [0]
+    chunks = KnowledgeChunk.find_by_ids([index.chunk_ids[doc_id] for doc_id in doc_ids])
+    # PDF bo'laklari sahifasi bilan - javobda manbaga havola qilish mumkin
+    return "\n\n".join(f"{chunk.page_label} {chunk.text}" if chunk.page_label else chunk.text for chunk in chunks)
+
+
+def fuse_rankings(rankings):
+    """
+    Bir nechta qidiruv natijalarini reciprocal rank fusion bilan birlashtirish
+
+    Returns:
+        list[int]: Bo'lak indekslari - umumiy ball bo'yicha kamayish tartibida
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, (doc_id, _score) in enumerate(ranking):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (RRF_K + rank + 1)
+    return [doc_id for doc_id, _score in sorted(scores.items(), key=lambda item: item[1], reverse=True)]
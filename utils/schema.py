@@ -0,0 +1,74 @@
+import logging
+
+from sqlalchemy import inspect, text
+
+logger = logging.getLogger(__name__)
+
+# Mavjud jadvallarga keyin qo'shilgan ustunlar: db.create_all() faqat yangi
+# jadvallarni yaratadi, eski bazada bu ustunlar bo'lmaydi.
+# (jadval, ustun, ADD COLUMN dagi tur va cheklovlar)
+ADDED_COLUMNS = [
+    ('telegram_bots', 'webhook_secret', 'VARCHAR(255)'),
+    ('webhook_jobs', 'next_attempt_at', 'TIMESTAMP'),
+    ('knowledge_base', 'document_id', 'INTEGER REFERENCES knowledge_documents (id)'),
+    ('knowledge_chunks', 'page_start', 'INTEGER'),
+    ('knowledge_chunks', 'page_end', 'INTEGER'),
+    ('knowledge_chunks', 'document_id', 'INTEGER REFERENCES knowledge_documents (id) ON DELETE CASCADE'),
+    ('ingestion_jobs', 'file_sha256', 'VARCHAR(64)'),
+]
+
+# Keyin qo'shilgan indekslar (IF NOT EXISTS - PostgreSQL va SQLite da bir xil)
+ADDED_INDEXES = [
+    ('knowledge_base', 'CREATE INDEX IF NOT EXISTS ix_knowledge_base_document_id ON knowledge_base (document_id)'),
+    ('webhook_jobs', 'CREATE INDEX IF NOT EXISTS ix_webhook_jobs_status_id ON webhook_jobs (status, id)'),
+    ('knowledge_chunks', 'CREATE UNIQUE INDEX IF NOT EXISTS uq_knowledge_chunks_document_ordinal '
+                         'ON knowledge_chunks (document_id, ordinal)'),
+]
+
+# O'rniga boshqasi kelgan indekslar
+DROPPED_INDEXES = ['ix_webhook_jobs_shard_status']
+
+# Faqat PostgreSQL: umumiy hujjat bo'laklari kb_id siz saqlanadi
+# (SQLite ustun cheklovini o'zgartira olmaydi)
+POSTGRES_STATEMENTS = [
+    'ALTER TABLE knowledge_chunks ALTER COLUMN kb_id DROP NOT NULL',
+]
+
+
+def upgrade_schema(engine):
+    """
+    Eski bazani joriy modellarga moslash (db.create_all() dan keyin,
+    har ishga tushishda). Har bir qadam idempotent: mavjud ustun va
+    indekslar o'tkazib yuboriladi, bir vaqtda ishga tushgan workerlar
+    PostgreSQL da IF NOT EXISTS bilan bir-biriga xalaqit bermaydi.
+
+    Returns:
+        list: Qo'shilgan ustunlar ['jadval.ustun', ...]
+    """
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    postgres = engine.dialect.name == 'postgresql'
+    if_not_exists = 'IF NOT EXISTS ' if postgres else ''
+
+    added = []
+    with engine.begin() as connection:
+        for table, column, ddl in ADDED_COLUMNS:
+            if table not in tables:
+                continue
+            if column in {existing['name'] for existing in inspector.get_columns(table)}:
+                continue
+            connection.execute(text(f'ALTER TABLE {table} ADD COLUMN {if_not_exists}{column} {ddl}'))
+            added.append(f'{table}.{column}')
+
+        for table, statement in ADDED_INDEXES:
+            if table in tables:
+                connection.execute(text(statement))
+        for name in DROPPED_INDEXES:
+            connection.execute(text(f'DROP INDEX IF EXISTS {name}'))
+        if postgres and 'knowledge_chunks' in tables:
+            for statement in POSTGRES_STATEMENTS:
+                connection.execute(text(statement))
+
+    if added:
+        logger.info(f"Bazaga yangi ustunlar qo'shildi: {', '.join(added)}")
+    return added
@@ -0,0 +1,87 @@
+import threading
+
+
+class _Call:
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Bir xil kalit bilan bir vaqtda kelgan chaqiruvlarni birlashtirish:
+    birinchisi (leader) funksiyani bajaradi, qolganlari uning natijasini kutadi.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._metrics = {'leaders': 0, 'coalesced': 0, 'in_flight': 0}
+
+    def begin(self, key):
+        """
+        Kalit bo'yicha chaqiruvni boshlash yoki mavjudiga qo'shilish.
+
+        Returns:
+            tuple: (call, leader) - leader True bo'lsa natijani `finish` bilan
+            albatta yakunlash kerak, aks holda `wait` bilan kutiladi
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+                self._metrics['leaders'] += 1
+                self._metrics['in_flight'] += 1
+            else:
+                self._metrics['coalesced'] += 1
+        return call, leader
+
+    def finish(self, key, call, result=None, error=None):
+        """Leader natijasini (yoki xatosini) kutuvchilarga berish"""
+        call.result = result
+        call.error = error
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+                self._metrics['in_flight'] -= 1
+        call.event.set()
+
+    @staticmethod
+    def wait(call, timeout=None):
+        """Leader natijasini kutish (xatosi bo'lsa ko'tariladi, muddat o'tsa TimeoutError)"""
+        if not call.event.wait(timeout):
+            raise TimeoutError("Leader call did not finish in time")
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def do(self, key, fn, timeout=None):
+        """
+        `fn()` ni kalit bo'yicha yagona marta bajarish
+
+        Args:
+            timeout (float, optional): Kutuvchilar uchun maksimal kutish (sekund)
+
+        Returns:
+            Leader chaqiruvining natijasi (xato bo'lsa barcha kutuvchilarga ham ko'tariladi)
+        """
+        call, leader = self.begin(key)
+        if not leader:
+            return self.wait(call, timeout)
+
+        result = error = None
+        try:
+            result = fn()
+            return result
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            self.finish(key, call, result, error)
+
+    def get_metrics(self):
+        with self._lock:
+            return dict(self._metrics)
@@ -0,0 +1,295 @@
+import hashlib
+import logging
+import math
+import os
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import TimeoutError as FutureTimeout
+
+import numpy as np
+import google.generativeai as genai
+from flask import current_app, has_app_context
+
+from utils import metrics
+from utils.circuit_breaker import CircuitBreaker
+from utils.retrieval import normalize_text, tokenize
+
+logger = logging.getLogger(__name__)
+
+VECTOR_INDEX_FOLDER = 'uploads/vectors'
+
+
+class HashingEmbedder:
+    """
+    Tarmoqsiz (offline) embedding: so'zlar va belgi trigrammalari hashing
+    trick orqali qat'iy o'lchamli vektorga proyeksiya qilinadi (log-TF, L2).
+    Testlar va API kalitsiz ishlash uchun.
+    """
+
+    name = 'hashing'
+
+    def __init__(self, dim=512):
+        self.dim = dim
+
+    def _features(self, text):
+        features = Counter(term for term in tokenize(text) if not term.endswith('*'))
+        for word in normalize_text(text).split():
+            padded = f' {word} '
+            for i in range(len(padded) - 2):
+                features['#' + padded[i:i + 3]] += 1
+        return features
+
+    def _embed_one(self, text):
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for feature, count in self._features(text).items():
+            digest = hashlib.blake2b(feature.encode('utf-8'), digest_size=8).digest()
+            value = int.from_bytes(digest, 'little')
+            sign = 1.0 if value & 1 else -1.0
+            vector[(value >> 1) % self.dim] += sign * (1.0 + math.log(count))
+        norm = np.linalg.norm(vector)
+        if norm > 0:
+            vector /= norm
+        return vector
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        matrix = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            matrix[row] = self._embed_one(text)
+        return matrix
+
+    def embed_query(self, text):
+        return self._embed_one(text)
+
+
+class GeminiEmbedder:
+    """Gemini embedding modeli (production)"""
+
+    name = 'gemini'
+    remote = True
+
+    def __init__(self, model='models/text-embedding-004', batch_size=100):
+        self.model = model
+        self.batch_size = batch_size
+
+    @staticmethod
+    def _normalize(matrix):
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def embed_documents(self, texts):
+        texts = list(texts)
+        rows = []
+        for start in range(0, len(texts), self.batch_size):
+            result = genai.embed_content(
+                model=self.model,
+                content=texts[start:start + self.batch_size],
+                task_type='retrieval_document'
+            )
+            rows.extend(result['embedding'])
+        if not rows:
+            return np.zeros((0, 0), dtype=np.float32)
+        return self._normalize(np.asarray(rows, dtype=np.float32))
+
+    def embed_query(self, text):
+        result = genai.embed_content(model=self.model, content=text, task_type='retrieval_query')
+        vector = np.asarray(result['embedding'], dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+
+class VectorIndex:
+    """Bo'laklar embeddinglari: bitta uzluksiz float32 matritsa (qatorlar L2 normallashtirilgan)"""
+
+    def __init__(self, matrix):
+        self.matrix = matrix
+
+    def __len__(self):
+        return self.matrix.shape[0]
+
+    def search(self, query_vector, top_k=4):
+        """
+        Kosinus o'xshashlik bo'yicha eng yaqin bo'laklar (bitta matritsa-vektor ko'paytmasi)
+
+        Returns:
+            list[tuple]: (bo'lak indeksi, ball) - ball bo'yicha kamayish tartibida
+        """
+        count = len(self)
+        if count == 0:
+            return []
+        scores = self.matrix @ query_vector.astype(np.float32, copy=False)
+        top_k = min(top_k, count)
+        if top_k < count:
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+        else:
+            candidates = np.arange(count)
+        ordered = candidates[np.argsort(-scores[candidates])]
+        return [(int(i), float(scores[i])) for i in ordered]
+
+    @classmethod
+    def load(cls, path):
+        """Diskdagi .npy faylni memory-map orqali ochish (RAM ga to'liq yuklanmaydi)"""
+        return cls(np.load(path, mmap_mode='r'))
+
+    def save(self, path):
+        """Atomik saqlash: vaqtinchalik faylga yozib, keyin almashtirish"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.tmp.npy'
+        np.save(tmp_path, np.ascontiguousarray(self.matrix, dtype=np.float32))
+        os.replace(tmp_path, path)
+
+
+def _setting(name, default):
+    if has_app_context():
+        return current_app.config.get(name, default)
+    return default
+
+
+_embedder = None
+_embedder_lock = threading.Lock()
+
+def get_embedder():
+    """Sozlamadagi embedding backend (EMBEDDING_BACKEND: 'hashing', 'gemini' yoki 'none')"""
+    global _embedder
+    backend = _setting('EMBEDDING_BACKEND', 'hashing')
+    if backend == 'none':
+        return None
+    if _embedder is None or _embedder.name != backend:
+        with _embedder_lock:
+            if backend == 'gemini':
+                _embedder = GeminiEmbedder(_setting('GEMINI_EMBEDDING_MODEL', 'models/text-embedding-004'))
+            else:
+                _embedder = HashingEmbedder(_setting('HASHING_EMBEDDING_DIM', 512))
+    return _embedder
+
+
+def vector_index_path(user_id, kb_id, embedder, document_id=None):
+    folder = _setting('VECTOR_INDEX_FOLDER', VECTOR_INDEX_FOLDER)
+    if document_id is not None:
+        # Umumiy hujjat indeksi barcha foydalanuvchilar uchun bitta
+        return os.path.join(folder, 'documents', f'doc_{document_id}-{embedder.name}.npy')
+    return os.path.join(folder, f'user_{user_id}', f'kb_{kb_id}-{embedder.name}.npy')
+
+
+_loaded = OrderedDict()
+_loaded_lock = threading.Lock()
+MAX_LOADED_INDEXES = 256
+
+
+def build_vector_index(user_id, kb_id, texts, document_id=None):
+    """Bo'laklar embeddinglarini hisoblab diskka saqlash (yuklash vaqtida)"""
+    embedder = get_embedder()
+    if embedder is None:
+        return None
+    index = VectorIndex(embedder.embed_documents(texts))
+    path = vector_index_path(user_id, kb_id, embedder, document_id)
+    index.save(path)
+    with _loaded_lock:
+        _loaded.pop(path, None)
+    return index
+
+
+def get_vector_index(user_id, kb_id, document_id=None):
+    """Saqlangan vektor indeksni (memory-map) olish; bo'lmasa None"""
+    embedder = get_embedder()
+    if embedder is None:
+        return None
+    path = vector_index_path(user_id, kb_id, embedder, document_id)
+    with _loaded_lock:
+        index = _loaded.get(path)
+        if index is not None:
+            _loaded.move_to_end(path)
+            return index
+    if not os.path.exists(path):
+        return None
+
+    index = VectorIndex.load(path)
+    with _loaded_lock:
+        _loaded[path] = index
+        while len(_loaded) > MAX_LOADED_INDEXES:
+            _loaded.popitem(last=False)
+    return index
+
+
+_breaker = None
+_breaker_lock = threading.Lock()
+
+def get_embedding_breaker():
+    """Tarmoq orqali query embedding chaqiruvlari uchun circuit breaker"""
+    global _breaker
+    if _breaker is None:
+        with _breaker_lock:
+            if _breaker is None:
+                _breaker = CircuitBreaker(
+                    failure_threshold=_setting('AI_BREAKER_FAILURES', 5),
+                    reset_timeout=_setting('AI_BREAKER_RESET', 30.0),
+                )
+                metrics.register('embedding_circuit_breaker', _breaker.get_metrics)
+    return _breaker
+
+
+def embed_query(embedder, question):
+    """
+    Savol embeddingi. Tarmoqdagi embedder AI chaqiruvlari executorida
+    EMBEDDING_TIMEOUT muddati va circuit breaker bilan chaqiriladi.
+
+    Returns:
+        np.ndarray | None: Vektor; muddat o'tsa yoki breaker ochiq bo'lsa None
+    """
+    if not getattr(embedder, 'remote', False):
+        return embedder.embed_query(question)
+
+    from utils.ai_handler import get_ai_executor
+    breaker = get_embedding_breaker()
+    if not breaker.allow():
+        return None
+    timeout = _setting('EMBEDDING_TIMEOUT', 3.0)
+    started = time.monotonic()
+    future = get_ai_executor().submit(embedder.embed_query, question)
+    try:
+        vector = future.result(timeout=timeout)
+    except FutureTimeout:
+        breaker.record_failure(reason='timeouts')
+        logger.warning(f"Query embedding {timeout}s ichida tugamadi - faqat BM25 ishlatiladi")
+        return None
+    except Exception:
+        breaker.record_failure()
+        raise
+    breaker.record_success(time.monotonic() - started)
+    return vector
+
+
+def search_vectors(user_id, kb_id, question, top_k=4, document_id=None):
+    """Savol bo'yicha vektor qidiruv; indeks yoki savol embeddingi bo'lmasa bo'sh ro'yxat"""
+    index = get_vector_index(user_id, kb_id, document_id)
+    if index is None or not len(index):
+        return []
+    query_vector = embed_query(get_embedder(), question)
+    if query_vector is None:
+        return []
+    return index.search(query_vector, top_k)
+
+
+def _remove_index_files(folder, prefix):
+    if not os.path.isdir(folder):
+        return
+    for name in os.listdir(folder):
+        if name.startswith(prefix):
+            path = os.path.join(folder, name)
+            with _loaded_lock:
+                _loaded.pop(path, None)
+            os.remove(path)
+
+
+def remove_document_vectors(document_id):
+    """O'chirilgan umumiy hujjatning barcha embedding backendlari uchun indeks fayllari"""
+    folder = os.path.join(_setting('VECTOR_INDEX_FOLDER', VECTOR_INDEX_FOLDER), 'documents')
+    _remove_index_files(folder, f'doc_{document_id}-')
+
+
+def remove_kb_vectors(user_id, kb_id):
+    """O'chirilgan (umumiy hujjatsiz) bilim bazasining indeks fayllari"""
+    folder = os.path.join(_setting('VECTOR_INDEX_FOLDER', VECTOR_INDEX_FOLDER), f'user_{user_id}')
+    _remove_index_files(folder, f'kb_{kb_id}-')
@@ -0,0 +1,410 @@
+import json
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, exists, func, or_, update
+from sqlalchemy.orm import aliased
+
+from models import db
+from models.webhook_job import WebhookJob
+from utils import metrics
+
+logger = logging.getLogger(__name__)
+
+# Worker pool holati (har bir gunicorn jarayoni uchun alohida)
+_workers = []
+_wakeups = []
+_stop_event = threading.Event()
+_settings = {
+    'num_shards': 4,
+    'poll_interval': 0.5,
+    'lease_seconds': 300,
+    'max_attempts': 3,
+    'retry_base_seconds': 2.0,
+    'retry_max_seconds': 60.0,
+    'retention_hours': 24,
+    'debounce_seconds': 0.0,
+    'debounce_max_wait': 0.0,
+    'debounce_max_messages': 10,
+}
+_handler = None
+_stats_lock = threading.Lock()
+_stats = {'batches': 0, 'merged_updates': 0, 'debounced_polls': 0}
+
+MAINTENANCE_INTERVAL = 60  # seconds
+
+
+def shard_for_chat(chat_id, num_shards=None):
+    """
+    Chat ID bo'yicha shard raqamini aniqlash (bir chat doim bitta shardda).
+    Egallashda ham xuddi shu formula SQL da hisoblanadi (_shard_filter).
+    """
+    num_shards = num_shards or _settings['num_shards']
+    return abs(int(chat_id)) % num_shards
+
+
+def _shard_filter(shard):
+    """
+    Shard egallash paytida chat_id dan hisoblanadi: yozuvdagi `shard` ni
+    boshqa WEBHOOK_WORKERS bilan ishlagan jarayon yozgan bo'lishi mumkin va
+    bunday ishlar hech bir workerga tushmay qolardi.
+    """
+    return func.abs(WebhookJob.chat_id) % _settings['num_shards'] == shard
+
+
+def retry_delay(attempts):
+    """Qayta urinishdan oldingi kutish (eksponensial): base * 2^(urinish-1), max bilan cheklangan"""
+    delay = _settings['retry_base_seconds'] * (2 ** max(attempts - 1, 0))
+    return min(delay, _settings['retry_max_seconds'])
+
+
+def is_running():
+    """Worker pool ushbu jarayonda ishlayaptimi"""
+    return any(worker.is_alive() for worker in _workers)
+
+
+def enqueue_update(user_id, chat_id, update_data):
+    """
+    Telegram update ni navbatga qo'yish
+
+    Args:
+        user_id (int): Bot egasining ID si
+        chat_id (int): Telegram chat ID
+        update_data (dict): Telegram update
+
+    Returns:
+        WebhookJob: Saqlangan navbat yozuvi
+    """
+    shard = shard_for_chat(chat_id)
+    job = WebhookJob(
+        user_id=user_id,
+        chat_id=chat_id,
+        shard=shard,
+        payload=json.dumps(update_data, ensure_ascii=False)
+    )
+    try:
+        db.session.add(job)
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        raise e
+
+    # Shu jarayondagi workerni darhol uyg'otish
+    if shard < len(_wakeups):
+        _wakeups[shard].set()
+    return job
+
+
+def dispatch_update(user_id, chat_id, update_data):
+    """Worker pool ishlayotgan bo'lsa navbatga qo'yish, aks holda darhol qayta ishlash"""
+    if is_running():
+        enqueue_update(user_id, chat_id, update_data)
+    elif _handler is not None:
+        _handler(user_id, update_data)
+    else:
+        raise RuntimeError("Webhook handler sozlanmagan")
+
+
+def _incr(name, value=1):
+    with _stats_lock:
+        _stats[name] += value
+
+
+def get_metrics():
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _chat_is_settled(job, now):
+    """
+    Debounce oynasi: chatga oxirgi xabar kelganidan beri `debounce_seconds`
+    o'tgan bo'lsa yoki eng eski xabar `debounce_max_wait` dan ko'p kutgan
+    bo'lsa, chat ishlarini olish mumkin.
+    """
+    window = _settings['debounce_seconds']
+    if window <= 0 or job.created_at is None:
+        return True
+    if (now - job.created_at).total_seconds() >= _settings['debounce_max_wait']:
+        return True
+    newest = db.session.query(func.max(WebhookJob.created_at)).filter(
+        WebhookJob.user_id == job.user_id,
+        WebhookJob.chat_id == job.chat_id,
+        WebhookJob.status == 'pending'
+    ).scalar()
+    return newest is None or (now - newest).total_seconds() >= window
+
+
+def update_kind(update_data):
+    """Update turi: 'message', 'edited_message', 'callback_query' va h.k."""
+    return next((key for key in update_data if key != 'update_id'), None)
+
+
+def update_text(update_data):
+    """Xabar matni yoki media izohi (caption)"""
+    message = update_data.get(update_kind(update_data)) or {}
+    if not isinstance(message, dict):
+        return ''
+    return message.get('text') or message.get('caption') or ''
+
+
+def _claim_followers(job):
+    """
+    Egallangan ishdan keyin shu chatda kutayotgan xabarlarni ham olish (bitta
+    javob uchun). Faqat bir xil turdagi update lar birlashtiriladi: boshqa
+    turdagi update kelgan joyda to'plam yopiladi.
+    """
+    followers = WebhookJob.query.filter(
+        WebhookJob.user_id == job.user_id,
+        WebhookJob.chat_id == job.chat_id,
+        WebhookJob.status == 'pending',
+        WebhookJob.id > job.id
+    ).order_by(WebhookJob.id).limit(_settings['debounce_max_messages'] - 1).all()
+
+    kind = update_kind(json.loads(job.payload))
+    same_kind = []
+    for follower in followers:
+        if update_kind(json.loads(follower.payload)) != kind:
+            break
+        same_kind.append(follower)
+    followers = same_kind
+    if not followers:
+        return []
+
+    follower_ids = [follower.id for follower in followers]
+    # Chat bizda 'processing' holatida, boshqa worker bu ishlarni ololmaydi
+    db.session.execute(
+        update(WebhookJob)
+        .where(WebhookJob.id.in_(follower_ids), WebhookJob.status == 'pending')
+        .values(status='processing', locked_at=datetime.utcnow(), attempts=WebhookJob.attempts + 1)
+        .execution_options(synchronize_session=False)
+    )
+    db.session.commit()
+    for follower in followers:
+        db.session.refresh(follower)
+    return [follower for follower in followers if follower.status == 'processing']
+
+
+def merge_updates(updates):
+    """
+    Ketma-ket kelgan bir xil turdagi Telegram update larni bittaga
+    birlashtirish: oxirgi update olinadi, matnlar (yoki media izohlari) esa
+    yangi qator bilan qo'shilib `text` ga yoziladi.
+    """
+    merged = dict(updates[-1])
+    if len(updates) == 1:
+        return merged
+    kind = update_kind(merged)
+    texts = [text for text in (update_text(update_data) for update_data in updates) if text]
+    if texts and isinstance(merged.get(kind), dict):
+        message = dict(merged[kind])
+        message['text'] = '\n'.join(texts)
+        merged[kind] = message
+    return merged
+
+
+def claim_next_job(shard):
+    """
+    Shard dagi navbatdagi ishni egallash.
+
+    Bir chat uchun ishlar qat'iy tartibda bajariladi: agar shu chatda eskiroq
+    'pending' yoki hozir 'processing' holatidagi ish bo'lsa, yangisi olinmaydi.
+    Tekshiruv va egallash bitta UPDATE ichida bo'lgani uchun bir nechta
+    jarayon bir vaqtda ishlasa ham tartib buzilmaydi.
+
+    Debounce yoqilgan bo'lsa, chat xabarlari oyna yopilguncha kutadi va
+    shu chatdagi keyingi xabarlar ham birga egallanadi (job.batch).
+
+    Xato bilan qaytgan ish `next_attempt_at` gacha olinmaydi; u chatdagi eng
+    eski ish bo'lib qolgani uchun chatning keyingi xabarlari ham kutadi.
+    """
+    now = datetime.utcnow()
+    # Har bir chatdan faqat eng eski 'pending' ish; band yoki qayta urinishni
+    # kutayotgan chatlar LIMIT dan oldin chiqarib tashlanadi - bitta chatning
+    # ko'p ishlari boshqa chatlarni to'sib qo'ymaydi
+    heads = db.session.query(func.min(WebhookJob.id)).filter(
+        _shard_filter(shard),
+        WebhookJob.status == 'pending'
+    ).group_by(WebhookJob.user_id, WebhookJob.chat_id)
+    running = aliased(WebhookJob)
+    busy = exists().where(and_(
+        running.user_id == WebhookJob.user_id,
+        running.chat_id == WebhookJob.chat_id,
+        running.status == 'processing'
+    ))
+    candidates = WebhookJob.query.filter(
+        WebhookJob.id.in_(heads),
+        or_(WebhookJob.next_attempt_at.is_(None), WebhookJob.next_attempt_at <= now),
+        ~busy
+    ).order_by(WebhookJob.id).limit(20).all()
+
+    for candidate in candidates:
+        if not _chat_is_settled(candidate, now):
+            # Foydalanuvchi hali yozyapti - keyingi xabarlarni kutamiz
+            _incr('debounced_polls')
+            continue
+
+        other = aliased(WebhookJob)
+        blocker = exists().where(and_(
+            other.user_id == candidate.user_id,
+            other.chat_id == candidate.chat_id,
+            or_(
+                other.status == 'processing',
+                and_(other.status == 'pending', other.id < candidate.id)
+            )
+        ))
+        result = db.session.execute(
+            update(WebhookJob)
+            .where(WebhookJob.id == candidate.id, WebhookJob.status == 'pending', ~blocker)
+            .values(status='processing', locked_at=datetime.utcnow(), attempts=WebhookJob.attempts + 1)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            db.session.refresh(candidate)
+            candidate.batch = [candidate]
+            if _settings['debounce_seconds'] > 0:
+                candidate.batch += _claim_followers(candidate)
+            return candidate
+
+    return None
+
+
+def _finish_job(job, error=None):
+    """Ish natijasini yozib qo'yish"""
+    if error is None:
+        job.status = 'done'
+        job.error = None
+        job.finished_at = datetime.utcnow()
+    elif job.attempts >= _settings['max_attempts']:
+        job.status = 'failed'
+        job.error = error
+        job.finished_at = datetime.utcnow()
+    else:
+        # Qayta urinish: ish eng eski 'pending' bo'lib qoladi, tartib saqlanadi,
+        # lekin darhol emas - ishlamayotgan servisni ketma-ket urmaslik uchun
+        job.status = 'pending'
+        job.error = error
+        job.locked_at = None
+        job.next_attempt_at = datetime.utcnow() + timedelta(seconds=retry_delay(job.attempts))
+    db.session.commit()
+
+
+def run_job(job, handler):
+    """Ishni bajarish (debounce bilan birlashtirilgan xabarlar bitta chaqiruvda)"""
+    batch = getattr(job, 'batch', None) or [job]
+    try:
+        if len(batch) > 1:
+            _incr('batches')
+            _incr('merged_updates', len(batch) - 1)
+        update_data = merge_updates([json.loads(item.payload) for item in batch])
+        handler(job.user_id, update_data)
+        error = None
+    except Exception as e:
+        logger.error(f"Webhook ishini bajarishda xato (job {job.id}): {str(e)}")
+        db.session.rollback()
+        error = str(e)
+
+    for item in batch:
+        try:
+            _finish_job(item, error)
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Webhook ish holatini saqlashda xato (job {item.id}): {str(e)}")
+
+
+def requeue_stale_jobs():
+    """Qulflangan, lekin worker o'lib qolgan ishlarni navbatga qaytarish va eski ishlarni tozalash"""
+    now = datetime.utcnow()
+    stale_before = now - timedelta(seconds=_settings['lease_seconds'])
+    WebhookJob.query.filter(
+        WebhookJob.status == 'processing',
+        WebhookJob.locked_at < stale_before
+    ).update({'status': 'pending', 'locked_at': None}, synchronize_session=False)
+
+    retention_before = now - timedelta(hours=_settings['retention_hours'])
+    WebhookJob.query.filter(
+        WebhookJob.status.in_(['done', 'failed']),
+        WebhookJob.finished_at < retention_before
+    ).delete(synchronize_session=False)
+    db.session.commit()
+
+
+def _worker_loop(app, shard):
+    """Bitta shard uchun worker sikli"""
+    wakeup = _wakeups[shard]
+    last_maintenance = 0.0
+    with app.app_context():
+        while not _stop_event.is_set():
+            job = None
+            try:
+                if shard == 0 and time.monotonic() - last_maintenance > MAINTENANCE_INTERVAL:
+                    last_maintenance = time.monotonic()
+                    requeue_stale_jobs()
+                job = claim_next_job(shard)
+                if job is not None:
+                    run_job(job, _handler)
+            except Exception as e:
+                db.session.rollback()
+                logger.error(f"Webhook worker xatosi (shard {shard}): {str(e)}")
+            finally:
+                db.session.remove()
+
+            if job is None:
+                wakeup.wait(_settings['poll_interval'])
+                wakeup.clear()
+
+
+def start_workers(app, handler):
+    """
+    Webhook worker pool ni ishga tushirish
+
+    Args:
+        app (Flask): Flask ilovasi
+        handler (callable): handler(user_id, update_data) - update ni qayta ishlovchi funksiya
+
+    Returns:
+        int: Ishga tushirilgan workerlar soni
+    """
+    global _handler
+    _handler = handler
+
+    num_workers = int(app.config.get('WEBHOOK_WORKERS', 4))
+    _settings['poll_interval'] = float(app.config.get('WEBHOOK_QUEUE_POLL_INTERVAL', 0.5))
+    _settings['lease_seconds'] = int(app.config.get('WEBHOOK_JOB_LEASE_SECONDS', 300))
+    _settings['max_attempts'] = int(app.config.get('WEBHOOK_JOB_MAX_ATTEMPTS', 3))
+    _settings['retry_base_seconds'] = float(app.config.get('WEBHOOK_JOB_RETRY_BASE_SECONDS', 2))
+    _settings['retry_max_seconds'] = float(app.config.get('WEBHOOK_JOB_RETRY_MAX_SECONDS', 60))
+    _settings['num_shards'] = max(num_workers, 1)
+    _settings['debounce_seconds'] = int(app.config.get('WEBHOOK_DEBOUNCE_MS', 0)) / 1000.0
+    _settings['debounce_max_wait'] = int(app.config.get('WEBHOOK_DEBOUNCE_MAX_WAIT_MS', 3000)) / 1000.0
+    _settings['debounce_max_messages'] = max(int(app.config.get('WEBHOOK_DEBOUNCE_MAX_MESSAGES', 10)), 1)
+    metrics.register('webhook_debounce', get_metrics)
+
+    if num_workers <= 0 or is_running():
+        return 0
+
+    _stop_event.clear()
+    _wakeups[:] = [threading.Event() for _ in range(num_workers)]
+    _workers[:] = []
+    for shard in range(num_workers):
+        worker = threading.Thread(
+            target=_worker_loop,
+            args=(app, shard),
+            name=f'webhook-worker-{shard}',
+            daemon=True
+        )
+        worker.start()
+        _workers.append(worker)
+    return num_workers
+
+
+def stop_workers(timeout=5):
+    """Worker pool ni to'xtatish"""
+    _stop_event.set()
+    for wakeup in _wakeups:
+        wakeup.set()
+    for worker in _workers:
+        worker.join(timeout)
+    _workers[:] = []